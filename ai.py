@@ -1,4 +1,7 @@
-import board, pieces, numpy
+import pieces, numpy, time, multiprocessing
+from concurrent import futures
+from pawnhash import PawnHashTable
+from transposition import TranspositionTable
 
 class Heuristics:
 
@@ -59,17 +62,178 @@ class Heuristics:
         [-20, -10, -10, -5, -5, -10, -10, -20]
     ])
 
+    # Pawn structure terms, in points per pawn.
+    DOUBLED_PAWN_PENALTY = 15
+    ISOLATED_PAWN_PENALTY = 10
+    # Bonus of a passed pawn by the rows it has advanced from its first row.
+    PASSED_PAWN_BONUS = [0, 5, 10, 20, 35, 60, 100, 0]
+
+    # Caches the pawn structure scores, see get_pawn_score.
+    pawn_table = PawnHashTable()
+
+    # Number of positions evaluate_batch scores per dot product.
+    BATCH_CHUNK_SIZE = 4096
+
+    # Order of the piece planes used by evaluate_batch.
+    PLANES = [
+        (color, piece_class)
+        for color in [pieces.Piece.WHITE, pieces.Piece.BLACK]
+        for piece_class in [pieces.Pawn, pieces.Knight, pieces.Bishop, pieces.Rook, pieces.Queen, pieces.King]
+    ]
+
+    # The board keeps its material and position scores up to date on every
+    # move, and the pawn structure score is nearly always found in the pawn
+    # hash table, so evaluating a position costs about a constant time read.
     @staticmethod
     def evaluate(board):
-        material = Heuristics.get_material_score(board)
+        return board.material_score + board.position_score + Heuristics.get_pawn_score(board)
+
+    # Returns the pawn structure score of the board from the pawn hash table,
+    # computing and storing it on a miss.
+    @staticmethod
+    def get_pawn_score(board):
+        score = Heuristics.pawn_table.probe(board.pawn_hash)
+        if (score is None):
+            score = Heuristics.get_pawn_structure_score(board)
+            Heuristics.pawn_table.store(board.pawn_hash, score)
+        return score
+
+    # Computes the pawn structure score of the board from scratch: penalties
+    # for doubled pawns (every pawn past the first on a file) and isolated
+    # pawns (no pawn of the same color on the files next to it), and a bonus
+    # for passed pawns (no enemy pawn ahead on its own or the next files).
+    @staticmethod
+    def get_pawn_structure_score(board):
+        # rows[color][x] lists the rows of the pawns of color on file x.
+        rows = {pieces.Piece.WHITE: [[] for x in range(8)], pieces.Piece.BLACK: [[] for x in range(8)]}
+        for (sq, piece) in enumerate(board.squares):
+            if (piece != 0 and piece.piece_type == pieces.Pawn.PIECE_TYPE):
+                rows[piece.color][sq % 8].append(sq // 8)
+
+        score = 0
+        for (color, other_color, sign) in ((pieces.Piece.WHITE, pieces.Piece.BLACK, 1), (pieces.Piece.BLACK, pieces.Piece.WHITE, -1)):
+            for x in range(8):
+                pawns = rows[color][x]
+                if (not pawns):
+                    continue
+
+                score -= sign * Heuristics.DOUBLED_PAWN_PENALTY * (len(pawns) - 1)
+                neighbours = [rows[color][file] for file in (x - 1, x + 1) if 0 <= file < 8]
+                if (not any(neighbours)):
+                    score -= sign * Heuristics.ISOLATED_PAWN_PENALTY * len(pawns)
+
+                enemies = [y for file in (x - 1, x, x + 1) if 0 <= file < 8 for y in rows[other_color][file]]
+                for y in pawns:
+                    # White pawns move toward row 0, black pawns toward row 7.
+                    if (color == pieces.Piece.WHITE):
+                        if (all(enemy > y for enemy in enemies)):
+                            score += Heuristics.PASSED_PAWN_BONUS[7 - y]
+                    else:
+                        if (all(enemy < y for enemy in enemies)):
+                            score -= Heuristics.PASSED_PAWN_BONUS[y]
+
+        return score
+
+    # Scores N positions at once. planes is an array of shape (N, 12, 8, 8) as
+    # returned by get_planes_batch, where planes[n][p][x][y] is 1 iff the piece
+    # PLANES[p] stands on (x, y) in position n. Returns the N scores as an
+    # int64 array, equal to what evaluate returns for each position. The
+    # material and position scores are one dot product with PLANE_WEIGHTS,
+    # the pawn structure scores are computed from the pawn planes.
+    @staticmethod
+    def evaluate_batch(planes):
+        planes = numpy.asarray(planes)
+        if (planes.ndim != 4 or planes.shape[1:] != (len(Heuristics.PLANES), 8, 8)):
+            raise ValueError("Expected planes of shape (N, 12, 8, 8), got " + str(planes.shape))
+
+        white_pawns = planes[:, Heuristics.PLANE_INDEXES[pieces.Piece.WHITE][pieces.Pawn.PIECE_TYPE]] != 0
+        black_pawns = planes[:, Heuristics.PLANE_INDEXES[pieces.Piece.BLACK][pieces.Pawn.PIECE_TYPE]] != 0
+
+        # Work through the positions in chunks so that converting the planes
+        # for the dot product never needs more than a few MB. float32 holds
+        # every possible score exactly, and lets numpy use BLAS.
+        planes = planes.reshape(len(planes), -1)
+        weights = Heuristics.PLANE_WEIGHTS.reshape(-1).astype(numpy.float32)
+        scores = numpy.empty(len(planes), dtype=numpy.int64)
+        for start in range(0, len(planes), Heuristics.BATCH_CHUNK_SIZE):
+            chunk = planes[start:start + Heuristics.BATCH_CHUNK_SIZE].astype(numpy.float32)
+            scores[start:start + len(chunk)] = numpy.rint(chunk @ weights)
+
+        scores += Heuristics.get_pawn_structure_scores(white_pawns, black_pawns)
+        return scores
+
+    # Vectorized get_pawn_structure_score of N positions, given their white
+    # and black pawn planes of shape (N, 8, 8) indexed by [n][x][y]. Every
+    # file is packed into a byte with a bit per row, see get_pawn_files, and
+    # its whole score is looked up in PAWN_FILE_SCORES, so the work is done
+    # on (N, 8) arrays. Black's rows are packed in reverse, which makes black
+    # pawns move toward bit 0 like white ones and lets both colors share the
+    # tables. Returns the N scores as an int64 array.
+    @staticmethod
+    def get_pawn_structure_scores(white_pawns, black_pawns):
+        scores = numpy.zeros(len(white_pawns), dtype=numpy.int64)
+        for (pawns, enemies, sign, reverse) in ((white_pawns, black_pawns, 1, False), (black_pawns, white_pawns, -1, True)):
+            files = Heuristics.get_pawn_files(pawns, reverse)
+
+            occupied = files != 0
+            isolated = numpy.ones(files.shape, dtype=numpy.bool_)
+            isolated[:, 1:] &= ~occupied[:, :-1]
+            isolated[:, :-1] &= ~occupied[:, 1:]
+
+            # The enemy pawn nearest to promotion on the files x-1 to x+1 of
+            # every file x, as a bit index, or 8 without enemy pawns there.
+            lowest = Heuristics.LOWEST_PAWN_BITS[Heuristics.get_pawn_files(enemies, reverse)]
+            front = lowest.copy()
+            numpy.minimum(front[:, 1:], lowest[:, :-1], out=front[:, 1:])
+            numpy.minimum(front[:, :-1], lowest[:, 1:], out=front[:, :-1])
+
+            indexes = (isolated * 9 + front).astype(numpy.intp) * 256 + files
+            scores += sign * Heuristics.PAWN_FILE_SCORES.take(indexes).sum(axis=1)
+
+        return scores
+
+    # Packs the (N, 8, 8) pawn planes into an (N, 8) array of bytes where bit
+    # y of file x is set iff a pawn stands on (x, y), or bit 7-y if reverse.
+    # The 8 rows of a file are 8 consecutive bytes of 0 or 1, so a single
+    # multiplication of them as one 64-bit word gathers the bits into the
+    # top byte: the multiplier has one bit per row that shifts the byte of
+    # that row to its bit in the top byte, and no two products overlap.
+    @staticmethod
+    def get_pawn_files(pawns, reverse=False):
+        words = numpy.ascontiguousarray(pawns, dtype=numpy.bool_).view("<u8")[:, :, 0]
+        if (reverse):
+            multiplier = numpy.uint64(0x8040201008040201)
+        else:
+            multiplier = numpy.uint64(0x0102040810204080)
+        return ((words * multiplier) >> numpy.uint64(56)).astype(numpy.uint8)
 
+    # Returns the (12, 8, 8) piece planes of the board, see evaluate_batch.
+    @staticmethod
+    def get_planes(board):
+        planes = numpy.zeros((len(Heuristics.PLANES), 8, 8), dtype=numpy.int8)
+        for x in range(8):
+            for y in range(8):
+                piece = board.squares[y*8 + x]
+                if (piece != 0):
+                    planes[Heuristics.PLANE_INDEXES[piece.color][piece.piece_type], x, y] = 1
+
+        return planes
+
+    # Returns the (N, 12, 8, 8) piece planes of the given boards.
+    @staticmethod
+    def get_planes_batch(boards):
+        return numpy.stack([Heuristics.get_planes(board) for board in boards])
+
+    # Computes the position score of the board from scratch.
+    @staticmethod
+    def get_position_score(board):
         pawns = Heuristics.get_piece_position_score(board, pieces.Pawn.PIECE_TYPE, Heuristics.PAWN_TABLE)
         knights = Heuristics.get_piece_position_score(board, pieces.Knight.PIECE_TYPE, Heuristics.KNIGHT_TABLE)
         bishops = Heuristics.get_piece_position_score(board, pieces.Bishop.PIECE_TYPE, Heuristics.BISHOP_TABLE)
         rooks = Heuristics.get_piece_position_score(board, pieces.Rook.PIECE_TYPE, Heuristics.ROOK_TABLE)
         queens = Heuristics.get_piece_position_score(board, pieces.Queen.PIECE_TYPE, Heuristics.QUEEN_TABLE)
 
-        return material + pawns + knights + bishops + rooks + queens
+        return int(pawns + knights + bishops + rooks + queens)
 
     # Returns the score for the position of the given type of piece.
     # A piece type can for example be: pieces.Pawn.PIECE_TYPE.
@@ -80,7 +244,7 @@ class Heuristics:
         black = 0
         for x in range(8):
             for y in range(8):
-                piece = board.chesspieces[x][y]
+                piece = board.squares[y*8 + x]
                 if (piece != 0):
                     if (piece.piece_type == piece_type):
                         if (piece.color == pieces.Piece.WHITE):
@@ -96,7 +260,7 @@ class Heuristics:
         black = 0
         for x in range(8):
             for y in range(8):
-                piece = board.chesspieces[x][y]
+                piece = board.squares[y*8 + x]
                 if (piece != 0):
                     if (piece.color == pieces.Piece.WHITE):
                         white += piece.value
@@ -105,96 +269,862 @@ class Heuristics:
 
         return white - black
 
+    # Returns the change in material score for having the given piece on
+    # the board: positive for white pieces, negative for black pieces.
+    @staticmethod
+    def get_piece_material_score(piece):
+        if (piece.color == pieces.Piece.WHITE):
+            return piece.value
+        return -piece.value
+
+    # Returns a table such that table[color][piece_type][x][y] is the change in
+    # position score for having that piece on (x, y). Black scores use the
+    # mirrored table and are negative, kings are not scored.
+    @staticmethod
+    def get_position_tables():
+        tables = {
+            pieces.Pawn.PIECE_TYPE: Heuristics.PAWN_TABLE,
+            pieces.Knight.PIECE_TYPE: Heuristics.KNIGHT_TABLE,
+            pieces.Bishop.PIECE_TYPE: Heuristics.BISHOP_TABLE,
+            pieces.Rook.PIECE_TYPE: Heuristics.ROOK_TABLE,
+            pieces.Queen.PIECE_TYPE: Heuristics.QUEEN_TABLE,
+            pieces.King.PIECE_TYPE: numpy.zeros((8, 8), dtype=int)
+        }
+
+        position_tables = {pieces.Piece.WHITE: {}, pieces.Piece.BLACK: {}}
+        for (piece_type, table) in tables.items():
+            position_tables[pieces.Piece.WHITE][piece_type] = [[int(table[x][y]) for y in range(8)] for x in range(8)]
+            position_tables[pieces.Piece.BLACK][piece_type] = [[-int(table[7 - x][y]) for y in range(8)] for x in range(8)]
+
+        return position_tables
+
+
+    # Returns a table such that table[color][piece_type] is the index of that
+    # piece in PLANES.
+    @staticmethod
+    def get_plane_indexes():
+        indexes = {pieces.Piece.WHITE: {}, pieces.Piece.BLACK: {}}
+        for (index, (color, piece_class)) in enumerate(Heuristics.PLANES):
+            indexes[color][piece_class.PIECE_TYPE] = index
+
+        return indexes
+
+    # Returns the lookup tables of get_pawn_structure_scores, indexed by the
+    # byte of a file with bit y set iff a pawn stands on row y: the lowest
+    # bit set, or 8 for no pawns, and the pawn structure score of the pawns
+    # on the file as a flat array indexed [isolated][lowest enemy bit ahead
+    # on the file and its neighbours][file].
+    @staticmethod
+    def get_pawn_file_tables():
+        lowest_bits = numpy.full(256, 8, dtype=numpy.uint8)
+        scores = numpy.zeros((2, 9, 256), dtype=numpy.int64)
+        for file in range(1, 256):
+            rows = [y for y in range(8) if file & (1 << y)]
+            lowest_bits[file] = rows[0]
+            scores[:, :, file] -= Heuristics.DOUBLED_PAWN_PENALTY * (len(rows) - 1)
+            scores[1, :, file] -= Heuristics.ISOLATED_PAWN_PENALTY * len(rows)
+            for y in rows:
+                scores[:, y+1:, file] += Heuristics.PASSED_PAWN_BONUS[7 - y]
+
+        return (lowest_bits, scores.reshape(-1))
+
+    # Returns the (12, 8, 8) weights of the piece planes: the material value
+    # plus the position score of each piece on each square.
+    @staticmethod
+    def get_plane_weights():
+        weights = numpy.zeros((len(Heuristics.PLANES), 8, 8), dtype=numpy.int64)
+        for (index, (color, piece_class)) in enumerate(Heuristics.PLANES):
+            value = piece_class.VALUE
+            if (color == pieces.Piece.BLACK):
+                value = -value
+            weights[index] = numpy.array(Heuristics.POSITION_TABLES[color][piece_class.PIECE_TYPE]) + value
+
+        return weights
+
+
+Heuristics.POSITION_TABLES = Heuristics.get_position_tables()
+Heuristics.PLANE_INDEXES = Heuristics.get_plane_indexes()
+Heuristics.PLANE_WEIGHTS = Heuristics.get_plane_weights()
+(Heuristics.LOWEST_PAWN_BITS, Heuristics.PAWN_FILE_SCORES) = Heuristics.get_pawn_file_tables()
+
 
 class AI:
 
     INFINITE = 10000000
+    CHECKMATE = 1000000
 
+    # Depth in plies searched by get_ai_move without a time budget.
+    DEFAULT_DEPTH = 3
+    # Deepest iteration of a time-managed search.
+    MAX_DEPTH = 64
+    # Number of nodes between two reads of the clock.
+    TIME_CHECK_INTERVAL = 256
+    # Seconds between two checks for a stop request while waiting for the
+    # workers of a parallel search.
+    STOP_CHECK_SECONDS = 0.05
+
+    # State of the running search.
+    nodes = 0
+    stopped = False
+    deadline = None
+    node_limit = None
+    # Set from another thread to stop the running search, see stop. Unlike
+    # stopped it is not reset when a search starts, so it also stops a search
+    # that is only about to start. Clear it before starting the next one.
+    stop_requested = False
+
+    # Shared by all searches, so positions are remembered between moves.
+    transposition_table = TranspositionTable()
+
+    # A book.OpeningBook consulted by get_ai_move before searching, or None.
+    opening_book = None
+    # A tablebase.Tablebases probed by the search, or None.
+    tablebases = None
+    # Score of a tablebase win, less the plies to mate. Below the checkmate
+    # scores, so a mate found by the search is still preferred.
+    TABLEBASE_WIN = CHECKMATE // 2
+
+    # Move ordering scores. Stages are far enough apart that a move of an
+    # earlier stage always sorts before any move of a later stage.
+    HASH_MOVE_SCORE = 4000000000
+    CAPTURE_SCORE = 3000000000
+    KILLER_SCORE = 2000000000
+    # Killer moves remembered per ply.
+    KILLERS_PER_PLY = 2
+
+    # Selective search, each can be switched off on its own:
+    # Null-move pruning: a side that can pass and still reach beta with a
+    # reduced search is assumed to reach it with a real move too.
+    NULL_MOVE_PRUNING = True
+    NULL_MOVE_REDUCTION = 2
+    NULL_MOVE_MIN_DEPTH = 3
+    # Late-move reductions: quiet moves ordered late are searched one ply
+    # shallower first, and again at full depth only if they beat alpha.
+    LATE_MOVE_REDUCTIONS = True
+    LATE_MOVE_MIN_DEPTH = 3
+    LATE_MOVE_MIN_INDEX = 3
+    # Principal variation search: moves after the first are searched with a
+    # null window, and again with the full window only if they beat it.
+    PRINCIPAL_VARIATION_SEARCH = True
+
+    # Added to the value of the captured piece before delta pruning a
+    # capture, for the positional gains the material count misses.
+    DELTA_MARGIN = 200
+
+    # killer_moves[ply] are the latest quiet moves that caused a cutoff at ply.
+    killer_moves = []
+    # history[(color, move code)] grows by depth^2 for every cutoff the quiet
+    # move caused.
+    history = {}
+
+    # Process pool of the parallel root search, created on first use. Each
+    # worker process has its own transposition table, killers and history.
+    process_pool = None
+    process_pool_workers = 0
+    # Counts the searches, so a worker knows when a root move belongs to a
+    # new search and starts it like search does, see search_root_move.
+    search_number = 0
+    # Shared with the workers: the best root score found so far in the
+    # current iteration, and a flag telling them to stop searching.
+    shared_bound = None
+    shared_stop = None
+
+    # Returns the best move for the color to move (chessboard.turn), or 0 if
+    # it has no legal moves left.
+    # Without time_ms the search always goes max_depth plies deep. With time_ms
+    # the search deepens one ply at a time until the time (in milliseconds)
+    # runs out or max_depth is reached, and the best move of the last
+    # completed depth is returned. max_nodes limits the search the same way,
+    # in searched nodes instead of time. With workers > 1 the root moves are
+    # split across that many processes, see search_root_parallel. Positions in
+    # the opening book or the tablebases are answered from them without
+    # searching.
+    @staticmethod
+    def get_ai_move(chessboard, time_ms=None, max_depth=None, workers=None, max_nodes=None):
+        if (AI.opening_book is not None):
+            book_move = AI.opening_book.get_move(chessboard)
+            if (book_move != 0):
+                return book_move
+
+        if (AI.tablebases is not None):
+            tablebase_move = AI.tablebases.get_best_move(chessboard)
+            if (tablebase_move != 0):
+                return tablebase_move
+
+        (best_move, best_score, depth) = AI.search(chessboard, time_ms, max_depth, workers, max_nodes)
+        return best_move
+
+    # Iterative deepening driver behind get_ai_move. Returns a tuple
+    # (best_move, best_score, depth) for the deepest completed iteration.
+    # Scores are from white's point of view, like everywhere in the search.
+    # With max_nodes the search also stops after about that many nodes. Like
+    # the time budget, it only applies once the first iteration completed.
+    # A stop request can end even the first iteration. The search then
+    # returns the first legal move in search order at depth 0, so the best
+    # move is only 0 if there are no legal moves. Then the game is over and
+    # the search returns the checkmate or stalemate score at depth 0 right
+    # away.
     @staticmethod
-    def get_ai_move(chessboard, invalid_moves):
+    def search(chessboard, time_ms=None, max_depth=None, workers=None, max_nodes=None):
+        if (max_depth is None):
+            if (time_ms is None and max_nodes is None):
+                max_depth = AI.DEFAULT_DEPTH
+            else:
+                max_depth = AI.MAX_DEPTH
+
+        AI.nodes = 0
+        maximizing = chessboard.turn == pieces.Piece.WHITE
+        legal_moves = chessboard.get_legal_moves(chessboard.turn)
+        if (not legal_moves):
+            return (0, AI.get_terminal_score(chessboard, 0, maximizing), 0)
+
+        AI.search_number += 1
+        AI.transposition_table.new_search()
+        AI.new_move_ordering()
+        AI.stopped = False
+        # The time and node budgets are set after the first iteration.
+        AI.deadline = None
+        AI.node_limit = None
+        start = time.perf_counter()
+
         best_move = 0
-        best_score = AI.INFINITE
-        for move in chessboard.get_possible_moves(pieces.Piece.BLACK):
-            if (AI.is_invalid_move(move, invalid_moves)):
-                continue
+        best_score = AI.get_worst_score(maximizing)
+        completed_depth = 0
+        for depth in range(1, max_depth + 1):
+            if (workers is not None and workers > 1):
+                result = AI.search_root_parallel(chessboard, depth, best_move, workers)
+            else:
+                result = AI.search_root(chessboard, depth, best_move)
+            if (result is None):
+                break
 
-            copy = board.Board.clone(chessboard)
-            copy.perform_move(move)
+            (best_move, best_score) = result
+            completed_depth = depth
+            elapsed = (time.perf_counter() - start) * 1000
+            AI.report_iteration(depth, best_move, best_score, elapsed)
+
+            if (time_ms is not None):
+                # The next iteration takes several times longer than this one,
+                # so don't start it if it cannot finish in the remaining time.
+                if (elapsed * 2 > time_ms):
+                    break
+                AI.deadline = start + time_ms / 1000.0
+            if (max_nodes is not None):
+                if (AI.nodes >= max_nodes):
+                    break
+                AI.node_limit = max_nodes
+
+        AI.deadline = None
+        AI.node_limit = None
+        if (best_move == 0):
+            best_move = AI.order_root_moves(chessboard, legal_moves, 0)[0]
+            best_score = Heuristics.evaluate(chessboard)
+        return (best_move, best_score, completed_depth)
+
+    # Called after every completed iteration of the search with the time (in
+    # milliseconds) since the search started. Does nothing unless replaced,
+    # see stats.SearchStats.
+    @staticmethod
+    def report_iteration(depth, best_move, best_score, elapsed):
+        pass
+
+    # Searches every move of the color to move depth plies deep, trying
+    # previous_best first. Returns (best_move, best_score), or None if the
+    # search ran out of time.
+    @staticmethod
+    def search_root(chessboard, depth, previous_best):
+        maximizing = chessboard.turn == pieces.Piece.WHITE
+        moves = AI.order_root_moves(chessboard, chessboard.get_legal_moves(chessboard.turn), previous_best)
 
-            score = AI.alphabeta(copy, 2, -AI.INFINITE, AI.INFINITE, True)
-            if (score < best_score):
+        best_move = 0
+        best_score = AI.get_worst_score(maximizing)
+        for move in moves:
+            undo = chessboard.make_move(move)
+            if (maximizing):
+                score = AI.alphabeta(chessboard, depth-1, best_score, AI.INFINITE, False, 1)
+            else:
+                score = AI.alphabeta(chessboard, depth-1, -AI.INFINITE, best_score, True, 1)
+            chessboard.unmake_move(undo)
+            if (AI.stopped):
+                return None
+
+            if (AI.is_better_score(score, best_score, maximizing)):
                 best_score = score
                 best_move = move
 
-        # Checkmate.
-        if (best_move == 0):
-            return 0
+        return (best_move, best_score)
 
-        copy = board.Board.clone(chessboard)
-        copy.perform_move(best_move)
-        if (copy.is_check(pieces.Piece.BLACK)):
-            invalid_moves.append(best_move)
-            return AI.get_ai_move(chessboard, invalid_moves)
+    # The starting best score of the side that maximizes or minimizes.
+    @staticmethod
+    def get_worst_score(maximizing):
+        if (maximizing):
+            return -AI.INFINITE
+        return AI.INFINITE
 
-        return best_move
+    @staticmethod
+    def is_better_score(score, best_score, maximizing):
+        if (maximizing):
+            return score > best_score
+        return score < best_score
 
+    # Same as search_root, but the root moves are searched by a pool of worker
+    # processes. The first move is searched alone to get a good bound (young
+    # brothers wait), then the other moves are searched in parallel. Workers
+    # share the best score so far and search with a window just past it, so
+    # a move that ties the best score still gets its exact score. Ties are
+    # broken by root order, which both searches share, see order_root_moves,
+    # so both pick the same move when they score the root moves the same.
+    # The scores can still differ: every worker has its own transposition
+    # table, killers and history, and the bound a move is searched with
+    # depends on which moves finished first.
     @staticmethod
-    def is_invalid_move(move, invalid_moves):
-        for invalid_move in invalid_moves:
-            if (invalid_move.equals(move)):
-                return True
-        return False
+    def search_root_parallel(chessboard, depth, previous_best, workers):
+        maximizing = chessboard.turn == pieces.Piece.WHITE
+        moves = AI.order_root_moves(chessboard, chessboard.get_legal_moves(chessboard.turn), previous_best)
+        if (not moves):
+            return (0, AI.get_worst_score(maximizing))
+
+        pool = AI.get_process_pool(workers)
+        AI.shared_bound.value = AI.get_worst_score(maximizing)
+        AI.shared_stop.value = 0
+
+        time_left_ms = None
+        if (AI.deadline is not None):
+            time_left_ms = (AI.deadline - time.perf_counter()) * 1000
 
+        eldest = pool.submit(AI.search_root_move, chessboard, moves[0], depth, time_left_ms, AI.search_number)
+        results = AI.wait_for_results([eldest])
+        if (results is None):
+            return None
+
+        if (AI.deadline is not None):
+            time_left_ms = (AI.deadline - time.perf_counter()) * 1000
+        younger = [pool.submit(AI.search_root_move, chessboard, move, depth, time_left_ms, AI.search_number) for move in moves[1:]]
+        younger_results = AI.wait_for_results(younger)
+        if (younger_results is None):
+            return None
+        results += younger_results
+
+        best_move = 0
+        best_score = AI.get_worst_score(maximizing)
+        for (move, (score, nodes)) in zip(moves, results):
+            AI.nodes += nodes
+            if (AI.is_better_score(score, best_score, maximizing)):
+                best_score = score
+                best_move = move
+
+        return (best_move, best_score)
+
+    # Returns the results of the given futures in order, or None if one of
+    # them did not finish before the deadline or a stop was requested.
     @staticmethod
-    def minimax(board, depth, maximizing):
+    def wait_for_results(pending):
+        while (True):
+            timeout = AI.STOP_CHECK_SECONDS
+            if (AI.deadline is not None):
+                timeout = min(timeout, max(0, AI.deadline - time.perf_counter()))
+
+            (done, not_done) = futures.wait(pending, timeout)
+            if (not not_done or AI.stop_requested):
+                break
+            if (AI.deadline is not None and time.perf_counter() >= AI.deadline):
+                break
+
+        if (not_done):
+            AI.shared_stop.value = 1
+            for future in not_done:
+                future.cancel()
+            futures.wait(not_done)
+
+        results = [None if future.cancelled() else future.result() for future in pending]
+        if (None in results):
+            AI.stopped = True
+            return None
+        return results
+
+    # Runs in a worker process: searches a single root move and returns
+    # (score, nodes), or None if the search was stopped. The first root move
+    # of a new search ages the worker's table and move ordering like search
+    # does in the calling process.
+    @staticmethod
+    def search_root_move(chessboard, move, depth, time_left_ms, search_number):
+        if (search_number != AI.search_number):
+            AI.search_number = search_number
+            AI.transposition_table.new_search()
+            AI.new_move_ordering()
+
+        AI.nodes = 0
+        AI.stopped = False
+        AI.deadline = None
+        if (time_left_ms is not None):
+            AI.deadline = time.perf_counter() + time_left_ms / 1000.0
+
+        maximizing = chessboard.turn == pieces.Piece.WHITE
+        bound = AI.shared_bound.value
+        undo = chessboard.make_move(move)
+        if (maximizing):
+            score = AI.alphabeta(chessboard, depth-1, bound - 1, AI.INFINITE, False, 1)
+        else:
+            score = AI.alphabeta(chessboard, depth-1, -AI.INFINITE, bound + 1, True, 1)
+        chessboard.unmake_move(undo)
+        if (AI.stopped):
+            return None
+
+        with AI.shared_bound.get_lock():
+            if (AI.is_better_score(score, AI.shared_bound.value, maximizing)):
+                AI.shared_bound.value = score
+
+        return (score, AI.nodes)
+
+    # Returns the process pool for parallel root searches, (re)creating it if
+    # the number of workers changed.
+    @staticmethod
+    def get_process_pool(workers):
+        if (AI.process_pool is not None and AI.process_pool_workers == workers):
+            return AI.process_pool
+
+        if (AI.process_pool is not None):
+            AI.process_pool.shutdown()
+
+        AI.shared_bound = multiprocessing.Value("q", AI.INFINITE)
+        AI.shared_stop = multiprocessing.Value("b", 0)
+        AI.process_pool = futures.ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=AI.init_worker,
+            initargs=(AI.shared_bound, AI.shared_stop)
+        )
+        AI.process_pool_workers = workers
+        return AI.process_pool
+
+    @staticmethod
+    def init_worker(shared_bound, shared_stop):
+        AI.shared_bound = shared_bound
+        AI.shared_stop = shared_stop
+
+    # Asks the search running in another thread to stop. It returns the best
+    # move of its last completed iteration soon after.
+    @staticmethod
+    def stop():
+        AI.stop_requested = True
+
+    # Counts a searched node and stops the search once the deadline has passed,
+    # a stop was requested or the parent process asked the workers to stop.
+    # The clock is only read every few hundred nodes since it is not free.
+    @staticmethod
+    def count_node():
+        AI.nodes += 1
+        if (AI.nodes % AI.TIME_CHECK_INTERVAL == 0):
+            if (AI.stop_requested):
+                AI.stopped = True
+            if (AI.node_limit is not None and AI.nodes >= AI.node_limit):
+                AI.stopped = True
+            if (AI.deadline is not None and time.perf_counter() >= AI.deadline):
+                AI.stopped = True
+            if (AI.shared_stop is not None and AI.shared_stop.value):
+                AI.stopped = True
+
+    @staticmethod
+    def minimax(chessboard, depth, maximizing):
         if (depth == 0):
-            return Heuristics.evaluate(board)
+            return Heuristics.evaluate(chessboard)
+
+        if (maximizing):
+            moves = chessboard.get_legal_moves(pieces.Piece.WHITE)
+        else:
+            moves = chessboard.get_legal_moves(pieces.Piece.BLACK)
+
+        if (not moves):
+            return AI.get_terminal_score(chessboard, depth, maximizing)
 
         if (maximizing):
             best_score = -AI.INFINITE
-            for move in board.get_possible_moves(pieces.Piece.WHITE):
-                copy = board.Board.clone(board)
-                copy.perform_move(move)
+            for move in moves:
+                undo = chessboard.make_move(move)
+                score = AI.minimax(chessboard, depth-1, False)
+                chessboard.unmake_move(undo)
 
-                score = AI.minimax(copy, depth-1, False)
                 best_score = max(best_score, score)
 
             return best_score
         else:
             best_score = AI.INFINITE
-            for move in board.get_possible_moves(pieces.Piece.BLACK):
-                copy = board.Board.clone(board)
-                copy.perform_move(move)
+            for move in moves:
+                undo = chessboard.make_move(move)
+                score = AI.minimax(chessboard, depth-1, True)
+                chessboard.unmake_move(undo)
 
-                score = AI.minimax(copy, depth-1, True)
                 best_score = min(best_score, score)
 
             return best_score
 
     @staticmethod
-    def alphabeta(chessboard, depth, a, b, maximizing):
+    def alphabeta(chessboard, depth, a, b, maximizing, ply=0, allow_null=True):
+        AI.count_node()
+        if (AI.stopped):
+            return 0
+
+        if (AI.tablebases is not None and chessboard.piece_count <= AI.tablebases.max_pieces):
+            value = AI.tablebases.probe(chessboard)
+            if (value is not None):
+                return AI.get_tablebase_score(chessboard, value, ply)
+
         if (depth == 0):
-            return Heuristics.evaluate(chessboard)
+            return AI.quiescence(chessboard, a, b, maximizing, ply)
 
+        a_original = a
+        b_original = b
+        table = AI.transposition_table
+        entry = table.probe(chessboard.hash)
+        hash_move = 0
+        if (entry is not None):
+            (entry_depth, bound, entry_score, hash_move) = entry
+            if (entry_depth >= depth):
+                if (bound == TranspositionTable.EXACT):
+                    return entry_score
+                if (bound == TranspositionTable.LOWER):
+                    a = max(a, entry_score)
+                else:
+                    b = min(b, entry_score)
+                if (b <= a):
+                    return entry_score
+
+        if (maximizing):
+            color = pieces.Piece.WHITE
+        else:
+            color = pieces.Piece.BLACK
+        in_check = chessboard.is_check(color)
+
+        # Two null moves in a row would only pass the turn back, and without
+        # pieces other than pawns passing may well be the best move there is
+        # (zugzwang), so the null move would prove nothing.
+        if (AI.NULL_MOVE_PRUNING and allow_null and ply > 0 and depth >= AI.NULL_MOVE_MIN_DEPTH
+                and not in_check and AI.has_non_pawn_material(chessboard, color)):
+            chessboard.pass_turn()
+            if (maximizing):
+                score = AI.alphabeta(chessboard, depth-1-AI.NULL_MOVE_REDUCTION, b-1, b, False, ply+1, False)
+            else:
+                score = AI.alphabeta(chessboard, depth-1-AI.NULL_MOVE_REDUCTION, a, a+1, True, ply+1, False)
+            chessboard.pass_turn()
+            if (AI.stopped):
+                return 0
+            if (maximizing and score >= b):
+                return b
+            if (not maximizing and score <= a):
+                return a
+
+        moves = AI.generate_ordered_moves(chessboard, color, ply, hash_move)
+
+        best_move = 0
         if (maximizing):
             best_score = -AI.INFINITE
-            for move in chessboard.get_possible_moves(pieces.Piece.WHITE):
-                copy = board.Board.clone(chessboard)
-                copy.perform_move(move)
+            for (index, move) in enumerate(moves):
+                reduction = AI.get_reduction(chessboard, move, index, depth, in_check)
+                undo = chessboard.make_move(move)
+                score = AI.search_move(chessboard, depth, a, b, maximizing, ply, index, reduction)
+                chessboard.unmake_move(undo)
+                if (AI.stopped):
+                    return 0
 
-                best_score = max(best_score, AI.alphabeta(copy, depth-1, a, b, False))
+                if (score > best_score):
+                    best_score = score
+                    best_move = move
                 a = max(a, best_score)
                 if (b <= a):
+                    AI.store_cutoff(chessboard, move, index, depth, ply)
                     break
-            return best_score
         else:
             best_score = AI.INFINITE
-            for move in chessboard.get_possible_moves(pieces.Piece.BLACK):
-                copy = board.Board.clone(chessboard)
-                copy.perform_move(move)
+            for (index, move) in enumerate(moves):
+                reduction = AI.get_reduction(chessboard, move, index, depth, in_check)
+                undo = chessboard.make_move(move)
+                score = AI.search_move(chessboard, depth, a, b, maximizing, ply, index, reduction)
+                chessboard.unmake_move(undo)
+                if (AI.stopped):
+                    return 0
 
-                best_score = min(best_score, AI.alphabeta(copy, depth-1, a, b, True))
+                if (score < best_score):
+                    best_score = score
+                    best_move = move
                 b = min(b, best_score)
                 if (b <= a):
+                    AI.store_cutoff(chessboard, move, index, depth, ply)
                     break
-            return best_score
+
+        if (best_move == 0):
+            return AI.get_terminal_score(chessboard, depth, maximizing)
+
+        if (best_score <= a_original):
+            bound = TranspositionTable.UPPER
+        elif (best_score >= b_original):
+            bound = TranspositionTable.LOWER
+        else:
+            bound = TranspositionTable.EXACT
+        table.store(chessboard.hash, depth, bound, best_score, best_move)
+
+        return best_score
+
+    # Searches the position after the move at the given index of the ordered
+    # moves of a node, and returns its score. The first move gets the full
+    # window and depth. Later moves first get a null window with principal
+    # variation search and the given reduction, and are searched again with
+    # the full window and depth if the score says the move may be better.
+    @staticmethod
+    def search_move(chessboard, depth, a, b, maximizing, ply, index, reduction):
+        if (reduction > 0 and chessboard.is_check(chessboard.turn)):
+            # Checks are never reduced.
+            reduction = 0
+        if (index == 0 or (reduction == 0 and not AI.PRINCIPAL_VARIATION_SEARCH)):
+            return AI.alphabeta(chessboard, depth-1, a, b, not maximizing, ply+1)
+
+        if (maximizing):
+            low = a
+            high = b
+            if (AI.PRINCIPAL_VARIATION_SEARCH):
+                high = a + 1
+            score = AI.alphabeta(chessboard, depth-1-reduction, low, high, False, ply+1)
+            if (not AI.stopped and score > a and (reduction > 0 or score < b)):
+                score = AI.alphabeta(chessboard, depth-1, a, b, False, ply+1)
+        else:
+            low = a
+            high = b
+            if (AI.PRINCIPAL_VARIATION_SEARCH):
+                low = b - 1
+            score = AI.alphabeta(chessboard, depth-1-reduction, low, high, True, ply+1)
+            if (not AI.stopped and score < b and (reduction > 0 or score > a)):
+                score = AI.alphabeta(chessboard, depth-1, a, b, True, ply+1)
+        return score
+
+    # Returns the plies by which late-move reductions shorten the search of a
+    # move, before it is made. Captures, promotions, moves out of check and
+    # the first moves of a node are never reduced, and neither are checks,
+    # see search_move.
+    @staticmethod
+    def get_reduction(chessboard, move, index, depth, in_check):
+        if (not AI.LATE_MOVE_REDUCTIONS or in_check):
+            return 0
+        if (index < AI.LATE_MOVE_MIN_INDEX or depth < AI.LATE_MOVE_MIN_DEPTH):
+            return 0
+        if (chessboard.squares[move.sqto] != 0 or move.promotion != 0):
+            return 0
+        return 1
+
+    # Returns true iff the color has a piece other than its king and pawns.
+    @staticmethod
+    def has_non_pawn_material(chessboard, color):
+        for piece in chessboard.squares:
+            if (piece != 0 and piece.color == color and piece.piece_type not in (pieces.Pawn.PIECE_TYPE, pieces.King.PIECE_TYPE)):
+                return True
+        return False
+
+    # Searches captures only, until the position is quiet, so the search never
+    # stops in the middle of an exchange. The side to move may stand pat on
+    # the static evaluation instead of capturing, except when in check, where
+    # every legal move is searched. Captures that lose material by static
+    # exchange evaluation are skipped, and so are captures that cannot bring
+    # the score back to the window even with the captured piece won (delta
+    # pruning).
+    @staticmethod
+    def quiescence(chessboard, a, b, maximizing, ply):
+        AI.count_node()
+        if (AI.stopped):
+            return 0
+
+        if (maximizing):
+            color = pieces.Piece.WHITE
+        else:
+            color = pieces.Piece.BLACK
+
+        # A king captured in a position that was not legal to begin with
+        # would count as always in check, so that case stands pat too.
+        if (chessboard.king_positions[color] is not None and chessboard.is_check(color)):
+            stand_pat = None
+            best_score = AI.get_worst_score(maximizing)
+            moves = AI.generate_ordered_moves(chessboard, color, ply, 0)
+        else:
+            stand_pat = Heuristics.evaluate(chessboard)
+            best_score = stand_pat
+            if (maximizing):
+                if (stand_pat >= b):
+                    return stand_pat
+                a = max(a, stand_pat)
+            else:
+                if (stand_pat <= a):
+                    return stand_pat
+                b = min(b, stand_pat)
+            moves = AI.get_ordered_captures(chessboard, color, chessboard.get_legality_context(color))
+
+        searched = False
+        for move in moves:
+            if (stand_pat is not None):
+                gain = chessboard.squares[move.sqto].value + AI.DELTA_MARGIN
+                if (move.promotion != 0):
+                    gain += pieces.Queen.VALUE - pieces.Pawn.VALUE
+                if (maximizing and stand_pat + gain <= a):
+                    continue
+                if (not maximizing and stand_pat - gain >= b):
+                    continue
+                if (chessboard.get_exchange_score(move) < 0):
+                    continue
+
+            searched = True
+            undo = chessboard.make_move(move)
+            score = AI.quiescence(chessboard, a, b, not maximizing, ply+1)
+            chessboard.unmake_move(undo)
+            if (AI.stopped):
+                return 0
+
+            if (maximizing):
+                best_score = max(best_score, score)
+                a = max(a, best_score)
+            else:
+                best_score = min(best_score, score)
+                b = min(b, best_score)
+            if (b <= a):
+                break
+
+        if (stand_pat is None and not searched):
+            return AI.get_terminal_score(chessboard, 0, maximizing)
+        return best_score
+
+    # Returns the score of a position without legal moves: checkmate or
+    # stalemate. Mates closer to the root (more depth left) score higher.
+    @staticmethod
+    def get_terminal_score(chessboard, depth, maximizing):
+        if (maximizing):
+            if (chessboard.is_check(pieces.Piece.WHITE)):
+                return -AI.CHECKMATE - depth
+        else:
+            if (chessboard.is_check(pieces.Piece.BLACK)):
+                return AI.CHECKMATE + depth
+        return 0
+
+    # Converts a tablebase value for the color to move into a search score.
+    # Wins closer to the root score higher, like mates.
+    @staticmethod
+    def get_tablebase_score(chessboard, value, ply):
+        if (value > 0):
+            score = AI.TABLEBASE_WIN - ply - value
+        elif (value < 0):
+            score = -AI.TABLEBASE_WIN + ply + (-value - 1)
+        else:
+            return 0
+        if (chessboard.turn == pieces.Piece.BLACK):
+            score = -score
+        return score
+
+    # Resets the killer moves and ages the history table for a new search.
+    @staticmethod
+    def new_move_ordering():
+        AI.killer_moves = []
+        for key in AI.history:
+            AI.history[key] //= 2
+
+    # Returns the root moves sorted for the search: the best move of the
+    # previous iteration first, then captures by most valuable victim / least
+    # valuable attacker, then the quiet moves in the order they were
+    # generated. Unlike deeper in the tree, killers and history are left out:
+    # in a parallel search they build up in the workers and not here, and
+    # the serial and the parallel search must try the root moves in the same
+    # order to break ties between equal scores the same way.
+    @staticmethod
+    def order_root_moves(chessboard, moves, previous_best):
+        scored_moves = []
+        for move in moves:
+            if (move == previous_best):
+                score = AI.HASH_MOVE_SCORE
+            elif (chessboard.squares[move.sqto] != 0):
+                score = AI.CAPTURE_SCORE + AI.get_capture_score(chessboard, move)
+            else:
+                score = 0
+            scored_moves.append((score, move))
+
+        # The sort is stable, so quiet moves keep their generation order.
+        scored_moves.sort(key=lambda scored_move: scored_move[0], reverse=True)
+        return [move for (score, move) in scored_moves]
+
+    # Yields the legal moves of the given color sorted for the search: the
+    # hash move first, then captures by most valuable victim / least valuable
+    # attacker, then the killer moves of this ply, then the other quiet moves
+    # by history score. The moves come in stages so that a cutoff skips the
+    # work of the later stages: the hash move is tried before any move is
+    # generated, and the quiet moves are only generated once the captures and
+    # killers are done.
+    @staticmethod
+    def generate_ordered_moves(chessboard, color, ply, hash_move):
+        context = chessboard.get_legality_context(color)
+
+        if (hash_move != 0):
+            if (chessboard.is_possible_move(hash_move, color) and chessboard.is_legal_move(hash_move, context)):
+                yield hash_move
+            else:
+                hash_move = 0
+
+        for move in AI.get_ordered_captures(chessboard, color, context):
+            if (move != hash_move):
+                yield move
+
+        killers = []
+        for killer in AI.get_killers(ply):
+            if (killer == hash_move):
+                continue
+            if (chessboard.squares[killer.sqto] != 0):
+                continue
+            if (chessboard.is_possible_move(killer, color) and chessboard.is_legal_move(killer, context)):
+                killers.append(killer)
+                yield killer
+
+        quiet_moves = []
+        for move in chessboard.generate_legal_quiet_moves(color, context):
+            if (move == hash_move):
+                continue
+            if (move in killers):
+                continue
+            quiet_moves.append(move)
+        quiet_moves.sort(key=lambda move: AI.get_history_score(chessboard, move), reverse=True)
+        yield from quiet_moves
+
+    # Returns the legal captures of the given color, most valuable victim
+    # first, then least valuable attacker.
+    @staticmethod
+    def get_ordered_captures(chessboard, color, context):
+        captures = list(chessboard.generate_legal_captures(color, context))
+        captures.sort(key=lambda move: AI.get_capture_score(chessboard, move), reverse=True)
+        return captures
+
+    # Most valuable victim first, then least valuable attacker.
+    @staticmethod
+    def get_capture_score(chessboard, move):
+        piece = chessboard.squares[move.sqfrom]
+        victim = chessboard.squares[move.sqto]
+        return victim.value * 100000 - piece.value
+
+    @staticmethod
+    def get_history_score(chessboard, move):
+        piece = chessboard.squares[move.sqfrom]
+        return AI.history.get((piece.color, move.code), 0)
+
+    @staticmethod
+    def get_killers(ply):
+        if (ply < len(AI.killer_moves)):
+            return AI.killer_moves[ply]
+        return []
+
+    # Records a beta cutoff caused by the move at the given index of the
+    # ordered move list. Quiet moves become killers of the ply and gain
+    # history. The index is used by stats.SearchStats to count the cutoffs
+    # of the first move.
+    @staticmethod
+    def store_cutoff(chessboard, move, index, depth, ply):
+        if (chessboard.squares[move.sqto] != 0):
+            return
+
+        while (len(AI.killer_moves) <= ply):
+            AI.killer_moves.append([])
+        killers = AI.killer_moves[ply]
+        if (move not in killers):
+            killers.insert(0, move)
+            del killers[AI.KILLERS_PER_PLY:]
+
+        piece = chessboard.squares[move.sqfrom]
+        key = (piece.color, move.code)
+        AI.history[key] = AI.history.get(key, 0) + depth * depth
@@ -0,0 +1,140 @@
+import argparse, collections, json, sys, time
+import ai, bitboard
+from concurrent import futures
+
+# Reads FEN or EPD positions line by line, analyzes each one with the AI and
+# writes one JSON object per position, in input order. Only a bounded number
+# of positions is in flight at any time, so inputs of any size can be
+# streamed through.
+
+
+# Splits a FEN or EPD line into (fen, operations). EPD lines have the first
+# four FEN fields followed by operations like: bm e4; id "test 1";
+# They get the default move counters.
+def parse_line(line):
+    fields = line.split(None, 4)
+    if (len(fields) < 4):
+        raise ValueError("Invalid FEN or EPD: " + line)
+
+    rest = ""
+    if (len(fields) > 4):
+        rest = fields[4]
+
+    # A FEN line ends with the half move clock and the full move number.
+    counters = rest.split()
+    if (len(counters) == 2 and counters[0].isdigit() and counters[1].isdigit()):
+        return (line, {})
+
+    fen = " ".join(fields[:4]) + " 0 1"
+    return (fen, parse_operations(rest))
+
+
+# Parses EPD operations into a dictionary from opcode to operand string.
+def parse_operations(text):
+    operations = {}
+    for operation in text.split(";"):
+        operation = operation.strip()
+        if (operation == ""):
+            continue
+
+        parts = operation.split(None, 1)
+        operand = ""
+        if (len(parts) > 1):
+            operand = parts[1].strip().strip('"')
+        operations[parts[0]] = operand
+    return operations
+
+
+# Analyzes the position on the given line and returns the result dictionary.
+# Runs in the worker processes when analyzing in parallel.
+def analyze_line(number, line, backend, time_ms, max_depth):
+    result = {"line": number}
+    try:
+        (fen, operations) = parse_line(line)
+        chessboard = bitboard.BACKENDS[backend].from_fen(fen)
+    except ValueError as error:
+        result["error"] = str(error)
+        return result
+
+    if ("id" in operations):
+        result["id"] = operations["id"]
+    result["fen"] = chessboard.to_fen()
+
+    start = time.perf_counter()
+    (move, score, depth) = ai.AI.search(chessboard, time_ms, max_depth)
+    elapsed = (time.perf_counter() - start) * 1000
+
+    result["move"] = move.to_uci() if move != 0 else None
+    # Scores are from white's point of view.
+    result["score"] = score
+    result["depth"] = depth
+    result["nodes"] = ai.AI.nodes
+    result["milliseconds"] = round(elapsed, 3)
+    return result
+
+
+# Yields (line number, line) for the non-empty lines of the input.
+def read_positions(lines):
+    for (number, line) in enumerate(lines, 1):
+        line = line.strip()
+        if (line != "" and not line.startswith("#")):
+            yield (number, line)
+
+
+# Yields the results of the positions in input order, analyzed in the
+# calling process.
+def analyze_serial(positions, backend, time_ms, max_depth):
+    for (number, line) in positions:
+        yield analyze_line(number, line, backend, time_ms, max_depth)
+
+
+# Yields the results of the positions in input order, analyzed by a pool of
+# worker processes. At most queue_size positions are submitted at a time.
+def analyze_parallel(positions, backend, time_ms, max_depth, workers, queue_size):
+    with futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = collections.deque()
+        for (number, line) in positions:
+            pending.append(pool.submit(analyze_line, number, line, backend, time_ms, max_depth))
+            if (len(pending) >= queue_size):
+                yield pending.popleft().result()
+
+        while (pending):
+            yield pending.popleft().result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyzes a file of FEN or EPD positions and writes JSON lines.")
+    parser.add_argument("input", help="FEN or EPD file, one position per line, - for stdin")
+    parser.add_argument("--time-ms", type=int, default=1000, help="time budget per position in milliseconds (default: 1000)")
+    parser.add_argument("--depth", type=int, help="maximum depth per position")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes (default: 1)")
+    bitboard.add_backend_argument(parser)
+    parser.add_argument("--output", help="file to write the JSON lines to (default: stdout)")
+    args = parser.parse_args()
+
+    source = sys.stdin
+    if (args.input != "-"):
+        source = open(args.input)
+    output = sys.stdout
+    if (args.output is not None):
+        output = open(args.output, "w")
+
+    try:
+        positions = read_positions(source)
+        if (args.workers > 1):
+            results = analyze_parallel(positions, args.backend, args.time_ms, args.depth, args.workers, args.workers * 4)
+        else:
+            results = analyze_serial(positions, args.backend, args.time_ms, args.depth)
+
+        for result in results:
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+    finally:
+        if (source is not sys.stdin):
+            source.close()
+        if (output is not sys.stdout):
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import argparse, json, platform, sys, time
+import ai, bitboard
+from stats import SearchStats
+
+# Fixed positions, searched for the side to move. They all have black to move
+# so that results stay comparable with earlier runs.
+POSITIONS = [
+    ("open", "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1"),
+    ("italian", "r1bqk1nr/pppp1ppp/2n5/2b1p3/2B1P3/5N2/PPPP1PPP/RNBQK2R b KQkq - 5 4"),
+    ("middlegame", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 b - - 0 10"),
+    ("tactics", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R b KQkq - 0 1"),
+    ("endgame", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 b - - 0 1")
+]
+
+
+# Times AI.get_ai_move at a fixed depth on every position, starting each
+# search from an empty transposition table so runs are comparable. With
+# collect_stats the search statistics of every position are added, which
+# slows the search down.
+def benchmark_search(board_class, depth, collect_stats=False):
+    results = []
+    for (name, fen) in POSITIONS:
+        chessboard = board_class.from_fen(fen)
+        ai.AI.transposition_table.clear()
+        stats = SearchStats()
+        if (collect_stats):
+            stats.enable()
+        start = time.perf_counter()
+        move = ai.AI.get_ai_move(chessboard, max_depth=depth)
+        elapsed = time.perf_counter() - start
+        stats.disable()
+
+        result = {
+            "position": name,
+            "depth": depth,
+            "move": move.to_uci() if move != 0 else None,
+            "nodes": ai.AI.nodes,
+            "seconds": elapsed,
+            "nodes_per_second": ai.AI.nodes / max(elapsed, 1e-9)
+        }
+        if (collect_stats):
+            result["stats"] = stats.to_dict()
+        results.append(result)
+    return results
+
+
+# Times Heuristics.evaluate over all positions, repeated the given number of times.
+def benchmark_evaluate(board_class, repeat):
+    boards = [board_class.from_fen(fen) for (name, fen) in POSITIONS]
+    start = time.perf_counter()
+    for i in range(repeat):
+        for chessboard in boards:
+            ai.Heuristics.evaluate(chessboard)
+    elapsed = time.perf_counter() - start
+
+    calls = repeat * len(boards)
+    return {
+        "calls": calls,
+        "seconds": elapsed,
+        "calls_per_second": calls / max(elapsed, 1e-9)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Times the search and the evaluation on a fixed set of positions.")
+    parser.add_argument("--depth", type=int, default=3, help="search depth in plies (default: 3)")
+    parser.add_argument("--repeat", type=int, default=100000, help="evaluations per position (default: 100000)")
+    bitboard.add_backend_argument(parser)
+    parser.add_argument("--stats", action="store_true", help="add search statistics, slows the search down")
+    parser.add_argument("--output", help="file to write the JSON results to (default: stdout)")
+    args = parser.parse_args()
+
+    board_class = bitboard.BACKENDS[args.backend]
+    search = benchmark_search(board_class, args.depth, args.stats)
+    results = {
+        "python": platform.python_version(),
+        "backend": args.backend,
+        "search": search,
+        "search_nodes": sum(result["nodes"] for result in search),
+        "search_seconds": sum(result["seconds"] for result in search),
+        "evaluate": benchmark_evaluate(board_class, args.repeat)
+    }
+
+    if (args.output is None):
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,576 @@
+import board, pieces
+from move import Move
+
+# Squares are numbered 0..63 as y * 8 + x, so square 0 is A8 and square 63 is H1.
+# This matches the "upside down" orientation used by board.Board.
+
+FULL = (1 << 64) - 1
+
+PIECE_TYPES = [
+    pieces.Pawn.PIECE_TYPE,
+    pieces.Knight.PIECE_TYPE,
+    pieces.Bishop.PIECE_TYPE,
+    pieces.Rook.PIECE_TYPE,
+    pieces.Queen.PIECE_TYPE,
+    pieces.King.PIECE_TYPE
+]
+
+PIECE_VALUES = {
+    pieces.Pawn.PIECE_TYPE: pieces.Pawn.VALUE,
+    pieces.Knight.PIECE_TYPE: pieces.Knight.VALUE,
+    pieces.Bishop.PIECE_TYPE: pieces.Bishop.VALUE,
+    pieces.Rook.PIECE_TYPE: pieces.Rook.VALUE,
+    pieces.Queen.PIECE_TYPE: pieces.Queen.VALUE,
+    pieces.King.PIECE_TYPE: pieces.King.VALUE
+}
+
+# Rows a pawn lands on after a single push from its starting row.
+WHITE_DOUBLE_PUSH_ROW = 0xFF << (5 * 8)
+BLACK_DOUBLE_PUSH_ROW = 0xFF << (2 * 8)
+
+
+def square(x, y):
+    return y * 8 + x
+
+
+def bit(x, y):
+    return 1 << square(x, y)
+
+
+# BITS[x][y] is bit(x, y), precomputed for the hot paths.
+BITS = [[bit(x, y) for y in range(8)] for x in range(8)]
+
+
+# Returns the bitboard of all the given (dx, dy) offsets from every square.
+def get_step_attacks(offsets):
+    attacks = []
+    for sq in range(64):
+        x = sq % 8
+        y = sq // 8
+        mask = 0
+        for (dx, dy) in offsets:
+            if (0 <= x + dx < 8 and 0 <= y + dy < 8):
+                mask |= bit(x + dx, y + dy)
+        attacks.append(mask)
+    return attacks
+
+
+# Returns the bitboard of the squares on the ray starting next to every square
+# going in direction (dx, dy) until the edge of the board.
+def get_rays(dx, dy):
+    rays = []
+    for sq in range(64):
+        x = sq % 8 + dx
+        y = sq // 8 + dy
+        mask = 0
+        while (0 <= x < 8 and 0 <= y < 8):
+            mask |= bit(x, y)
+            x += dx
+            y += dy
+        rays.append(mask)
+    return rays
+
+
+KNIGHT_ATTACKS = get_step_attacks([(2, 1), (-1, 2), (-2, 1), (1, -2), (2, -1), (1, 2), (-2, -1), (-1, -2)])
+KING_ATTACKS = get_step_attacks([(1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)])
+
+# The squares a pawn of the given color attacks. White pawns move towards y = 0.
+PAWN_ATTACKS = {
+    pieces.Piece.WHITE: get_step_attacks([(1, -1), (-1, -1)]),
+    pieces.Piece.BLACK: get_step_attacks([(1, 1), (-1, 1)])
+}
+
+# Each direction is (rays, positive) where positive tells whether the square
+# indices increase along the ray. The nearest blocker on a positive ray is the
+# lowest set bit, on a negative ray it is the highest set bit.
+ROOK_DIRECTIONS = [
+    (get_rays(1, 0), True),
+    (get_rays(0, 1), True),
+    (get_rays(-1, 0), False),
+    (get_rays(0, -1), False)
+]
+
+BISHOP_DIRECTIONS = [
+    (get_rays(1, 1), True),
+    (get_rays(-1, 1), True),
+    (get_rays(-1, -1), False),
+    (get_rays(1, -1), False)
+]
+
+# Every square a rook or bishop could reach from each square on an empty board.
+ROOK_RAYS = [sum(rays[sq] for (rays, positive) in ROOK_DIRECTIONS) for sq in range(64)]
+BISHOP_RAYS = [sum(rays[sq] for (rays, positive) in BISHOP_DIRECTIONS) for sq in range(64)]
+
+
+# Returns a table where table[a][b] has the squares strictly between a and b
+# set if they share a rank, file or diagonal, and is 0 otherwise.
+def get_between():
+    between = [[0] * 64 for sq in range(64)]
+    for (dx, dy) in pieces.Piece.HORIZONTAL_DIRECTIONS + pieces.Piece.DIAGONAL_DIRECTIONS:
+        for sq in range(64):
+            x = sq % 8 + dx
+            y = sq // 8 + dy
+            mask = 0
+            while (0 <= x < 8 and 0 <= y < 8):
+                between[sq][square(x, y)] = mask
+                mask |= bit(x, y)
+                x += dx
+                y += dy
+    return between
+
+
+BETWEEN = get_between()
+
+# MOVES[sqfrom][sqto] is the move between two squares. Moves are immutable,
+# so like the pieces they are created once and shared. PAWN_MOVES holds the
+# same moves with the queen promotion of a pawn reaching the last row.
+MOVES = [[Move(sqfrom % 8, sqfrom // 8, sqto % 8, sqto // 8) for sqto in range(64)] for sqfrom in range(64)]
+PAWN_MOVES = [
+    [Move(sqfrom % 8, sqfrom // 8, sqto % 8, sqto // 8, pieces.Queen.PIECE_TYPE) if (sqto < 8 or sqto >= 56) else MOVES[sqfrom][sqto] for sqto in range(64)]
+    for sqfrom in range(64)
+]
+
+
+# Returns the squares attacked from the given square by a piece sliding in the
+# given directions, stopping at (and including) the first occupied square.
+def get_sliding_attacks(sq, occupied, directions):
+    attacks = 0
+    for (rays, positive) in directions:
+        ray = rays[sq]
+        blockers = ray & occupied
+        if (blockers):
+            if (positive):
+                blocker = (blockers & -blockers).bit_length() - 1
+            else:
+                blocker = blockers.bit_length() - 1
+            ray ^= rays[blocker]
+        attacks |= ray
+    return attacks
+
+
+def get_bishop_attacks(sq, occupied):
+    return get_sliding_attacks(sq, occupied, BISHOP_DIRECTIONS)
+
+
+def get_rook_attacks(sq, occupied):
+    return get_sliding_attacks(sq, occupied, ROOK_DIRECTIONS)
+
+
+# Yields the square index of every set bit, lowest first.
+def get_squares(bitboard):
+    while (bitboard):
+        lowest = bitboard & -bitboard
+        yield lowest.bit_length() - 1
+        bitboard ^= lowest
+
+
+class BitBoard(board.Board):
+
+    # Keeps one 64-bit bitboard per piece type and color next to the
+    # squares array. Move generation, attack detection, pins, legality and
+    # exchanges work on the bitboards, the squares array is kept in sync for
+    # piece lookups.
+    def __init__(self, squares, white_king_moved, black_king_moved, turn=pieces.Piece.WHITE, halfmove_clock=0, fullmove_number=1):
+        super(BitBoard, self).__init__(squares, white_king_moved, black_king_moved, turn, halfmove_clock, fullmove_number)
+        self.bitboards = {
+            pieces.Piece.WHITE: dict.fromkeys(PIECE_TYPES, 0),
+            pieces.Piece.BLACK: dict.fromkeys(PIECE_TYPES, 0)
+        }
+        self.occupancy = {pieces.Piece.WHITE: 0, pieces.Piece.BLACK: 0}
+
+        for (sq, piece) in enumerate(squares):
+            if (piece != 0):
+                self.bitboards[piece.color][piece.piece_type] |= 1 << sq
+                self.occupancy[piece.color] |= 1 << sq
+
+    def copy_state(self, chessboard):
+        super(BitBoard, self).copy_state(chessboard)
+        self.bitboards = {
+            pieces.Piece.WHITE: dict(chessboard.bitboards[pieces.Piece.WHITE]),
+            pieces.Piece.BLACK: dict(chessboard.bitboards[pieces.Piece.BLACK])
+        }
+        self.occupancy = dict(chessboard.occupancy)
+
+    def move_piece(self, xfrom, yfrom, xto, yto):
+        piece = self.squares[yfrom*8 + xfrom]
+        captured = self.squares[yto*8 + xto]
+        if (captured != 0):
+            self.bitboards[captured.color][captured.piece_type] &= ~BITS[xto][yto]
+            self.occupancy[captured.color] &= ~BITS[xto][yto]
+
+        moved = BITS[xfrom][yfrom] | BITS[xto][yto]
+        self.bitboards[piece.color][piece.piece_type] ^= moved
+        self.occupancy[piece.color] ^= moved
+
+        super(BitBoard, self).move_piece(xfrom, yfrom, xto, yto)
+
+    def set_piece(self, x, y, piece):
+        old_piece = self.squares[y*8 + x]
+        if (old_piece != 0):
+            self.bitboards[old_piece.color][old_piece.piece_type] &= ~BITS[x][y]
+            self.occupancy[old_piece.color] &= ~BITS[x][y]
+
+        if (piece != 0):
+            self.bitboards[piece.color][piece.piece_type] |= BITS[x][y]
+            self.occupancy[piece.color] |= BITS[x][y]
+
+        super(BitBoard, self).set_piece(x, y, piece)
+
+    # Yields the captures of the given color piece by piece.
+    def generate_captures(self, color):
+        occupied = self.occupancy[pieces.Piece.WHITE] | self.occupancy[pieces.Piece.BLACK]
+        enemies = self.occupancy[get_other_color(color)]
+
+        pawns = self.bitboards[color][pieces.Pawn.PIECE_TYPE]
+        attacks = PAWN_ATTACKS[color]
+        for sq in get_squares(pawns):
+            for sqto in get_squares(attacks[sq] & enemies):
+                yield get_pawn_move(sq, sqto)
+
+        yield from self.generate_piece_moves(color, enemies, occupied)
+
+    # Yields the non-capturing moves of the given color piece by piece.
+    def generate_quiet_moves(self, color):
+        occupied = self.occupancy[pieces.Piece.WHITE] | self.occupancy[pieces.Piece.BLACK]
+        empty = ~occupied & FULL
+
+        yield from self.generate_piece_moves(color, empty, occupied)
+
+        for sq in get_squares(self.bitboards[color][pieces.King.PIECE_TYPE]):
+            king = self.squares[sq]
+            castle = king.get_castle_kingside_move(self, sq % 8, sq // 8)
+            if (castle != 0):
+                yield castle
+            castle = king.get_castle_queenside_move(self, sq % 8, sq // 8)
+            if (castle != 0):
+                yield castle
+
+        pawns = self.bitboards[color][pieces.Pawn.PIECE_TYPE]
+        if (color == pieces.Piece.WHITE):
+            step = -8
+            single = (pawns >> 8) & empty
+            double = ((single & WHITE_DOUBLE_PUSH_ROW) >> 8) & empty
+        else:
+            step = 8
+            single = (pawns << 8) & empty
+            double = ((single & BLACK_DOUBLE_PUSH_ROW) << 8) & empty
+
+        for sq in get_squares(single):
+            yield get_pawn_move(sq - step, sq)
+
+        for sq in get_squares(double):
+            yield get_move(sq - 2 * step, sq)
+
+    # Yields the knight, bishop, rook, queen and king moves of the given color
+    # that end on a square set in targets.
+    def generate_piece_moves(self, color, targets, occupied):
+        bitboards = self.bitboards[color]
+
+        for sq in get_squares(bitboards[pieces.Knight.PIECE_TYPE]):
+            yield from generate_moves(sq, KNIGHT_ATTACKS[sq] & targets)
+
+        for sq in get_squares(bitboards[pieces.Bishop.PIECE_TYPE]):
+            yield from generate_moves(sq, get_bishop_attacks(sq, occupied) & targets)
+
+        for sq in get_squares(bitboards[pieces.Rook.PIECE_TYPE]):
+            yield from generate_moves(sq, get_rook_attacks(sq, occupied) & targets)
+
+        for sq in get_squares(bitboards[pieces.Queen.PIECE_TYPE]):
+            attacks = get_bishop_attacks(sq, occupied) | get_rook_attacks(sq, occupied)
+            yield from generate_moves(sq, attacks & targets)
+
+        for sq in get_squares(bitboards[pieces.King.PIECE_TYPE]):
+            yield from generate_moves(sq, KING_ATTACKS[sq] & targets)
+
+    # Returns true iff any piece of by_color attacks the given position.
+    def is_square_attacked(self, x, y, by_color):
+        sq = square(x, y)
+        bitboards = self.bitboards[by_color]
+        occupied = self.occupancy[pieces.Piece.WHITE] | self.occupancy[pieces.Piece.BLACK]
+
+        if (KNIGHT_ATTACKS[sq] & bitboards[pieces.Knight.PIECE_TYPE]):
+            return True
+        if (KING_ATTACKS[sq] & bitboards[pieces.King.PIECE_TYPE]):
+            return True
+        # A pawn of by_color attacks sq iff a pawn of the other color on sq would attack it.
+        if (PAWN_ATTACKS[get_other_color(by_color)][sq] & bitboards[pieces.Pawn.PIECE_TYPE]):
+            return True
+
+        queens = bitboards[pieces.Queen.PIECE_TYPE]
+        if (get_bishop_attacks(sq, occupied) & (bitboards[pieces.Bishop.PIECE_TYPE] | queens)):
+            return True
+        if (get_rook_attacks(sq, occupied) & (bitboards[pieces.Rook.PIECE_TYPE] | queens)):
+            return True
+
+        return False
+
+    # Returns the bitboard of the pieces of by_color attacking square sq when
+    # the squares set in occupied are the occupied ones.
+    def get_attackers_bitboard(self, sq, by_color, occupied):
+        bitboards = self.bitboards[by_color]
+        queens = bitboards[pieces.Queen.PIECE_TYPE]
+        return ((KNIGHT_ATTACKS[sq] & bitboards[pieces.Knight.PIECE_TYPE])
+            | (KING_ATTACKS[sq] & bitboards[pieces.King.PIECE_TYPE])
+            | (PAWN_ATTACKS[get_other_color(by_color)][sq] & bitboards[pieces.Pawn.PIECE_TYPE])
+            | (get_bishop_attacks(sq, occupied) & (bitboards[pieces.Bishop.PIECE_TYPE] | queens))
+            | (get_rook_attacks(sq, occupied) & (bitboards[pieces.Rook.PIECE_TYPE] | queens)))
+
+    def get_attackers(self, x, y, by_color):
+        occupied = self.occupancy[pieces.Piece.WHITE] | self.occupancy[pieces.Piece.BLACK]
+        return [(sq % 8, sq // 8) for sq in get_squares(self.get_attackers_bitboard(square(x, y), by_color, occupied))]
+
+    # Returns the pieces of the given color pinned to its king on king_sq, as
+    # a dictionary from their square to the bitboard of the squares they may
+    # still move to: the squares up to and including the pinning piece.
+    def get_pin_masks(self, king_sq, color, occupied):
+        enemies = self.bitboards[get_other_color(color)]
+        queens = enemies[pieces.Queen.PIECE_TYPE]
+        snipers = ((ROOK_RAYS[king_sq] & (enemies[pieces.Rook.PIECE_TYPE] | queens))
+            | (BISHOP_RAYS[king_sq] & (enemies[pieces.Bishop.PIECE_TYPE] | queens)))
+
+        pins = {}
+        for sq in get_squares(snipers):
+            blockers = BETWEEN[king_sq][sq] & occupied
+            # Pinned iff exactly one piece is in between and it is our own.
+            if (blockers and not blockers & (blockers - 1) and blockers & self.occupancy[color]):
+                pins[blockers.bit_length() - 1] = BETWEEN[king_sq][sq] | (1 << sq)
+        return pins
+
+    # Collects what the legal move generation needs to know about the king
+    # of the given color as bitboards: (other_color, king_sq, checkers,
+    # evasions, pins), where evasions has the squares a non-king move has to
+    # land on (all squares out of check, none in double check) and pins is
+    # from get_pin_masks. Returns None if the king is missing, in which case
+    # every move is legal.
+    def get_legality_context(self, color):
+        king = self.bitboards[color][pieces.King.PIECE_TYPE]
+        if (not king):
+            return None
+
+        king_sq = king.bit_length() - 1
+        other_color = get_other_color(color)
+        occupied = self.occupancy[pieces.Piece.WHITE] | self.occupancy[pieces.Piece.BLACK]
+        checkers = self.get_attackers_bitboard(king_sq, other_color, occupied)
+        if (not checkers):
+            evasions = FULL
+        elif (checkers & (checkers - 1)):
+            evasions = 0
+        else:
+            evasions = checkers | BETWEEN[king_sq][checkers.bit_length() - 1]
+
+        return (other_color, king_sq, checkers, evasions, self.get_pin_masks(king_sq, color, occupied))
+
+    # Returns true iff the possible move does not leave the own king in
+    # check, see get_legality_context.
+    def is_legal_move(self, move, context):
+        if (context is None):
+            return True
+
+        (other_color, king_sq, checkers, evasions, pins) = context
+        sqfrom = move.sqfrom
+        if (sqfrom == king_sq):
+            return self.is_safe_king_move(sqfrom, move.sqto, other_color, checkers)
+
+        target = 1 << move.sqto
+        return (target & evasions & pins.get(sqfrom, FULL)) != 0
+
+    # Returns true iff the king of the other color than other_color can move
+    # from king_sq to sqto without being in check after the move. The
+    # attacks are computed with the king gone from king_sq, so that it
+    # cannot step back along the line of a checking slider.
+    def is_safe_king_move(self, king_sq, sqto, other_color, checkers):
+        occupied = (self.occupancy[pieces.Piece.WHITE] | self.occupancy[pieces.Piece.BLACK]) ^ (1 << king_sq)
+        if (abs(sqto - king_sq) == 2):
+            # Castling is not allowed out of check or through an attacked square.
+            if (checkers or self.get_attackers_bitboard((king_sq + sqto) // 2, other_color, occupied)):
+                return False
+        return not self.get_attackers_bitboard(sqto, other_color, occupied)
+
+    # Returns true iff the piece of the given color on the move's from square
+    # can make the move. Knights and sliders are looked up in the attack
+    # tables, pawns and kings are left to the pieces.
+    def is_possible_move(self, move, color):
+        piece = self.squares[move.sqfrom]
+        if (piece == 0 or piece.color != color):
+            return False
+        if (piece.piece_type in (pieces.Pawn.PIECE_TYPE, pieces.King.PIECE_TYPE)):
+            return super(BitBoard, self).is_possible_move(move, color)
+        # Only pawn and king moves have flags.
+        if (move.code > Move.SQUARES_MASK):
+            return False
+
+        occupied = self.occupancy[pieces.Piece.WHITE] | self.occupancy[pieces.Piece.BLACK]
+        targets = get_piece_attacks(piece.piece_type, move.sqfrom, occupied) & ~self.occupancy[color]
+        return (targets & (1 << move.sqto)) != 0
+
+    # Yields the legal captures of the given color, in the order of
+    # generate_captures. Instead of testing the moves one by one, the targets
+    # of every piece are masked with the legality context.
+    def generate_legal_captures(self, color, context):
+        if (context is None):
+            yield from self.generate_captures(color)
+            return
+
+        (other_color, king_sq, checkers, evasions, pins) = context
+        occupied = self.occupancy[pieces.Piece.WHITE] | self.occupancy[pieces.Piece.BLACK]
+        enemies = self.occupancy[other_color]
+        targets = enemies & evasions
+
+        if (targets):
+            attacks = PAWN_ATTACKS[color]
+            for sq in get_squares(self.bitboards[color][pieces.Pawn.PIECE_TYPE]):
+                for sqto in get_squares(attacks[sq] & targets & pins.get(sq, FULL)):
+                    yield PAWN_MOVES[sq][sqto]
+
+        yield from self.generate_legal_piece_moves(color, context, targets, enemies, occupied)
+
+    # Yields the legal non-capturing moves of the given color, in the order of
+    # generate_quiet_moves.
+    def generate_legal_quiet_moves(self, color, context):
+        if (context is None):
+            yield from self.generate_quiet_moves(color)
+            return
+
+        (other_color, king_sq, checkers, evasions, pins) = context
+        occupied = self.occupancy[pieces.Piece.WHITE] | self.occupancy[pieces.Piece.BLACK]
+        empty = ~occupied & FULL
+        targets = empty & evasions
+
+        yield from self.generate_legal_piece_moves(color, context, targets, empty, occupied)
+
+        if (not checkers):
+            king = self.squares[king_sq]
+            for castle in (king.get_castle_kingside_move(self, king_sq % 8, king_sq // 8), king.get_castle_queenside_move(self, king_sq % 8, king_sq // 8)):
+                if (castle != 0 and self.is_safe_king_move(king_sq, castle.sqto, other_color, checkers)):
+                    yield castle
+
+        if (not targets):
+            return
+        pawns = self.bitboards[color][pieces.Pawn.PIECE_TYPE]
+        if (color == pieces.Piece.WHITE):
+            step = -8
+            single = (pawns >> 8) & empty
+            double = ((single & WHITE_DOUBLE_PUSH_ROW) >> 8) & empty
+        else:
+            step = 8
+            single = (pawns << 8) & empty
+            double = ((single & BLACK_DOUBLE_PUSH_ROW) << 8) & empty
+
+        for sq in get_squares(single & evasions):
+            if (pins.get(sq - step, FULL) & (1 << sq)):
+                yield PAWN_MOVES[sq - step][sq]
+
+        for sq in get_squares(double & evasions):
+            if (pins.get(sq - 2 * step, FULL) & (1 << sq)):
+                yield MOVES[sq - 2 * step][sq]
+
+    # Yields the legal knight, bishop, rook, queen and king moves of the given
+    # color. Pieces other than the king move to the squares set in targets,
+    # the king to the safe squares set in king_targets.
+    def generate_legal_piece_moves(self, color, context, targets, king_targets, occupied):
+        (other_color, king_sq, checkers, evasions, pins) = context
+        bitboards = self.bitboards[color]
+
+        if (targets):
+            for sq in get_squares(bitboards[pieces.Knight.PIECE_TYPE]):
+                yield from generate_moves(sq, KNIGHT_ATTACKS[sq] & targets & pins.get(sq, FULL))
+
+            for sq in get_squares(bitboards[pieces.Bishop.PIECE_TYPE]):
+                yield from generate_moves(sq, get_bishop_attacks(sq, occupied) & targets & pins.get(sq, FULL))
+
+            for sq in get_squares(bitboards[pieces.Rook.PIECE_TYPE]):
+                yield from generate_moves(sq, get_rook_attacks(sq, occupied) & targets & pins.get(sq, FULL))
+
+            for sq in get_squares(bitboards[pieces.Queen.PIECE_TYPE]):
+                attacks = get_bishop_attacks(sq, occupied) | get_rook_attacks(sq, occupied)
+                yield from generate_moves(sq, attacks & targets & pins.get(sq, FULL))
+
+        occupied ^= 1 << king_sq
+        for sqto in get_squares(KING_ATTACKS[king_sq] & king_targets):
+            if (not self.get_attackers_bitboard(sqto, other_color, occupied)):
+                yield MOVES[king_sq][sqto]
+
+    # Static exchange evaluation of a capture, see Board.get_exchange_score.
+    # Pieces are taken off a copy of the occupancy, which uncovers the
+    # sliders behind them, and the least valuable attacker is found by
+    # trying the piece types from cheapest to most valuable.
+    def get_exchange_score(self, move):
+        sq = move.sqto
+        occupied = (self.occupancy[pieces.Piece.WHITE] | self.occupancy[pieces.Piece.BLACK]) ^ (1 << move.sqfrom)
+        attacker = self.squares[move.sqfrom]
+        # gains[i] is what the side making capture i wins if it stops there.
+        gains = [self.squares[sq].value]
+
+        color = get_other_color(attacker.color)
+        while (True):
+            attackers = self.get_attackers_bitboard(sq, color, occupied) & occupied
+            if (not attackers):
+                break
+
+            gains.append(attacker.value - gains[-1])
+            if (attacker.piece_type == pieces.King.PIECE_TYPE):
+                # The king could not have captured into a defended square.
+                break
+            for piece_type in PIECE_TYPES:
+                candidates = attackers & self.bitboards[color][piece_type]
+                if (candidates):
+                    break
+            lowest = candidates & -candidates
+            attacker = self.squares[lowest.bit_length() - 1]
+            occupied ^= lowest
+            color = get_other_color(color)
+
+        # Each side only recaptures if it gains more than by stopping.
+        while (len(gains) > 1):
+            gain = gains.pop()
+            gains[-1] = -max(-gains[-1], gain)
+        return gains[0]
+
+
+# The board implementations by the name the command line tools take.
+BACKENDS = {
+    "board": board.Board,
+    "bitboard": BitBoard
+}
+DEFAULT_BACKEND = "bitboard"
+
+
+# Adds the --backend option choosing one of BACKENDS to a command line parser.
+def add_backend_argument(parser):
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default=DEFAULT_BACKEND, help="board implementation (default: " + DEFAULT_BACKEND + ")")
+
+
+def get_other_color(color):
+    if (color == pieces.Piece.WHITE):
+        return pieces.Piece.BLACK
+    return pieces.Piece.WHITE
+
+
+def get_move(sqfrom, sqto):
+    return MOVES[sqfrom][sqto]
+
+
+# A pawn reaching the last row always promotes to a queen.
+def get_pawn_move(sqfrom, sqto):
+    return PAWN_MOVES[sqfrom][sqto]
+
+
+# Yields a move from sqfrom to every square set in targets.
+# The loop of get_squares is inlined, as this runs once per generated move.
+def generate_moves(sqfrom, targets):
+    moves = MOVES[sqfrom]
+    while (targets):
+        lowest = targets & -targets
+        yield moves[lowest.bit_length() - 1]
+        targets ^= lowest
+
+
+# Returns the squares attacked from sq by a knight, bishop, rook or queen.
+def get_piece_attacks(piece_type, sq, occupied):
+    if (piece_type == pieces.Knight.PIECE_TYPE):
+        return KNIGHT_ATTACKS[sq]
+    if (piece_type == pieces.Bishop.PIECE_TYPE):
+        return get_bishop_attacks(sq, occupied)
+    if (piece_type == pieces.Rook.PIECE_TYPE):
+        return get_rook_attacks(sq, occupied)
+    return get_bishop_attacks(sq, occupied) | get_rook_attacks(sq, occupied)
@@ -1,103 +1,562 @@
-import pieces
+import ai, pieces
 from move import Move
+from zobrist import Zobrist
 
 class Board:
 
     WIDTH = 8
     HEIGHT = 8
 
-    def __init__(self, chesspieces, white_king_moved, black_king_moved):
-        self.chesspieces = chesspieces
+    KNIGHT_OFFSETS = pieces.Knight.OFFSETS
+    KING_OFFSETS = pieces.King.OFFSETS
+    ROOK_DIRECTIONS = pieces.Piece.HORIZONTAL_DIRECTIONS
+    BISHOP_DIRECTIONS = pieces.Piece.DIAGONAL_DIRECTIONS
+    ROOK_SLIDERS = (pieces.Rook.PIECE_TYPE, pieces.Queen.PIECE_TYPE)
+    BISHOP_SLIDERS = (pieces.Bishop.PIECE_TYPE, pieces.Queen.PIECE_TYPE)
+
+    # squares is a flat list of 64 pieces (or 0 for an empty square), indexed
+    # by y * 8 + x. Pieces are shared flyweights, so copying the list copies
+    # the position.
+    def __init__(self, squares, white_king_moved, black_king_moved, turn=pieces.Piece.WHITE, halfmove_clock=0, fullmove_number=1):
+        self.squares = squares
         self.white_king_moved = white_king_moved
         self.black_king_moved = black_king_moved
+        # (x, y) of each king, or None while a king is captured during search.
+        self.king_positions = {pieces.Piece.WHITE: None, pieces.Piece.BLACK: None}
+        # Number of pieces on the board, kings included.
+        self.piece_count = 64 - squares.count(0)
+        for (sq, piece) in enumerate(squares):
+            if (piece != 0 and piece.piece_type == pieces.King.PIECE_TYPE):
+                self.king_positions[piece.color] = (sq % 8, sq // 8)
+        # Running material and piece-square totals read by ai.Heuristics.evaluate.
+        self.material_score = ai.Heuristics.get_material_score(self)
+        self.position_score = ai.Heuristics.get_position_score(self)
+        # The color to move next. Every make_move passes the turn to the other color.
+        self.turn = turn
+        # Plies since the last capture or pawn move, and the number of the
+        # current full move, as in FEN.
+        self.halfmove_clock = halfmove_clock
+        self.fullmove_number = fullmove_number
+        # Zobrist hash of the position, updated incrementally on every change.
+        self.hash = Zobrist.get_hash(self)
+        # Zobrist hash of the pawns only, kept up to date the same way.
+        self.pawn_hash = Zobrist.get_pawn_hash(self)
 
     @classmethod
     def clone(cls, chessboard):
-        chesspieces = [[0 for x in range(Board.WIDTH)] for y in range(Board.HEIGHT)]
-        for x in range(Board.WIDTH):
-            for y in range(Board.HEIGHT):
-                piece = chessboard.chesspieces[x][y]
-                if (piece != 0):
-                    chesspieces[x][y] = piece.clone()
-        return cls(chesspieces, chessboard.white_king_moved, chessboard.black_king_moved)
+        # Clone into the class of the given board so other backends survive
+        # cloning. __init__ is skipped: the scores, hashes and other derived
+        # state are copied instead of computed again from the squares.
+        clone = type(chessboard).__new__(type(chessboard))
+        clone.copy_state(chessboard)
+        return clone
+
+    # Copies the position and all the state kept up to date with it from
+    # the given board. Backends with more state extend this.
+    def copy_state(self, chessboard):
+        self.squares = list(chessboard.squares)
+        self.white_king_moved = chessboard.white_king_moved
+        self.black_king_moved = chessboard.black_king_moved
+        self.king_positions = dict(chessboard.king_positions)
+        self.piece_count = chessboard.piece_count
+        self.material_score = chessboard.material_score
+        self.position_score = chessboard.position_score
+        self.turn = chessboard.turn
+        self.halfmove_clock = chessboard.halfmove_clock
+        self.fullmove_number = chessboard.fullmove_number
+        self.hash = chessboard.hash
+        self.pawn_hash = chessboard.pawn_hash
 
     @classmethod
     def new(cls):
-        chess_pieces = [[0 for x in range(Board.WIDTH)] for y in range(Board.HEIGHT)]
-        # Create pawns.
+        squares = [0] * (Board.WIDTH * Board.HEIGHT)
+        back_row = [
+            pieces.Rook.PIECE_TYPE, pieces.Knight.PIECE_TYPE, pieces.Bishop.PIECE_TYPE, pieces.Queen.PIECE_TYPE,
+            pieces.King.PIECE_TYPE, pieces.Bishop.PIECE_TYPE, pieces.Knight.PIECE_TYPE, pieces.Rook.PIECE_TYPE
+        ]
         for x in range(Board.WIDTH):
-            chess_pieces[x][Board.HEIGHT-2] = pieces.Pawn(x, Board.HEIGHT-2, pieces.Piece.WHITE)
-            chess_pieces[x][1] = pieces.Pawn(x, 1, pieces.Piece.BLACK)
-
-        # Create rooks.
-        chess_pieces[0][Board.HEIGHT-1] = pieces.Rook(0, Board.HEIGHT-1, pieces.Piece.WHITE)
-        chess_pieces[Board.WIDTH-1][Board.HEIGHT-1] = pieces.Rook(Board.WIDTH-1, Board.HEIGHT-1, pieces.Piece.WHITE)
-        chess_pieces[0][0] = pieces.Rook(0, 0, pieces.Piece.BLACK)
-        chess_pieces[Board.WIDTH-1][0] = pieces.Rook(Board.WIDTH-1, 0, pieces.Piece.BLACK)
-
-        # Create Knights.
-        chess_pieces[1][Board.HEIGHT-1] = pieces.Knight(1, Board.HEIGHT-1, pieces.Piece.WHITE)
-        chess_pieces[Board.WIDTH-2][Board.HEIGHT-1] = pieces.Knight(Board.WIDTH-2, Board.HEIGHT-1, pieces.Piece.WHITE)
-        chess_pieces[1][0] = pieces.Knight(1, 0, pieces.Piece.BLACK)
-        chess_pieces[Board.WIDTH-2][0] = pieces.Knight(Board.WIDTH-2, 0, pieces.Piece.BLACK)
-
-        # Create Bishops.
-        chess_pieces[2][Board.HEIGHT-1] = pieces.Bishop(2, Board.HEIGHT-1, pieces.Piece.WHITE)
-        chess_pieces[Board.WIDTH-3][Board.HEIGHT-1] = pieces.Bishop(Board.WIDTH-3, Board.HEIGHT-1, pieces.Piece.WHITE)
-        chess_pieces[2][0] = pieces.Bishop(2, 0, pieces.Piece.BLACK)
-        chess_pieces[Board.WIDTH-3][0] = pieces.Bishop(Board.WIDTH-3, 0, pieces.Piece.BLACK)
-
-        # Create King & Queen.
-        chess_pieces[4][Board.HEIGHT-1] = pieces.King(4, Board.HEIGHT-1, pieces.Piece.WHITE)
-        chess_pieces[3][Board.HEIGHT-1] = pieces.Queen(3, Board.HEIGHT-1, pieces.Piece.WHITE)
-        chess_pieces[4][0] = pieces.King(4, 0, pieces.Piece.BLACK)
-        chess_pieces[3][0] = pieces.Queen(3, 0, pieces.Piece.BLACK)
-
-        return cls(chess_pieces, False, False)
+            # Create the pieces, the board is "upside down" so black starts at y = 0.
+            squares[x] = pieces.get_piece(back_row[x], pieces.Piece.BLACK)
+            squares[Board.WIDTH + x] = pieces.get_piece(pieces.Pawn.PIECE_TYPE, pieces.Piece.BLACK)
+            squares[(Board.HEIGHT-2) * Board.WIDTH + x] = pieces.get_piece(pieces.Pawn.PIECE_TYPE, pieces.Piece.WHITE)
+            squares[(Board.HEIGHT-1) * Board.WIDTH + x] = pieces.get_piece(back_row[x], pieces.Piece.WHITE)
+
+        return cls(squares, False, False)
+
+    # Creates a board from a FEN string. The board only tracks whether each
+    # king has moved, so a side without any castling rights gets a moved king.
+    # The en passant square is ignored, and the move counters are optional.
+    # Raises ValueError for an invalid FEN, which includes a FEN without
+    # exactly one king of each color.
+    @classmethod
+    def from_fen(cls, fen):
+        fields = fen.split()
+        if (len(fields) < 2):
+            raise ValueError("Invalid FEN: " + fen)
+
+        rows = fields[0].split("/")
+        if (len(rows) != Board.HEIGHT):
+            raise ValueError("Invalid FEN: " + fen)
+
+        # FEN starts at rank 8, which is y = 0.
+        squares = [0] * (Board.WIDTH * Board.HEIGHT)
+        for (y, row) in enumerate(rows):
+            x = 0
+            for char in row:
+                if (char.isdigit()):
+                    x += int(char)
+                    continue
+
+                if (x >= Board.WIDTH or char.upper() not in pieces.PIECES[pieces.Piece.WHITE]):
+                    raise ValueError("Invalid FEN: " + fen)
+                color = pieces.Piece.WHITE if char.isupper() else pieces.Piece.BLACK
+                squares[y*Board.WIDTH + x] = pieces.get_piece(char.upper(), color)
+                x += 1
+
+            if (x != Board.WIDTH):
+                raise ValueError("Invalid FEN: " + fen)
+
+        # Move generation and the legality checks need exactly one king per side.
+        for color in (pieces.Piece.WHITE, pieces.Piece.BLACK):
+            king = pieces.get_piece(pieces.King.PIECE_TYPE, color)
+            if (squares.count(king) != 1):
+                raise ValueError("Invalid FEN, each side needs exactly one king: " + fen)
+
+        if (fields[1] == "w"):
+            turn = pieces.Piece.WHITE
+        elif (fields[1] == "b"):
+            turn = pieces.Piece.BLACK
+        else:
+            raise ValueError("Invalid FEN: " + fen)
+
+        castling = "-"
+        if (len(fields) > 2):
+            castling = fields[2]
+        white_king_moved = "K" not in castling and "Q" not in castling
+        black_king_moved = "k" not in castling and "q" not in castling
+
+        halfmove_clock = 0
+        fullmove_number = 1
+        if (len(fields) > 5):
+            if (not fields[4].isdigit() or not fields[5].isdigit()):
+                raise ValueError("Invalid FEN: " + fen)
+            halfmove_clock = int(fields[4])
+            fullmove_number = int(fields[5])
+
+        return cls(squares, white_king_moved, black_king_moved, turn, halfmove_clock, fullmove_number)
+
+    # Returns the position as a FEN string. A side whose king has not moved
+    # gets the castling rights of every rook still in its corner.
+    def to_fen(self):
+        rows = []
+        for y in range(Board.HEIGHT):
+            row = ""
+            empty = 0
+            for x in range(Board.WIDTH):
+                piece = self.squares[y*Board.WIDTH + x]
+                if (piece == 0):
+                    empty += 1
+                    continue
+
+                if (empty > 0):
+                    row += str(empty)
+                    empty = 0
+                if (piece.color == pieces.Piece.WHITE):
+                    row += piece.piece_type
+                else:
+                    row += piece.piece_type.lower()
+            if (empty > 0):
+                row += str(empty)
+            rows.append(row)
+
+        castling = ""
+        if (not self.white_king_moved):
+            castling += self.get_castling_rights(pieces.Piece.WHITE, Board.HEIGHT-1).upper()
+        if (not self.black_king_moved):
+            castling += self.get_castling_rights(pieces.Piece.BLACK, 0)
+        if (castling == ""):
+            castling = "-"
+
+        turn = "w"
+        if (self.turn == pieces.Piece.BLACK):
+            turn = "b"
+
+        return " ".join(["/".join(rows), turn, castling, "-", str(self.halfmove_clock), str(self.fullmove_number)])
+
+    # Returns "k", "q", "kq" or "" depending on which corners of row y hold a
+    # rook of the given color, if the king of that color is on its square.
+    def get_castling_rights(self, color, y):
+        king = self.squares[y*Board.WIDTH + 4]
+        if (king == 0 or king.color != color or king.piece_type != pieces.King.PIECE_TYPE):
+            return ""
 
+        rights = ""
+        for (x, right) in ((Board.WIDTH-1, "k"), (0, "q")):
+            rook = self.squares[y*Board.WIDTH + x]
+            if (rook != 0 and rook.color == color and rook.piece_type == pieces.Rook.PIECE_TYPE):
+                rights += right
+        return rights
+
+    # Returns all moves of the given color, captures first.
     def get_possible_moves(self, color):
-        moves = []
-        for x in range(Board.WIDTH):
-            for y in range(Board.HEIGHT):
-                piece = self.chesspieces[x][y]
-                if (piece != 0):
-                    if (piece.color == color):
-                        moves += piece.get_possible_moves(self)
+        return list(self.generate_captures(color)) + list(self.generate_quiet_moves(color))
+
+    # Yields the captures of the given color, generated piece by piece only
+    # as they are consumed.
+    def generate_captures(self, color):
+        for (sq, piece) in enumerate(self.squares):
+            if (piece != 0 and piece.color == color):
+                yield from piece.generate_captures(self, sq % 8, sq // 8)
+
+    # Yields the non-capturing moves of the given color piece by piece.
+    def generate_quiet_moves(self, color):
+        for (sq, piece) in enumerate(self.squares):
+            if (piece != 0 and piece.color == color):
+                yield from piece.generate_quiet_moves(self, sq % 8, sq // 8)
+
+    # Returns true iff the piece of the given color on the move's from square
+    # can make the move. Used to check stored moves, like the hash move, before
+    # searching them.
+    def is_possible_move(self, move, color):
+        piece = self.squares[move.sqfrom]
+        if (piece == 0 or piece.color != color):
+            return False
+
+        return move in piece.get_possible_moves(self, move.xfrom, move.yfrom)
+
+    # Returns the legal move of the color to move given in long algebraic
+    # notation, like "e2e4" or "e7e8q". Raises ValueError if there is none.
+    def parse_uci_move(self, text):
+        for move in self.get_legal_moves(self.turn):
+            if (move.to_uci() == text):
+                return move
+        raise ValueError("Illegal move: " + text)
+
+    # Returns the moves of the given color that do not leave its own king in
+    # check, captures first.
+    def get_legal_moves(self, color):
+        context = self.get_legality_context(color)
+        return list(self.generate_legal_captures(color, context)) + list(self.generate_legal_quiet_moves(color, context))
+
+    # Yields the legal captures of the given color in the given context.
+    def generate_legal_captures(self, color, context):
+        return self.filter_legal_moves(self.generate_captures(color), context)
+
+    # Yields the legal non-capturing moves of the given color in the given context.
+    def generate_legal_quiet_moves(self, color, context):
+        return self.filter_legal_moves(self.generate_quiet_moves(color), context)
+
+    # Yields the given moves that are legal in the given context.
+    def filter_legal_moves(self, moves, context):
+        for move in moves:
+            if (self.is_legal_move(move, context)):
+                yield move
+
+    # Collects what is_legal_move needs to know about the king of the given
+    # color: (other_color, king_x, king_y, checkers, pins, evasion_squares).
+    # Returns None if the king is missing, in which case every move is legal.
+    def get_legality_context(self, color):
+        other_color = pieces.Piece.WHITE
+        if (color == pieces.Piece.WHITE):
+            other_color = pieces.Piece.BLACK
+
+        position = self.king_positions[color]
+        if (position is None):
+            return None
+
+        (king_x, king_y) = position
+        checkers = self.get_attackers(king_x, king_y, other_color)
+        pins = self.get_pins(king_x, king_y, color)
+
+        # Squares a non-king move has to land on to get out of a single check.
+        evasion_squares = None
+        if (len(checkers) == 1):
+            evasion_squares = self.get_squares_between(king_x, king_y, checkers[0][0], checkers[0][1])
+            evasion_squares.append(checkers[0])
+
+        return (other_color, king_x, king_y, checkers, pins, evasion_squares)
+
+    # Returns true iff the possible move does not leave the own king in check.
+    # Pinned pieces may only move along the pin, and when the king is in check
+    # only moves that capture or block the checking piece are kept.
+    def is_legal_move(self, move, context):
+        if (context is None):
+            return True
+
+        (other_color, king_x, king_y, checkers, pins, evasion_squares) = context
+        if (move.xfrom == king_x and move.yfrom == king_y):
+            return self.is_legal_king_move(move, other_color, len(checkers) > 0)
+
+        # In double check only the king can move.
+        if (len(checkers) > 1):
+            return False
+
+        if (evasion_squares is not None and (move.xto, move.yto) not in evasion_squares):
+            return False
+
+        pin = pins.get((move.xfrom, move.yfrom))
+        if (pin is not None):
+            # The move has to stay on the line through the king and the pinning piece.
+            if ((move.xto - king_x) * pin[1] != (move.yto - king_y) * pin[0]):
+                return False
 
-        return moves
+        return True
+
+    def is_legal_king_move(self, move, other_color, in_check):
+        if (abs(move.xto - move.xfrom) == 2):
+            # Castling is not allowed out of check or through an attacked square.
+            if (in_check):
+                return False
+            if (self.is_square_attacked((move.xfrom + move.xto) // 2, move.yfrom, other_color)):
+                return False
+
+        # The king may step along the line of a checking slider, so the
+        # destination has to be tested with the king gone from its square.
+        undo = self.make_move(move)
+        checked = self.is_square_attacked(move.xto, move.yto, other_color)
+        self.unmake_move(undo)
+        return not checked
+
+    # Returns the (x, y) position of every piece of by_color attacking (x, y).
+    def get_attackers(self, x, y, by_color):
+        attackers = []
+        for (dx, dy) in Board.KNIGHT_OFFSETS:
+            piece = self.get_piece(x+dx, y+dy)
+            if (piece != 0 and piece.color == by_color and piece.piece_type == pieces.Knight.PIECE_TYPE):
+                attackers.append((x+dx, y+dy))
+
+        for (dx, dy) in Board.KING_OFFSETS:
+            piece = self.get_piece(x+dx, y+dy)
+            if (piece != 0 and piece.color == by_color and piece.piece_type == pieces.King.PIECE_TYPE):
+                attackers.append((x+dx, y+dy))
+
+        pawn_y = y + 1
+        if (by_color == pieces.Piece.BLACK):
+            pawn_y = y - 1
+        for pawn_x in (x-1, x+1):
+            piece = self.get_piece(pawn_x, pawn_y)
+            if (piece != 0 and piece.color == by_color and piece.piece_type == pieces.Pawn.PIECE_TYPE):
+                attackers.append((pawn_x, pawn_y))
+
+        for (dx, dy) in Board.ROOK_DIRECTIONS + Board.BISHOP_DIRECTIONS:
+            position = self.get_first_square(x, y, dx, dy)
+            if (position is None):
+                continue
+            piece = self.squares[position[1]*8 + position[0]]
+            if (piece.color == by_color and piece.piece_type in Board.get_sliders(dx, dy)):
+                attackers.append(position)
+
+        return attackers
+
+    # Static exchange evaluation of a capture: the material won by the side
+    # making it (negative if lost) when both sides keep recapturing on the
+    # destination with their least valuable piece, each side stopping as soon
+    # as recapturing no longer pays. Pins, checks and promotions are ignored.
+    # Pieces are only taken off the squares list while looking for the next
+    # attacker, which uncovers the sliders behind them, and put back after.
+    def get_exchange_score(self, move):
+        piece = self.squares[move.sqfrom]
+        # gains[i] is what the side making capture i wins if it stops there.
+        gains = [self.squares[move.sqto].value]
+        removed = [(move.sqfrom, piece)]
+        self.squares[move.sqfrom] = 0
+
+        attacker = piece
+        color = pieces.Piece.BLACK
+        if (piece.color == pieces.Piece.BLACK):
+            color = pieces.Piece.WHITE
+        while (True):
+            attackers = self.get_attackers(move.xto, move.yto, color)
+            if (not attackers):
+                break
+
+            gains.append(attacker.value - gains[-1])
+            if (attacker.piece_type == pieces.King.PIECE_TYPE):
+                # The king could not have captured into a defended square.
+                break
+            (x, y) = min(attackers, key=lambda position: self.squares[position[1]*8 + position[0]].value)
+            attacker = self.squares[y*8 + x]
+            removed.append((y*8 + x, attacker))
+            self.squares[y*8 + x] = 0
+            if (color == pieces.Piece.WHITE):
+                color = pieces.Piece.BLACK
+            else:
+                color = pieces.Piece.WHITE
+
+        for (sq, removed_piece) in removed:
+            self.squares[sq] = removed_piece
+
+        # Each side only recaptures if it gains more than by stopping.
+        while (len(gains) > 1):
+            gain = gains.pop()
+            gains[-1] = -max(-gains[-1], gain)
+        return gains[0]
+
+    # Returns the pieces of the given color that are pinned to the king on
+    # (x, y), as a dictionary from their (x, y) to the (dx, dy) of the pin.
+    def get_pins(self, x, y, color):
+        pins = {}
+        for (dx, dy) in Board.ROOK_DIRECTIONS + Board.BISHOP_DIRECTIONS:
+            position = self.get_first_square(x, y, dx, dy)
+            if (position is None or self.squares[position[1]*8 + position[0]].color != color):
+                continue
+
+            pinner = self.get_first_piece(position[0], position[1], dx, dy)
+            if (pinner != 0 and pinner.color != color and pinner.piece_type in Board.get_sliders(dx, dy)):
+                pins[position] = (dx, dy)
+
+        return pins
+
+    # Returns the positions strictly between two squares on the same line, or
+    # an empty list if the squares are not on a common rank, file or diagonal.
+    def get_squares_between(self, xfrom, yfrom, xto, yto):
+        dx = xto - xfrom
+        dy = yto - yfrom
+        if (dx != 0 and dy != 0 and abs(dx) != abs(dy)):
+            return []
+
+        steps = max(abs(dx), abs(dy))
+        dx = dx // steps
+        dy = dy // steps
+        return [(xfrom + dx*i, yfrom + dy*i) for i in range(1, steps)]
+
+    # Returns the piece types that slide in direction (dx, dy).
+    @staticmethod
+    def get_sliders(dx, dy):
+        if (dx == 0 or dy == 0):
+            return Board.ROOK_SLIDERS
+        return Board.BISHOP_SLIDERS
 
     def perform_move(self, move):
-        piece = self.chesspieces[move.xfrom][move.yfrom]
-        self.move_piece(piece, move.xto, move.yto)
+        self.make_move(move)
+
+    # Performs the move and returns an undo record that unmake_move can use to
+    # restore the exact previous position.
+    def make_move(self, move):
+        piece = self.squares[move.sqfrom]
+        captured = self.squares[move.sqto]
+        undo = (move, piece, captured, self.white_king_moved, self.black_king_moved, self.hash, self.halfmove_clock)
+
+        if (piece.piece_type == pieces.Pawn.PIECE_TYPE or captured != 0):
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        if (piece.color == pieces.Piece.BLACK):
+            self.fullmove_number += 1
+
+        self.move_piece(move.xfrom, move.yfrom, move.xto, move.yto)
 
         # If a pawn reaches the end, upgrade it to a queen.
         if (piece.piece_type == pieces.Pawn.PIECE_TYPE):
-            if (piece.y == 0 or piece.y == Board.HEIGHT-1):
-                self.chesspieces[piece.x][piece.y] = pieces.Queen(piece.x, piece.y, piece.color)
+            if (move.yto == 0 or move.yto == Board.HEIGHT-1):
+                self.set_piece(move.xto, move.yto, pieces.get_piece(pieces.Queen.PIECE_TYPE, piece.color))
 
         if (piece.piece_type == pieces.King.PIECE_TYPE):
             # Mark the king as having moved.
             if (piece.color == pieces.Piece.WHITE):
+                if (not self.white_king_moved):
+                    self.hash ^= Zobrist.WHITE_KING_MOVED
                 self.white_king_moved = True
             else:
+                if (not self.black_king_moved):
+                    self.hash ^= Zobrist.BLACK_KING_MOVED
                 self.black_king_moved = True
-            
+
             # Check if king-side castling
             if (move.xto - move.xfrom == 2):
-                rook = self.chesspieces[piece.x+1][piece.y]
-                self.move_piece(rook, piece.x+1, piece.y)
+                self.move_piece(move.xto+1, move.yto, move.xto-1, move.yto)
             # Check if queen-side castling
             if (move.xto - move.xfrom == -2):
-                rook = self.chesspieces[piece.x-2][piece.y]
-                self.move_piece(rook, piece.x+1, piece.y)
-    
-    def move_piece(self, piece, xto, yto):
-        self.chesspieces[piece.x][piece.y] = 0
-        piece.x = xto
-        piece.y = yto
+                self.move_piece(move.xto-2, move.yto, move.xto+1, move.yto)
+
+        self.pass_turn()
+        return undo
+
+    # Takes back the move recorded in the given undo record.
+    def unmake_move(self, undo):
+        (move, piece, captured, white_king_moved, black_king_moved, key, halfmove_clock) = undo
+
+        if (piece.piece_type == pieces.King.PIECE_TYPE):
+            # Put the rook back in its corner if the move was castling.
+            if (move.xto - move.xfrom == 2):
+                self.move_piece(move.xto-1, move.yto, move.xto+1, move.yto)
+            if (move.xto - move.xfrom == -2):
+                self.move_piece(move.xto+1, move.yto, move.xto-2, move.yto)
 
-        self.chesspieces[xto][yto] = piece
+        # Replace the queen with the original pawn if the move was a promotion.
+        if (self.squares[move.sqto] is not piece):
+            self.set_piece(move.xto, move.yto, piece)
+
+        self.move_piece(move.xto, move.yto, move.xfrom, move.yfrom)
+        if (captured != 0):
+            self.set_piece(move.xto, move.yto, captured)
+
+        self.white_king_moved = white_king_moved
+        self.black_king_moved = black_king_moved
+        self.halfmove_clock = halfmove_clock
+        if (piece.color == pieces.Piece.BLACK):
+            self.fullmove_number -= 1
+        self.pass_turn()
+        self.hash = key
+
+    # Gives the turn to the other color.
+    def pass_turn(self):
+        if (self.turn == pieces.Piece.WHITE):
+            self.turn = pieces.Piece.BLACK
+        else:
+            self.turn = pieces.Piece.WHITE
+        self.hash ^= Zobrist.BLACK_TO_MOVE
+
+    # Moves the piece on (xfrom, yfrom) to (xto, yto), capturing whatever
+    # stands there.
+    def move_piece(self, xfrom, yfrom, xto, yto):
+        piece = self.squares[yfrom*8 + xfrom]
+        captured = self.squares[yto*8 + xto]
+        if (captured != 0):
+            self.hash ^= Zobrist.get_piece_key(captured, xto, yto)
+            self.material_score -= ai.Heuristics.get_piece_material_score(captured)
+            self.position_score -= ai.Heuristics.POSITION_TABLES[captured.color][captured.piece_type][xto][yto]
+            if (captured.piece_type == pieces.Pawn.PIECE_TYPE):
+                self.pawn_hash ^= Zobrist.get_piece_key(captured, xto, yto)
+        self.hash ^= Zobrist.get_piece_key(piece, xfrom, yfrom) ^ Zobrist.get_piece_key(piece, xto, yto)
+        if (piece.piece_type == pieces.Pawn.PIECE_TYPE):
+            self.pawn_hash ^= Zobrist.get_piece_key(piece, xfrom, yfrom) ^ Zobrist.get_piece_key(piece, xto, yto)
+        table = ai.Heuristics.POSITION_TABLES[piece.color][piece.piece_type]
+        self.position_score += table[xto][yto] - table[xfrom][yfrom]
+
+        if (captured != 0):
+            self.piece_count -= 1
+            if (captured.piece_type == pieces.King.PIECE_TYPE):
+                self.king_positions[captured.color] = None
+        if (piece.piece_type == pieces.King.PIECE_TYPE):
+            self.king_positions[piece.color] = (xto, yto)
 
+        self.squares[yfrom*8 + xfrom] = 0
+        self.squares[yto*8 + xto] = piece
+
+    # Places the given piece (or 0 to clear the square) at the given position.
+    def set_piece(self, x, y, piece):
+        old_piece = self.squares[y*8 + x]
+        if (old_piece != 0):
+            self.hash ^= Zobrist.get_piece_key(old_piece, x, y)
+            self.material_score -= ai.Heuristics.get_piece_material_score(old_piece)
+            self.position_score -= ai.Heuristics.POSITION_TABLES[old_piece.color][old_piece.piece_type][x][y]
+            self.piece_count -= 1
+            if (old_piece.piece_type == pieces.King.PIECE_TYPE):
+                self.king_positions[old_piece.color] = None
+            if (old_piece.piece_type == pieces.Pawn.PIECE_TYPE):
+                self.pawn_hash ^= Zobrist.get_piece_key(old_piece, x, y)
+        if (piece != 0):
+            self.hash ^= Zobrist.get_piece_key(piece, x, y)
+            self.material_score += ai.Heuristics.get_piece_material_score(piece)
+            self.position_score += ai.Heuristics.POSITION_TABLES[piece.color][piece.piece_type][x][y]
+            self.piece_count += 1
+            if (piece.piece_type == pieces.King.PIECE_TYPE):
+                self.king_positions[piece.color] = (x, y)
+            if (piece.piece_type == pieces.Pawn.PIECE_TYPE):
+                self.pawn_hash ^= Zobrist.get_piece_key(piece, x, y)
+
+        self.squares[y*8 + x] = piece
 
     # Returns if the given color is checked.
     def is_check(self, color):
@@ -105,29 +564,76 @@ class Board:
         if (color == pieces.Piece.WHITE):
             other_color = pieces.Piece.BLACK
 
-        for move in self.get_possible_moves(other_color):
-            copy = Board.clone(self)
-            copy.perform_move(move)
+        position = self.king_positions[color]
+        # A missing king has been captured, which counts as being checked.
+        if (position is None):
+            return True
 
-            king_found = False
-            for x in range(Board.WIDTH):
-                for y in range(Board.HEIGHT):
-                    piece = copy.chesspieces[x][y]
-                    if (piece != 0):
-                        if (piece.color == color and piece.piece_type == pieces.King.PIECE_TYPE):
-                            king_found = True
+        return self.is_square_attacked(position[0], position[1], other_color)
+
+    # Returns true iff any piece of by_color attacks (x, y). Instead of
+    # generating moves for every piece, this looks outward from (x, y) for a
+    # piece that could reach it.
+    def is_square_attacked(self, x, y, by_color):
+        for (dx, dy) in Board.KNIGHT_OFFSETS:
+            piece = self.get_piece(x+dx, y+dy)
+            if (piece != 0 and piece.color == by_color and piece.piece_type == pieces.Knight.PIECE_TYPE):
+                return True
+
+        for (dx, dy) in Board.KING_OFFSETS:
+            piece = self.get_piece(x+dx, y+dy)
+            if (piece != 0 and piece.color == by_color and piece.piece_type == pieces.King.PIECE_TYPE):
+                return True
 
-            if (not king_found):
+        # Pawns attack diagonally forward, white pawns move towards y = 0.
+        pawn_y = y + 1
+        if (by_color == pieces.Piece.BLACK):
+            pawn_y = y - 1
+        for pawn_x in (x-1, x+1):
+            piece = self.get_piece(pawn_x, pawn_y)
+            if (piece != 0 and piece.color == by_color and piece.piece_type == pieces.Pawn.PIECE_TYPE):
                 return True
 
+        for (dx, dy) in Board.ROOK_DIRECTIONS:
+            piece = self.get_first_piece(x, y, dx, dy)
+            if (piece != 0 and piece.color == by_color):
+                if (piece.piece_type == pieces.Rook.PIECE_TYPE or piece.piece_type == pieces.Queen.PIECE_TYPE):
+                    return True
+
+        for (dx, dy) in Board.BISHOP_DIRECTIONS:
+            piece = self.get_first_piece(x, y, dx, dy)
+            if (piece != 0 and piece.color == by_color):
+                if (piece.piece_type == pieces.Bishop.PIECE_TYPE or piece.piece_type == pieces.Queen.PIECE_TYPE):
+                    return True
+
         return False
 
+    # Returns the first piece seen from (x, y) in direction (dx, dy), or 0 if
+    # there is none before the edge of the board.
+    def get_first_piece(self, x, y, dx, dy):
+        position = self.get_first_square(x, y, dx, dy)
+        if (position is None):
+            return 0
+        return self.squares[position[1]*8 + position[0]]
+
+    # Returns the (x, y) of the first piece seen from (x, y) in direction
+    # (dx, dy), or None if there is none before the edge of the board.
+    def get_first_square(self, x, y, dx, dy):
+        x += dx
+        y += dy
+        while (self.in_bounds(x, y)):
+            if (self.squares[y*8 + x] != 0):
+                return (x, y)
+            x += dx
+            y += dy
+        return None
+
     # Returns piece at given position or 0 if: No piece or out of bounds.
     def get_piece(self, x, y):
         if (not self.in_bounds(x, y)):
             return 0
 
-        return self.chesspieces[x][y]
+        return self.squares[y*8 + x]
 
     def in_bounds(self, x, y):
         return (x >= 0 and y >= 0 and x < Board.WIDTH and y < Board.HEIGHT)
@@ -138,7 +644,7 @@ class Board:
         for y in range(Board.HEIGHT):
             string += str(8 - y) + " | "
             for x in range(Board.WIDTH):
-                piece = self.chesspieces[x][y]
+                piece = self.squares[y*8 + x]
                 if (piece != 0):
                     string += piece.to_string()
                 else:
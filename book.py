@@ -0,0 +1,189 @@
+import argparse, mmap, random, struct
+import bitboard, pgn, pieces
+from move import Move
+
+# Opening book file, in the layout of Polyglot books: 16 byte big-endian
+# entries of (position key, move, weight, learn), sorted by key. The keys are
+# this engine's Zobrist hashes and the moves are Move codes, so the files are
+# not interchangeable with Polyglot books.
+ENTRY = struct.Struct(">QHHI")
+
+# Results as seen by white, used to weight the moves when building a book.
+RESULT_SCORES = {"1-0": 1, "0-1": -1, "1/2-1/2": 0}
+
+MAX_WEIGHT = 0xFFFF
+
+
+class OpeningBook:
+
+    # How get_move chooses among the book moves of a position.
+    BEST = "best"
+    WEIGHTED = "weighted"
+
+    # Maps the book file into memory instead of reading it, so the operating
+    # system shares the pages between every process using the same book.
+    def __init__(self, path, selection=WEIGHTED, seed=None):
+        if (selection not in (OpeningBook.BEST, OpeningBook.WEIGHTED)):
+            raise ValueError("Invalid book move selection: " + str(selection))
+
+        self.path = path
+        self.selection = selection
+        self.random = random.Random(seed)
+        with open(path, "rb") as book_file:
+            size = book_file.seek(0, 2)
+            if (size % ENTRY.size != 0):
+                raise ValueError("Invalid book file: " + path)
+            self.size = size // ENTRY.size
+            self.entries = None
+            if (self.size > 0):
+                self.entries = mmap.mmap(book_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        if (self.entries is not None):
+            self.entries.close()
+            self.entries = None
+
+    # Returns the (move code, weight) pairs stored for the given key.
+    def get_entries(self, key):
+        # Binary search for the first entry with the key.
+        low = 0
+        high = self.size
+        while (low < high):
+            middle = (low + high) // 2
+            if (self.get_key(middle) < key):
+                low = middle + 1
+            else:
+                high = middle
+
+        entries = []
+        for index in range(low, self.size):
+            (entry_key, code, weight, learn) = ENTRY.unpack_from(self.entries, index * ENTRY.size)
+            if (entry_key != key):
+                break
+            entries.append((code, weight))
+        return entries
+
+    def get_key(self, index):
+        return ENTRY.unpack_from(self.entries, index * ENTRY.size)[0]
+
+    # Returns a book move for the color to move, or 0 if the position is not
+    # in the book. Moves that are not legal on the board, which can happen
+    # when two positions share a key, are never returned.
+    def get_move(self, chessboard):
+        legal_moves = set(chessboard.get_legal_moves(chessboard.turn))
+        candidates = []
+        for (code, weight) in self.get_entries(chessboard.hash):
+            move = Move.from_code(code)
+            if (move in legal_moves):
+                candidates.append((move, weight))
+
+        if (not candidates):
+            return 0
+
+        if (self.selection == OpeningBook.BEST):
+            return max(candidates, key=lambda candidate: candidate[1])[0]
+
+        total = sum(weight for (move, weight) in candidates)
+        if (total == 0):
+            return self.random.choice(candidates)[0]
+        pick = self.random.randrange(total)
+        for (move, weight) in candidates:
+            if (pick < weight):
+                return move
+            pick -= weight
+        return candidates[-1][0]
+
+
+# Builds a book from the given games and writes it to path. Each game is
+# (result, moves, parse_move) where result is one of RESULT_SCORES (or None
+# if unknown) and every move is found with parse_move(chessboard, text).
+# Games are read one at a time and only the first max_ply moves of every
+# game are added. A move scores 2 for a win of the side playing it, 1 for a
+# draw or an unknown result and 0 for a loss, and the weight of a move is its
+# total score. Returns the number of entries written.
+def build_book(games, path, max_ply=20):
+    weights = {}
+    for (result, moves, parse_move) in games:
+        chessboard = bitboard.BitBoard.new()
+        for text in moves[:max_ply]:
+            try:
+                move = parse_move(chessboard, text)
+            except ValueError:
+                # The rest of the game cannot be followed.
+                break
+
+            score = get_move_score(result, chessboard.turn)
+            entry = (chessboard.hash, move.code)
+            weights[entry] = weights.get(entry, 0) + score
+            chessboard.make_move(move)
+
+    # Scale the weights down to fit 16 bits if needed.
+    largest = max(weights.values(), default=0)
+    scale = 1
+    if (largest > MAX_WEIGHT):
+        scale = MAX_WEIGHT / largest
+
+    entries = sorted(weights.items(), key=lambda item: (item[0][0], -item[1]))
+    with open(path, "wb") as book_file:
+        for ((key, code), weight) in entries:
+            book_file.write(ENTRY.pack(key, code, int(weight * scale), 0))
+    return len(entries)
+
+
+def get_move_score(result, color):
+    score = RESULT_SCORES.get(result)
+    if (score is None):
+        return 1
+    if (color == pieces.Piece.BLACK):
+        score = -score
+    return score + 1
+
+
+# Yields (result, moves, parse_move) for the games of a PGN file.
+def read_pgn_games(lines):
+    for (headers, moves) in pgn.read_games(lines):
+        yield (headers.get("Result"), moves, pgn.parse_san)
+
+
+# Yields (result, moves, parse_move) for a game log with one game per line:
+# the moves in long algebraic notation separated by spaces, optionally
+# followed by the result, e.g. "e2e4 e7e5 g1f3 1-0".
+def read_log_games(lines):
+    for line in lines:
+        moves = line.split()
+        if (not moves or moves[0].startswith("#")):
+            continue
+
+        result = None
+        if (moves[-1] in pgn.RESULTS):
+            result = moves.pop()
+        yield (result, moves, parse_log_move)
+
+
+def parse_log_move(chessboard, text):
+    return chessboard.parse_uci_move(text)
+
+
+# Yields the games of every file in order, PGN files by their extension.
+def read_files(paths):
+    for path in paths:
+        with open(path) as input_file:
+            if (path.lower().endswith(".pgn")):
+                yield from read_pgn_games(input_file)
+            else:
+                yield from read_log_games(input_file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Builds an opening book from PGN files or game logs.")
+    parser.add_argument("inputs", nargs="+", help="PGN files (*.pgn) or game logs with one game of UCI moves per line")
+    parser.add_argument("--output", required=True, help="book file to write")
+    parser.add_argument("--max-ply", type=int, default=20, help="moves per game to add (default: 20)")
+    args = parser.parse_args()
+
+    entries = build_book(read_files(args.inputs), args.output, args.max_ply)
+    print("Wrote " + str(entries) + " entries to " + args.output)
+
+
+if __name__ == "__main__":
+    main()
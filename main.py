@@ -1,4 +1,4 @@
-import board, pieces, ai
+import board, pieces, ai, ponder
 from move import Move
 
 # Returns a move object based on the users input. Does not check if the move is valid.
@@ -19,24 +19,18 @@ def get_user_move():
 
 # Returns a valid move based on the users input.
 def get_valid_user_move(board):
+    possible_moves = board.get_legal_moves(pieces.Piece.WHITE)
+    # No possible moves
+    if (not possible_moves):
+        return 0
+
+    # The user only types the squares, the legal move also carries the flags.
+    moves_by_squares = {possible_move.get_squares(): possible_move for possible_move in possible_moves}
     while True:
         move = get_user_move()
-        valid = False
-        possible_moves = board.get_possible_moves(pieces.Piece.WHITE)
-        # No possible moves
-        if (not possible_moves):
-            return 0
-
-        for possible_move in possible_moves:
-            if (move.equals(possible_move)):
-                valid = True
-                break
-
-        if (valid):
-            break
-        else:
-            print("Invalid move.")
-    return move
+        if (move.get_squares() in moves_by_squares):
+            return moves_by_squares[move.get_squares()]
+        print("Invalid move.")
 
 # Converts a letter (A-H) to the x position on the chess board.
 def letter_to_xpos(letter):
@@ -66,6 +60,9 @@ def letter_to_xpos(letter):
 board = board.Board.new()
 print(board.to_string())
 
+# Searches on while the user is thinking.
+ponderer = ponder.Ponderer()
+
 while True:
     move = get_valid_user_move(board)
     if (move == 0):
@@ -81,7 +78,9 @@ while True:
     print("User move: " + move.to_string())
     print(board.to_string())
 
-    ai_move = ai.AI.get_ai_move(board, [])
+    ai_move = ponderer.get_move(move)
+    if (ai_move == 0):
+        ai_move = ai.AI.get_ai_move(board)
     if (ai_move == 0):
         if (board.is_check(pieces.Piece.BLACK)):
             print("Checkmate. White wins.")
@@ -93,3 +92,4 @@ while True:
     board.perform_move(ai_move)
     print("AI move: " + ai_move.to_string())
     print(board.to_string())
+    ponderer.start(board)
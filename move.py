@@ -1,18 +1,96 @@
-
 class Move:
 
-    def __init__(self, xfrom, yfrom, xto, yto):
-        self.xfrom = xfrom
-        self.yfrom = yfrom
-        self.xto = xto
-        self.yto = yto
+    # A move is packed into one small integer:
+    #   bits 0-5   from square (y * 8 + x)
+    #   bits 6-11  to square
+    #   bits 12-14 promotion piece, see PROMOTIONS
+    #   bit 15     castle flag
+    # The whole move fits in 16 bits, so move lists can be stored as arrays
+    # of codes. 0 is never a valid code since a move never ends on its own
+    # square, which keeps 0 free as the "no move" value.
+    SQUARES_MASK = 0xFFF
+    PROMOTION_SHIFT = 12
+    CASTLE = 1 << 15
+
+    # File letters by x. Ranks are numbered 8 - y since y = 0 is black's side.
+    FILES = "abcdefgh"
+
+    # Promotion piece types by their 3 bit code. 0 means no promotion.
+    PROMOTIONS = [0, "N", "B", "R", "Q"]
+
+    __slots__ = ("code",)
+
+    def __init__(self, xfrom, yfrom, xto, yto, promotion=0, castle=False):
+        code = (yfrom * 8 + xfrom) | (yto * 8 + xto) << 6
+        if (promotion != 0):
+            code |= Move.PROMOTIONS.index(promotion) << Move.PROMOTION_SHIFT
+        if (castle):
+            code |= Move.CASTLE
+        self.code = code
+
+    @staticmethod
+    def from_code(code):
+        move = Move.__new__(Move)
+        move.code = code
+        return move
+
+    # Square indices y * 8 + x, as used by the board's flat squares array.
+    @property
+    def sqfrom(self):
+        return self.code & 63
+
+    @property
+    def sqto(self):
+        return (self.code >> 6) & 63
+
+    @property
+    def xfrom(self):
+        return self.code & 7
+
+    @property
+    def yfrom(self):
+        return (self.code >> 3) & 7
+
+    @property
+    def xto(self):
+        return (self.code >> 6) & 7
+
+    @property
+    def yto(self):
+        return (self.code >> 9) & 7
+
+    # The piece type the pawn promotes to, or 0.
+    @property
+    def promotion(self):
+        return Move.PROMOTIONS[(self.code >> Move.PROMOTION_SHIFT) & 7]
+
+    def is_castle(self):
+        return (self.code & Move.CASTLE) != 0
+
+    # Returns the from and to squares without the flags, e.g. to look up a
+    # move typed in by the user.
+    def get_squares(self):
+        return self.code & Move.SQUARES_MASK
+
+    def __eq__(self, other_move):
+        return isinstance(other_move, Move) and self.code == other_move.code
+
+    def __ne__(self, other_move):
+        return not self.__eq__(other_move)
 
-    
+    def __hash__(self):
+        return self.code
 
-    # Returns true iff (xfrom,yfrom) and (xto,yto) are the same.
+    # Returns true iff both moves have the same squares and flags.
     def equals(self, other_move):
-        return self.xfrom == other_move.xfrom and self.yfrom == other_move.yfrom and self.xto == other_move.xto and self.yto == other_move.yto
+        return self.code == other_move.code
 
     def to_string(self):
         return "(" + str(self.xfrom) + ", " + str(self.yfrom) + ") -> (" + str(self.xto) + ", " + str(self.yto) + ")"
 
+    # Returns the move in long algebraic notation, e.g. "e2e4" or "a7a8q".
+    def to_uci(self):
+        string = Move.FILES[self.xfrom] + str(8 - self.yfrom) + Move.FILES[self.xto] + str(8 - self.yto)
+        if (self.promotion != 0):
+            string += self.promotion.lower()
+        return string
@@ -0,0 +1,35 @@
+from array import array
+
+class PawnHashTable:
+
+    # Bytes per entry: key (8), score (4) and a used flag (1).
+    ENTRY_SIZE = 13
+
+    # Caches the pawn structure score of positions by their pawn-only Zobrist
+    # key. Pawns move rarely compared to the other pieces, so most positions
+    # of a search share their pawn structure with many others and nearly
+    # every probe hits. Like the transposition table it stores one entry per
+    # slot in flat, preallocated arrays, and a new entry always replaces the
+    # old one since any entry is cheap to compute again.
+    def __init__(self, size_mb=1):
+        self.size_mb = size_mb
+        self.size = max(1, int(size_mb * 1024 * 1024) // PawnHashTable.ENTRY_SIZE)
+        self.keys = array("Q", bytes(8 * self.size))
+        self.scores = array("i", bytes(4 * self.size))
+        self.used = bytearray(self.size)
+
+    def clear(self):
+        self.__init__(self.size_mb)
+
+    # Returns the stored score for the key, or None.
+    def probe(self, key):
+        index = key % self.size
+        if (not self.used[index] or self.keys[index] != key):
+            return None
+        return self.scores[index]
+
+    def store(self, key, score):
+        index = key % self.size
+        self.keys[index] = key
+        self.scores[index] = score
+        self.used[index] = 1
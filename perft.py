@@ -0,0 +1,100 @@
+import argparse, time
+import bitboard
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# Standard perft test positions as (name, fen, expected leaf counts for depth
+# 1, 2, ...). The engine has no en passant, only promotes to queens and lets
+# a king that has not moved castle with any rook in its corner, so only the
+# depths where the published counts do not depend on those rules are listed.
+POSITIONS = [
+    ("start", START_FEN, [20, 400, 8902, 197281]),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", [48]),
+    ("position3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", [14, 191]),
+    ("position4", "r3k2r/Pppp1ppp/1b3nbn/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", [6]),
+    ("position6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10", [46, 2079, 89890])
+]
+
+# Returns the number of leaf nodes depth plies below the given position,
+# counting only legal moves. The board is restored before returning.
+def perft(chessboard, depth):
+    if (depth == 0):
+        return 1
+
+    moves = chessboard.get_legal_moves(chessboard.turn)
+    # Counting the moves is enough for the last ply.
+    if (depth == 1):
+        return len(moves)
+
+    nodes = 0
+    for move in moves:
+        undo = chessboard.make_move(move)
+        nodes += perft(chessboard, depth - 1)
+        chessboard.unmake_move(undo)
+    return nodes
+
+
+# Returns a list of (move, leaf nodes) for every legal root move.
+def divide(chessboard, depth):
+    results = []
+    for move in chessboard.get_legal_moves(chessboard.turn):
+        undo = chessboard.make_move(move)
+        results.append((move, perft(chessboard, depth - 1)))
+        chessboard.unmake_move(undo)
+    return results
+
+
+# Runs perft on every test position up to max_depth plies and checks the
+# counts. Returns true iff all counts were as expected.
+def run_suite(board_class, max_depth):
+    passed = True
+    for (name, fen, expected) in POSITIONS:
+        for depth in range(1, min(max_depth, len(expected)) + 1):
+            chessboard = board_class.from_fen(fen)
+            start = time.perf_counter()
+            nodes = perft(chessboard, depth)
+            elapsed = time.perf_counter() - start
+
+            ok = nodes == expected[depth - 1]
+            passed = passed and ok
+            status = "ok" if ok else "FAIL (expected " + str(expected[depth - 1]) + ")"
+            print(name + " depth " + str(depth) + ": " + str(nodes) + " nodes, " + format_speed(nodes, elapsed) + " " + status)
+    return passed
+
+
+def format_speed(nodes, elapsed):
+    return "%.3fs, %d nodes/sec" % (elapsed, nodes / max(elapsed, 1e-9))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Counts the leaf nodes of the move generator to a fixed depth.")
+    parser.add_argument("--fen", default=START_FEN, help="position to count from (default: start position)")
+    parser.add_argument("--depth", type=int, default=3, help="depth in plies (default: 3)")
+    parser.add_argument("--divide", action="store_true", help="print the count below every root move")
+    parser.add_argument("--suite", action="store_true", help="check the standard test positions up to --depth")
+    bitboard.add_backend_argument(parser)
+    args = parser.parse_args()
+
+    board_class = bitboard.BACKENDS[args.backend]
+    if (args.suite):
+        if (not run_suite(board_class, args.depth)):
+            raise SystemExit(1)
+        return
+
+    chessboard = board_class.from_fen(args.fen)
+    start = time.perf_counter()
+    if (args.divide):
+        results = divide(chessboard, args.depth)
+        for (move, nodes) in results:
+            print(move.to_uci() + ": " + str(nodes))
+        total = sum(nodes for (move, nodes) in results)
+    else:
+        total = perft(chessboard, args.depth)
+    elapsed = time.perf_counter() - start
+
+    print("Nodes: " + str(total))
+    print("Time: " + format_speed(total, elapsed))
+
+
+if __name__ == "__main__":
+    main()
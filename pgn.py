@@ -0,0 +1,190 @@
+import re
+import pieces
+
+# Reads and writes games in PGN and converts moves between the board and
+# standard algebraic notation (SAN).
+
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+
+HEADER = re.compile(r'^\[(\w+)\s+"(.*)"\]\s*$')
+MOVE_NUMBER = re.compile(r"^\d+\.+")
+
+# Longest line of movetext written by format_game.
+LINE_LENGTH = 80
+
+
+# Yields (headers, moves) for every game in the given lines, where headers is
+# a dictionary like {"Result": "1-0"} and moves is the list of SAN moves of
+# the main line. Comments, variations and annotations are skipped. Lines are
+# read one at a time, so files of any size can be streamed.
+def read_games(lines):
+    headers = {}
+    movetext = []
+    for line in lines:
+        line = line.strip()
+        match = HEADER.match(line)
+        if (match is not None):
+            # Headers after movetext start the next game.
+            if (movetext):
+                yield (headers, get_moves(" ".join(movetext)))
+                headers = {}
+                movetext = []
+            headers[match.group(1)] = match.group(2)
+        elif (line != "" and not line.startswith("%")):
+            movetext.append(line)
+
+    if (headers or movetext):
+        yield (headers, get_moves(" ".join(movetext)))
+
+
+# Returns the SAN moves of the main line of the given movetext.
+def get_moves(movetext):
+    # Comments can span lines and variations can nest, so strip both in one pass.
+    text = ""
+    depth = 0
+    in_comment = False
+    for char in movetext:
+        if (in_comment):
+            in_comment = char != "}"
+        elif (char == "{"):
+            in_comment = True
+        elif (char == "("):
+            depth += 1
+        elif (char == ")"):
+            depth = max(0, depth - 1)
+        elif (depth == 0):
+            text += char
+
+    moves = []
+    for token in text.split():
+        token = MOVE_NUMBER.sub("", token)
+        if (token == "" or token.startswith("$") or token in RESULTS):
+            continue
+        moves.append(token)
+    return moves
+
+
+# Returns the legal move of the color to move written as the given SAN move,
+# e.g. "Nf3", "exd5", "O-O" or "e8=Q+". Raises ValueError if there is none,
+# which includes moves the engine does not play (en passant and promotions
+# to anything but a queen).
+def parse_san(chessboard, san):
+    text = san.rstrip("+#!?")
+    moves = chessboard.get_legal_moves(chessboard.turn)
+
+    if (text in ("O-O", "0-0", "O-O-O", "0-0-0")):
+        direction = 1
+        if (len(text) > 3):
+            direction = -1
+        for move in moves:
+            if (move.is_castle() and (move.xto - move.xfrom) * direction > 0):
+                return move
+        raise ValueError("Illegal move: " + san)
+
+    promotion = 0
+    if ("=" in text):
+        (text, promotion) = text.split("=", 1)
+        promotion = promotion.upper()
+
+    piece_type = pieces.Pawn.PIECE_TYPE
+    if (text[:1] in ("N", "B", "R", "Q", "K")):
+        piece_type = text[0]
+        text = text[1:]
+
+    text = text.replace("x", "").replace("-", "")
+    if (len(text) < 2):
+        raise ValueError("Invalid move: " + san)
+    destination = text[-2:]
+    disambiguation = text[:-2]
+
+    candidates = []
+    for move in moves:
+        piece = chessboard.squares[move.sqfrom]
+        uci = move.to_uci()
+        if (piece.piece_type != piece_type or uci[2:4] != destination or move.promotion != promotion):
+            continue
+        if (any(char not in uci[0:2] for char in disambiguation)):
+            continue
+        candidates.append(move)
+
+    if (len(candidates) != 1):
+        raise ValueError("Illegal or ambiguous move: " + san)
+    return candidates[0]
+
+
+# Returns the given legal move of the color to move in SAN, e.g. "Nbd2",
+# "exd5", "O-O" or "e8=Q+".
+def to_san(chessboard, move):
+    if (move.is_castle()):
+        san = "O-O"
+        if (move.xto < move.xfrom):
+            san = "O-O-O"
+    else:
+        piece = chessboard.squares[move.sqfrom]
+        uci = move.to_uci()
+        capture = chessboard.squares[move.sqto] != 0
+        if (piece.piece_type == pieces.Pawn.PIECE_TYPE):
+            san = ""
+            if (capture):
+                san = uci[0] + "x"
+        else:
+            san = piece.piece_type + get_disambiguation(chessboard, move)
+            if (capture):
+                san += "x"
+        san += uci[2:4]
+        if (move.promotion != 0):
+            san += "=" + move.promotion
+
+    undo = chessboard.make_move(move)
+    if (chessboard.is_check(chessboard.turn)):
+        if (chessboard.get_legal_moves(chessboard.turn)):
+            san += "+"
+        else:
+            san += "#"
+    chessboard.unmake_move(undo)
+    return san
+
+
+# Returns what tells the move apart from the other legal moves of the same
+# piece type to the same square: nothing, the file, the rank or both.
+def get_disambiguation(chessboard, move):
+    piece = chessboard.squares[move.sqfrom]
+    others = []
+    for other in chessboard.get_legal_moves(chessboard.turn):
+        if (other.sqto == move.sqto and other.sqfrom != move.sqfrom and chessboard.squares[other.sqfrom] is piece):
+            others.append(other)
+
+    square = move.to_uci()[0:2]
+    if (not others):
+        return ""
+    if (all(other.xfrom != move.xfrom for other in others)):
+        return square[0]
+    if (all(other.yfrom != move.yfrom for other in others)):
+        return square[1]
+    return square
+
+
+# Returns a game as PGN text: the headers, in the given order, then the SAN
+# moves numbered from move 1 with white to move, then the result.
+def format_game(headers, moves, result):
+    lines = ['[' + name + ' "' + str(value).replace('"', "'") + '"]' for (name, value) in headers.items()]
+    lines.append("")
+
+    tokens = []
+    for (index, move) in enumerate(moves):
+        if (index % 2 == 0):
+            tokens.append(str(index // 2 + 1) + ".")
+        tokens.append(move)
+    tokens.append(result)
+
+    line = ""
+    for token in tokens:
+        if (line and len(line) + 1 + len(token) > LINE_LENGTH):
+            lines.append(line)
+            line = token
+        elif (line):
+            line += " " + token
+        else:
+            line = token
+    lines.append(line)
+    return "\n".join(lines) + "\n"
@@ -1,5 +1,3 @@
-
-import ai
 from move import Move
 
 class Piece():
@@ -7,114 +5,80 @@ class Piece():
     WHITE = "W"
     BLACK = "B"
 
-    def __init__(self, x, y, color, piece_type, value):
-        self.x = x
-        self.y = y
-        self.color = color
-        self.piece_type = piece_type
-        self.value = value
-
-
-
-    # Returns all diagonal moves for this piece. This should therefore only
-    # be used by the Bishop and Queen since they are the only pieces that can
-    # move diagonally.
-    def get_possible_diagonal_moves(self, board):
-        moves = []
-
-        for i in range(1, 8):
-            if (not board.in_bounds(self.x+i, self.y+i)):
-                break
-
-            piece = board.get_piece(self.x+i, self.y+i)
-            moves.append(self.get_move(board, self.x+i, self.y+i))
-            if (piece != 0):
-                break
-
-        for i in range(1, 8):
-            if (not board.in_bounds(self.x+i, self.y-i)):
-                break
-
-            piece = board.get_piece(self.x+i, self.y-i)
-            moves.append(self.get_move(board, self.x+i, self.y-i))
-            if (piece != 0):
-                break
-
-        for i in range(1, 8):
-            if (not board.in_bounds(self.x-i, self.y-i)):
-                break
-
-            piece = board.get_piece(self.x-i, self.y-i)
-            moves.append(self.get_move(board, self.x-i, self.y-i))
-            if (piece != 0):
-                break
-
-        for i in range(1, 8):
-            if (not board.in_bounds(self.x-i, self.y+i)):
-                break
-
-            piece = board.get_piece(self.x-i, self.y+i)
-            moves.append(self.get_move(board, self.x-i, self.y+i))
-            if (piece != 0):
-                break
-
-        return self.remove_null_from_list(moves)
-
-    # Returns all horizontal moves for this piece. This should therefore only
-    # be used by the Rooks and Queen since they are the only pieces that can
-    # move horizontally.
-    def get_possible_horizontal_moves(self, board):
-        moves = []
-
-        # Moves to the right of the piece.
-        for i in range(1, 8 - self.x):
-            piece = board.get_piece(self.x + i, self.y)
-            moves.append(self.get_move(board, self.x+i, self.y))
-
-            if (piece != 0):
-                break
-
-        # Moves to the left of the piece.
-        for i in range(1, self.x + 1):
-            piece = board.get_piece(self.x - i, self.y)
-            moves.append(self.get_move(board, self.x-i, self.y))
-            if (piece != 0):
-                break
-
-        # Downward moves.
-        for i in range(1, 8 - self.y):
-            piece = board.get_piece(self.x, self.y + i)
-            moves.append(self.get_move(board, self.x, self.y+i))
-            if (piece != 0):
-                break
-
-        # Upward moves.
-        for i in range(1, self.y + 1):
-            piece = board.get_piece(self.x, self.y - i)
-            moves.append(self.get_move(board, self.x, self.y-i))
-            if (piece != 0):
-                break
-
-        return self.remove_null_from_list(moves)
-
-    # Returns a Move object with (xfrom, yfrom) set to the piece current position.
-    # (xto, yto) is set to the given position. If the move is not valid 0 is returned.
-    # A move is not valid if it is out of bounds, or a piece of the same color is
-    # being eaten.
-    def get_move(self, board, xto, yto):
-        move = 0
-        if (board.in_bounds(xto, yto)):
-            piece = board.get_piece(xto, yto)
-            if (piece != 0):
-                if (piece.color != self.color):
-                    move = Move(self.x, self.y, xto, yto)
-            else:
-                move = Move(self.x, self.y, xto, yto)
-        return move
-
-    # Returns the list of moves cleared of all the 0's.
-    def remove_null_from_list(self, l):
-        return [move for move in l if move != 0]
+    # Pieces are immutable flyweights: there is one shared instance per type
+    # and color (see PIECES below) and the board keeps track of the square.
+    __slots__ = ("color", "piece_type", "value")
+
+    def __init__(self, color, piece_type, value):
+        object.__setattr__(self, "color", color)
+        object.__setattr__(self, "piece_type", piece_type)
+        object.__setattr__(self, "value", value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Pieces are immutable.")
+
+    # Unpickles to the shared instance, e.g. when a board is sent to a worker process.
+    def __reduce__(self):
+        return (get_piece, (self.piece_type, self.color))
+
+    DIAGONAL_DIRECTIONS = [(1, 1), (1, -1), (-1, -1), (-1, 1)]
+    HORIZONTAL_DIRECTIONS = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+
+    # Returns all diagonal moves for this piece standing on (x, y). This
+    # should therefore only be used by the Bishop and Queen since they are the
+    # only pieces that can move diagonally.
+    def get_possible_diagonal_moves(self, board, x, y):
+        captures = self.generate_sliding_moves(board, x, y, Piece.DIAGONAL_DIRECTIONS, True)
+        quiet_moves = self.generate_sliding_moves(board, x, y, Piece.DIAGONAL_DIRECTIONS, False)
+        return list(captures) + list(quiet_moves)
+
+    # Returns all horizontal moves for this piece standing on (x, y). This
+    # should therefore only be used by the Rooks and Queen since they are the
+    # only pieces that can move horizontally.
+    def get_possible_horizontal_moves(self, board, x, y):
+        captures = self.generate_sliding_moves(board, x, y, Piece.HORIZONTAL_DIRECTIONS, True)
+        quiet_moves = self.generate_sliding_moves(board, x, y, Piece.HORIZONTAL_DIRECTIONS, False)
+        return list(captures) + list(quiet_moves)
+
+    # Returns all moves of this piece standing on (x, y), captures first.
+    def get_possible_moves(self, board, x, y):
+        return list(self.generate_captures(board, x, y)) + list(self.generate_quiet_moves(board, x, y))
+
+    # Yields the moves sliding from (x, y) in each of the given (dx, dy)
+    # directions. With captures only the capture of an enemy piece ending a
+    # ray is yielded, otherwise only the moves to the empty squares before it.
+    def generate_sliding_moves(self, board, xfrom, yfrom, directions, captures):
+        for (dx, dy) in directions:
+            x = xfrom + dx
+            y = yfrom + dy
+            while (board.in_bounds(x, y)):
+                piece = board.squares[y*8 + x]
+                if (piece != 0):
+                    if (captures and piece.color != self.color):
+                        yield Move(xfrom, yfrom, x, y)
+                    break
+
+                if (not captures):
+                    yield Move(xfrom, yfrom, x, y)
+                x += dx
+                y += dy
+
+    # Yields the moves stepping from (x, y) by each of the given (dx, dy)
+    # offsets. With captures only the steps onto enemy pieces are yielded,
+    # otherwise only the steps onto empty squares.
+    def generate_step_moves(self, board, xfrom, yfrom, offsets, captures):
+        for (dx, dy) in offsets:
+            x = xfrom + dx
+            y = yfrom + dy
+            if (not board.in_bounds(x, y)):
+                continue
+
+            piece = board.squares[y*8 + x]
+            if (piece == 0):
+                if (not captures):
+                    yield Move(xfrom, yfrom, x, y)
+            elif (captures and piece.color != self.color):
+                yield Move(xfrom, yfrom, x, y)
 
     def to_string(self):
         return self.color + self.piece_type + " "
@@ -124,14 +88,16 @@ class Rook(Piece):
     PIECE_TYPE = "R"
     VALUE = 500
 
-    def __init__(self, x, y, color):
-        super(Rook, self).__init__(x, y, color, Rook.PIECE_TYPE, Rook.VALUE)
+    __slots__ = ()
+
+    def __init__(self, color):
+        super(Rook, self).__init__(color, Rook.PIECE_TYPE, Rook.VALUE)
 
-    def get_possible_moves(self, board):
-        return self.get_possible_horizontal_moves(board)
+    def generate_captures(self, board, x, y):
+        return self.generate_sliding_moves(board, x, y, Piece.HORIZONTAL_DIRECTIONS, True)
 
-    def clone(self):
-        return Rook(self.x, self.y, self.color)
+    def generate_quiet_moves(self, board, x, y):
+        return self.generate_sliding_moves(board, x, y, Piece.HORIZONTAL_DIRECTIONS, False)
 
 
 class Knight(Piece):
@@ -139,25 +105,18 @@ class Knight(Piece):
     PIECE_TYPE = "N"
     VALUE = 320
 
-    def __init__(self, x, y, color):
-        super(Knight, self).__init__(x, y, color, Knight.PIECE_TYPE, Knight.VALUE)
+    OFFSETS = [(2, 1), (-1, 2), (-2, 1), (1, -2), (2, -1), (1, 2), (-2, -1), (-1, -2)]
 
-    def get_possible_moves(self, board):
-        moves = []
+    __slots__ = ()
 
-        moves.append(self.get_move(board, self.x+2, self.y+1))
-        moves.append(self.get_move(board, self.x-1, self.y+2))
-        moves.append(self.get_move(board, self.x-2, self.y+1))
-        moves.append(self.get_move(board, self.x+1, self.y-2))
-        moves.append(self.get_move(board, self.x+2, self.y-1))
-        moves.append(self.get_move(board, self.x+1, self.y+2))
-        moves.append(self.get_move(board, self.x-2, self.y-1))
-        moves.append(self.get_move(board, self.x-1, self.y-2))
+    def __init__(self, color):
+        super(Knight, self).__init__(color, Knight.PIECE_TYPE, Knight.VALUE)
 
-        return self.remove_null_from_list(moves)
+    def generate_captures(self, board, x, y):
+        return self.generate_step_moves(board, x, y, Knight.OFFSETS, True)
 
-    def clone(self):
-        return Knight(self.x, self.y, self.color)
+    def generate_quiet_moves(self, board, x, y):
+        return self.generate_step_moves(board, x, y, Knight.OFFSETS, False)
 
 
 class Bishop(Piece):
@@ -165,14 +124,16 @@ class Bishop(Piece):
     PIECE_TYPE = "B"
     VALUE = 330
 
-    def __init__(self, x, y, color):
-        super(Bishop, self).__init__(x, y, color, Bishop.PIECE_TYPE, Bishop.VALUE)
+    __slots__ = ()
 
-    def get_possible_moves(self, board):
-        return self.get_possible_diagonal_moves(board)
+    def __init__(self, color):
+        super(Bishop, self).__init__(color, Bishop.PIECE_TYPE, Bishop.VALUE)
 
-    def clone(self):
-        return Bishop(self.x, self.y, self.color)
+    def generate_captures(self, board, x, y):
+        return self.generate_sliding_moves(board, x, y, Piece.DIAGONAL_DIRECTIONS, True)
+
+    def generate_quiet_moves(self, board, x, y):
+        return self.generate_sliding_moves(board, x, y, Piece.DIAGONAL_DIRECTIONS, False)
 
 
 class Queen(Piece):
@@ -180,16 +141,18 @@ class Queen(Piece):
     PIECE_TYPE = "Q"
     VALUE = 900
 
-    def __init__(self, x, y, color):
-        super(Queen, self).__init__(x, y, color, Queen.PIECE_TYPE, Queen.VALUE)
+    __slots__ = ()
+
+    def __init__(self, color):
+        super(Queen, self).__init__(color, Queen.PIECE_TYPE, Queen.VALUE)
 
-    def get_possible_moves(self, board):
-        diagonal = self.get_possible_diagonal_moves(board)
-        horizontal = self.get_possible_horizontal_moves(board)
-        return horizontal + diagonal
+    DIRECTIONS = Piece.HORIZONTAL_DIRECTIONS + Piece.DIAGONAL_DIRECTIONS
 
-    def clone(self):
-        return Queen(self.x, self.y, self.color)
+    def generate_captures(self, board, x, y):
+        return self.generate_sliding_moves(board, x, y, Queen.DIRECTIONS, True)
+
+    def generate_quiet_moves(self, board, x, y):
+        return self.generate_sliding_moves(board, x, y, Queen.DIRECTIONS, False)
 
 
 class King(Piece):
@@ -197,76 +160,72 @@ class King(Piece):
     PIECE_TYPE = "K"
     VALUE = 20000
 
-    def __init__(self, x, y, color):
-        super(King, self).__init__(x, y, color, King.PIECE_TYPE, King.VALUE)
+    OFFSETS = [(1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)]
+
+    __slots__ = ()
 
-    def get_possible_moves(self, board):
-        moves = []
+    def __init__(self, color):
+        super(King, self).__init__(color, King.PIECE_TYPE, King.VALUE)
 
-        moves.append(self.get_move(board, self.x+1, self.y))
-        moves.append(self.get_move(board, self.x+1, self.y+1))
-        moves.append(self.get_move(board, self.x, self.y+1))
-        moves.append(self.get_move(board, self.x-1, self.y+1))
-        moves.append(self.get_move(board, self.x-1, self.y))
-        moves.append(self.get_move(board, self.x-1, self.y-1))
-        moves.append(self.get_move(board, self.x, self.y-1))
-        moves.append(self.get_move(board, self.x+1, self.y-1))
+    def generate_captures(self, board, x, y):
+        return self.generate_step_moves(board, x, y, King.OFFSETS, True)
 
-        moves.append(self.get_castle_kingside_move(board))
-        moves.append(self.get_castle_queenside_move(board))
+    def generate_quiet_moves(self, board, x, y):
+        yield from self.generate_step_moves(board, x, y, King.OFFSETS, False)
 
-        return self.remove_null_from_list(moves)
+        castle = self.get_castle_kingside_move(board, x, y)
+        if (castle != 0):
+            yield castle
+        castle = self.get_castle_queenside_move(board, x, y)
+        if (castle != 0):
+            yield castle
 
     # Only checks for castle kingside
-    def get_castle_kingside_move(self, board):
+    def get_castle_kingside_move(self, board, x, y):
         # Are we looking at a valid rook
-        piece_in_corner = board.get_piece(self.x+3, self.y)
+        piece_in_corner = board.get_piece(x+3, y)
         if (piece_in_corner == 0 or piece_in_corner.piece_type != Rook.PIECE_TYPE):
             return 0
 
         # If the rook in the corner is not our color we cannot castle (duh).
         if (piece_in_corner.color != self.color):
             return 0
-        
+
         # If the king has moved, we cannot castle
         if (self.color == Piece.WHITE and board.white_king_moved):
             return 0
-        
+
         if (self.color == Piece.BLACK and board.black_king_moved):
             return 0
 
         # If there are pieces in between the king and rook we cannot castle
-        if (board.get_piece(self.x+1, self.y) != 0 or board.get_piece(self.x+2, self.y) != 0):
+        if (board.get_piece(x+1, y) != 0 or board.get_piece(x+2, y) != 0):
             return 0
-        
-        return Move(self.x, self.y, self.x+2, self.y)
 
-    def get_castle_queenside_move(self, board):
+        return Move(x, y, x+2, y, castle=True)
+
+    def get_castle_queenside_move(self, board, x, y):
         # Are we looking at a valid rook
-        piece_in_corner = board.get_piece(self.x-4, self.y)
+        piece_in_corner = board.get_piece(x-4, y)
         if (piece_in_corner == 0 or piece_in_corner.piece_type != Rook.PIECE_TYPE):
             return 0
 
         # If the rook in the corner is not our color we cannot castle (duh).
         if (piece_in_corner.color != self.color):
             return 0
-        
+
         # If the king has moved, we cannot castle
         if (self.color == Piece.WHITE and board.white_king_moved):
             return 0
-        
+
         if (self.color == Piece.BLACK and board.black_king_moved):
             return 0
 
         # If there are pieces in between the king and rook we cannot castle
-        if (board.get_piece(self.x-1, self.y) != 0 or board.get_piece(self.x-2, self.y) != 0 or board.get_piece(self.x-3, self.y) != 0):
+        if (board.get_piece(x-1, y) != 0 or board.get_piece(x-2, y) != 0 or board.get_piece(x-3, y) != 0):
             return 0
-        
-        return Move(self.x, self.y, self.x-2, self.y)
-
 
-    def clone(self):
-        return King(self.x, self.y, self.color)
+        return Move(x, y, x-2, y, castle=True)
 
 
 class Pawn(Piece):
@@ -274,42 +233,57 @@ class Pawn(Piece):
     PIECE_TYPE = "P"
     VALUE = 100
 
-    def __init__(self, x, y, color):
-        super(Pawn, self).__init__(x, y, color, Pawn.PIECE_TYPE, Pawn.VALUE)
+    __slots__ = ()
 
-    def is_starting_position(self):
+    def __init__(self, color):
+        super(Pawn, self).__init__(color, Pawn.PIECE_TYPE, Pawn.VALUE)
+
+    def is_starting_position(self, y):
         if (self.color == Piece.BLACK):
-            return self.y == 1
+            return y == 1
         else:
-            return self.y == 8 - 2
-
-    def get_possible_moves(self, board):
-        moves = []
+            return y == 8 - 2
 
-        # Direction the pawn can move in.
-        direction = -1
+    # Direction the pawn moves in along y.
+    def get_direction(self):
         if (self.color == Piece.BLACK):
-            direction = 1
+            return 1
+        return -1
+
+    # Returns the move of a pawn from (xfrom, yfrom) to (x, y). A pawn
+    # reaching the last row always promotes to a queen.
+    def get_move(self, xfrom, yfrom, x, y):
+        if (y == 0 or y == 7):
+            return Move(xfrom, yfrom, x, y, Queen.PIECE_TYPE)
+        return Move(xfrom, yfrom, x, y)
+
+    # Eating pieces.
+    def generate_captures(self, board, x, y):
+        direction = self.get_direction()
+        for xto in (x + 1, x - 1):
+            piece = board.get_piece(xto, y + direction)
+            if (piece != 0 and piece.color != self.color):
+                yield self.get_move(x, y, xto, y + direction)
+
+    def generate_quiet_moves(self, board, x, y):
+        direction = self.get_direction()
+        if (not board.in_bounds(x, y + direction) or board.get_piece(x, y + direction) != 0):
+            return
 
         # The general 1 step forward move.
-        if (board.get_piece(self.x, self.y+direction) == 0):
-            moves.append(self.get_move(board, self.x, self.y + direction))
+        yield self.get_move(x, y, x, y + direction)
 
         # The Pawn can take 2 steps as the first move.
-        if (self.is_starting_position() and board.get_piece(self.x, self.y+ direction) == 0 and board.get_piece(self.x, self.y + direction*2) == 0):
-            moves.append(self.get_move(board, self.x, self.y + direction * 2))
-
-        # Eating pieces.
-        piece = board.get_piece(self.x + 1, self.y + direction)
-        if (piece != 0):
-            moves.append(self.get_move(board, self.x + 1, self.y + direction))
+        if (self.is_starting_position(y) and board.get_piece(x, y + direction*2) == 0):
+            yield Move(x, y, x, y + direction*2)
 
-        piece = board.get_piece(self.x - 1, self.y + direction)
-        if (piece != 0):
-            moves.append(self.get_move(board, self.x - 1, self.y + direction))
 
-        return self.remove_null_from_list(moves)
+# PIECES[color][piece_type] is the one shared instance of that piece.
+PIECES = {
+    color: {piece_class.PIECE_TYPE: piece_class(color) for piece_class in (Pawn, Knight, Bishop, Rook, Queen, King)}
+    for color in (Piece.WHITE, Piece.BLACK)
+}
 
-    def clone(self):
-        return Pawn(self.x, self.y, self.color)
 
+def get_piece(piece_type, color):
+    return PIECES[color][piece_type]
@@ -0,0 +1,90 @@
+import threading
+import ai
+
+class Ponderer:
+
+    # Searches in a background thread while the opponent is thinking:
+    #
+    #     ponderer.start(chessboard)    # right after the AI moved
+    #     ...                           # the opponent thinks and moves
+    #     move = ponderer.get_move(opponent_move, depth)
+    #     if (move == 0):
+    #         move = ai.AI.get_ai_move(chessboard, max_depth=depth)
+    #
+    # With EXPECTED the position after the opponent's most likely reply is
+    # searched, and if the opponent plays that reply the result is used as
+    # the AI's move straight away. With ALL the position before the reply is
+    # searched, which fills the transposition table for every reply. In both
+    # modes the table keeps what was searched, so even a search started
+    # after a wrong guess starts from a warm table.
+    EXPECTED = "expected"
+    ALL = "all"
+
+    def __init__(self, mode=EXPECTED, max_depth=ai.AI.MAX_DEPTH):
+        if (mode not in (Ponderer.EXPECTED, Ponderer.ALL)):
+            raise ValueError("Invalid ponder mode: " + str(mode))
+
+        self.mode = mode
+        self.max_depth = max_depth
+        self.thread = None
+        # The reply being pondered on, or 0 when searching all replies.
+        self.expected_move = 0
+        # (best_move, best_score, depth) of the last ponder search.
+        self.result = None
+
+    # Starts pondering on the given position, with the opponent to move. The
+    # board is cloned, so the caller may keep using it. Without an expected
+    # reply every reply is pondered on, like with ALL.
+    def start(self, chessboard):
+        self.stop()
+
+        chessboard = type(chessboard).clone(chessboard)
+        self.expected_move = 0
+        if (self.mode == Ponderer.EXPECTED):
+            self.expected_move = Ponderer.get_expected_move(chessboard)
+            if (self.expected_move != 0):
+                chessboard.make_move(self.expected_move)
+
+        self.result = None
+        self.thread = threading.Thread(target=self.run, args=(chessboard,), daemon=True)
+        self.thread.start()
+
+    def run(self, chessboard):
+        self.result = ai.AI.search(chessboard, max_depth=self.max_depth)
+
+    # Stops pondering and waits for the background search to finish.
+    def stop(self):
+        if (self.thread is None):
+            return
+
+        ai.AI.stop()
+        self.thread.join()
+        self.thread = None
+        ai.AI.stop_requested = False
+
+    # Stops pondering after the opponent played the given move. Returns the
+    # AI's reply if the move was the expected one and the ponder search got
+    # at least min_depth plies deep, otherwise 0.
+    def get_move(self, opponent_move, min_depth=ai.AI.DEFAULT_DEPTH):
+        self.stop()
+        if (self.expected_move == 0 or opponent_move != self.expected_move):
+            return 0
+
+        (best_move, best_score, depth) = self.result
+        if (depth < min_depth):
+            return 0
+        return best_move
+
+    # Returns the best move for the color to move stored in the
+    # transposition table, which after a search is the move the AI expects
+    # in reply, or 0 if there is none.
+    @staticmethod
+    def get_expected_move(chessboard):
+        entry = ai.AI.transposition_table.probe(chessboard.hash)
+        if (entry is None):
+            return 0
+
+        move = entry[3]
+        if (move == 0 or move not in chessboard.get_legal_moves(chessboard.turn)):
+            return 0
+        return move
@@ -0,0 +1,208 @@
+import argparse, collections, random, sys, time
+import ai, bitboard, pgn, pieces
+from concurrent import futures
+
+# Plays the AI against itself, one game per task in a pool of worker
+# processes, and streams every finished game as PGN. Each game starts with a
+# few random moves so the games differ, and the search settings of white
+# and black can differ too, which makes it usable for regression tests
+# between settings and for generating book and evaluation data.
+
+# Plies a game may last before it is adjudicated a draw.
+DEFAULT_MAX_PLIES = 300
+# The fifty-move rule, in plies.
+FIFTY_MOVES = 100
+
+
+# Plays one game and returns (pgn text, stats). settings maps each color to
+# its (time_ms, max_depth). Runs in the worker processes.
+def play_game(number, settings, random_plies, max_plies, seed, backend):
+    rng = random.Random(seed + number)
+    chessboard = bitboard.BACKENDS[backend].new()
+    # Every game starts from an empty table, so games don't depend on the
+    # games the worker played before.
+    ai.AI.transposition_table.clear()
+
+    moves = []
+    repetitions = collections.Counter([chessboard.hash])
+    nodes = {pieces.Piece.WHITE: 0, pieces.Piece.BLACK: 0}
+    seconds = {pieces.Piece.WHITE: 0.0, pieces.Piece.BLACK: 0.0}
+    start = time.perf_counter()
+    while (True):
+        legal_moves = chessboard.get_legal_moves(chessboard.turn)
+        (result, termination) = get_result(chessboard, legal_moves, repetitions, len(moves), max_plies)
+        if (result is not None):
+            break
+
+        color = chessboard.turn
+        if (len(moves) < random_plies):
+            move = rng.choice(legal_moves)
+        else:
+            (time_ms, max_depth) = settings[color]
+            search_start = time.perf_counter()
+            (move, score, depth) = ai.AI.search(chessboard, time_ms, max_depth)
+            seconds[color] += time.perf_counter() - search_start
+            nodes[color] += ai.AI.nodes
+
+        moves.append(pgn.to_san(chessboard, move))
+        chessboard.make_move(move)
+        repetitions[chessboard.hash] += 1
+
+    stats = {
+        "game": number,
+        "result": result,
+        "termination": termination,
+        "plies": len(moves),
+        "seconds": round(time.perf_counter() - start, 3),
+        "nodes": nodes[pieces.Piece.WHITE] + nodes[pieces.Piece.BLACK],
+        "search_seconds": round(seconds[pieces.Piece.WHITE] + seconds[pieces.Piece.BLACK], 3)
+    }
+    headers = {
+        "Event": "Self-play",
+        "Site": "?",
+        "Date": time.strftime("%Y.%m.%d"),
+        "Round": number,
+        "White": get_player_name(settings[pieces.Piece.WHITE]),
+        "Black": get_player_name(settings[pieces.Piece.BLACK]),
+        "Result": result,
+        "Termination": termination,
+        "PlyCount": len(moves),
+        "WhiteNodes": nodes[pieces.Piece.WHITE],
+        "BlackNodes": nodes[pieces.Piece.BLACK],
+        "WhiteNodesPerSecond": get_speed(nodes[pieces.Piece.WHITE], seconds[pieces.Piece.WHITE]),
+        "BlackNodesPerSecond": get_speed(nodes[pieces.Piece.BLACK], seconds[pieces.Piece.BLACK])
+    }
+    return (pgn.format_game(headers, moves, result), stats)
+
+
+# Returns (result, termination) if the game is over, otherwise (None, None).
+def get_result(chessboard, legal_moves, repetitions, plies, max_plies):
+    if (not legal_moves):
+        if (not chessboard.is_check(chessboard.turn)):
+            return ("1/2-1/2", "stalemate")
+        if (chessboard.turn == pieces.Piece.WHITE):
+            return ("0-1", "checkmate")
+        return ("1-0", "checkmate")
+
+    if (repetitions[chessboard.hash] >= 3):
+        return ("1/2-1/2", "threefold repetition")
+    if (chessboard.halfmove_clock >= FIFTY_MOVES):
+        return ("1/2-1/2", "fifty-move rule")
+    if (is_insufficient_material(chessboard)):
+        return ("1/2-1/2", "insufficient material")
+    if (plies >= max_plies):
+        return ("1/2-1/2", "adjudication")
+    return (None, None)
+
+
+# Returns true iff no side can mate: bare kings, or a single knight or
+# bishop against a bare king.
+def is_insufficient_material(chessboard):
+    if (chessboard.piece_count > 3):
+        return False
+    for piece in chessboard.squares:
+        if (piece != 0 and piece.piece_type not in (pieces.King.PIECE_TYPE, pieces.Knight.PIECE_TYPE, pieces.Bishop.PIECE_TYPE)):
+            return False
+    return True
+
+
+def get_player_name(setting):
+    (time_ms, max_depth) = setting
+    name = "AI"
+    if (time_ms is not None):
+        name += " " + str(time_ms) + "ms"
+    if (max_depth is not None):
+        name += " depth " + str(max_depth)
+    return name
+
+
+def get_speed(nodes, seconds):
+    if (seconds == 0):
+        return 0
+    return int(nodes / seconds)
+
+
+# Yields (pgn text, stats) of the games as they finish. At most queue_size
+# games are submitted to the pool at a time.
+def play_games(games, settings, random_plies, max_plies, seed, backend, workers, queue_size):
+    with futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for number in range(1, games + 1):
+            pending.add(pool.submit(play_game, number, settings, random_plies, max_plies, seed, backend))
+            if (len(pending) >= queue_size):
+                (done, pending) = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+        for future in futures.as_completed(pending):
+            yield future.result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plays the AI against itself and writes the games as PGN.")
+    parser.add_argument("--games", type=int, default=10, help="games to play (default: 10)")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes (default: 1)")
+    parser.add_argument("--time-ms", type=int, help="time per move of both sides in milliseconds")
+    parser.add_argument("--depth", type=int, help="search depth of both sides (default: " + str(ai.AI.DEFAULT_DEPTH) + " without a time)")
+    parser.add_argument("--white-time-ms", type=int, help="time per move of white, overrides --time-ms")
+    parser.add_argument("--white-depth", type=int, help="search depth of white, overrides --depth")
+    parser.add_argument("--black-time-ms", type=int, help="time per move of black, overrides --time-ms")
+    parser.add_argument("--black-depth", type=int, help="search depth of black, overrides --depth")
+    parser.add_argument("--random-plies", type=int, default=4, help="random moves at the start of every game (default: 4)")
+    parser.add_argument("--max-plies", type=int, default=DEFAULT_MAX_PLIES, help="plies before a game is adjudicated a draw (default: " + str(DEFAULT_MAX_PLIES) + ")")
+    parser.add_argument("--seed", type=int, help="seed of the random openings (default: random)")
+    bitboard.add_backend_argument(parser)
+    parser.add_argument("--output", help="PGN file to write the games to (default: stdout)")
+    args = parser.parse_args()
+
+    settings = {
+        pieces.Piece.WHITE: get_setting(args.white_time_ms, args.white_depth, args.time_ms, args.depth),
+        pieces.Piece.BLACK: get_setting(args.black_time_ms, args.black_depth, args.time_ms, args.depth)
+    }
+    seed = args.seed
+    if (seed is None):
+        seed = random.randrange(2 ** 32)
+
+    output = sys.stdout
+    if (args.output is not None):
+        output = open(args.output, "w")
+
+    start = time.perf_counter()
+    results = collections.Counter()
+    nodes = 0
+    search_seconds = 0
+    try:
+        for (text, stats) in play_games(args.games, settings, args.random_plies, args.max_plies, seed, args.backend, args.workers, args.workers * 2):
+            output.write(text + "\n")
+            output.flush()
+            results[stats["result"]] += 1
+            nodes += stats["nodes"]
+            search_seconds += stats["search_seconds"]
+            print("Game " + str(stats["game"]) + ": " + stats["result"] + " (" + stats["termination"] + ") in "
+                + str(stats["plies"]) + " plies, " + str(stats["seconds"]) + "s", file=sys.stderr)
+    finally:
+        if (output is not sys.stdout):
+            output.close()
+
+    elapsed = time.perf_counter() - start
+    games = sum(results.values())
+    print("Games: " + str(games) + ", white wins " + str(results["1-0"]) + ", black wins " + str(results["0-1"])
+        + ", draws " + str(results["1/2-1/2"]) + ", seed " + str(seed), file=sys.stderr)
+    print("Time: " + str(round(elapsed, 3)) + "s, " + str(round(games / elapsed, 3)) + " games/sec, "
+        + str(get_speed(nodes, search_seconds)) + " nodes/sec on average", file=sys.stderr)
+
+
+# Returns the (time_ms, max_depth) of a side from its own options and the
+# options of both sides. Without a time, the default depth is searched.
+def get_setting(time_ms, max_depth, default_time_ms, default_depth):
+    if (time_ms is None):
+        time_ms = default_time_ms
+    if (max_depth is None):
+        max_depth = default_depth
+    if (time_ms is None and max_depth is None):
+        max_depth = ai.AI.DEFAULT_DEPTH
+    return (time_ms, max_depth)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,387 @@
+import argparse, asyncio, collections, itertools, json, signal, time
+from concurrent import futures
+import ai, bitboard, pieces
+
+# Hosts many games in one process. Clients send JSON requests, either one
+# per line over a plain socket or over HTTP, and the AI searches run in a
+# bounded pool of worker processes, so the event loop only ever does the
+# cheap work of keeping the boards:
+#
+#     {"command": "new"}                                -> {"game": 1, "fen": ...}
+#     {"command": "move", "game": 1, "move": "e2e4"}    -> the AI replies too
+#     {"command": "think", "game": 1, "time_ms": 500}   -> the AI moves
+#     {"command": "get", "game": 1}
+#     {"command": "close", "game": 1}
+#     {"command": "stats"}
+#
+# Over HTTP the same requests are POSTed as the body to /, or sent as:
+#     POST /games, GET /games/<id>, POST /games/<id>/move, POST /games/<id>/think,
+#     DELETE /games/<id>, GET /stats
+
+DEFAULT_TIME_MS = 1000
+
+# HTTP status of an error response by its error code.
+HTTP_STATUS = {None: "200 OK", "invalid": "400 Bad Request", "busy": "503 Service Unavailable"}
+
+
+# Raised when a search cannot be queued because the queue is full.
+class ServerBusyError(Exception):
+    pass
+
+
+class Game:
+
+    def __init__(self, chessboard):
+        self.chessboard = chessboard
+        self.moves = []
+        # Keeps the requests of one game in order while an AI search runs.
+        self.lock = asyncio.Lock()
+
+
+class GameServer:
+
+    # workers searches run at a time and at most max_queue more wait for a
+    # worker. Requests for an AI move beyond that are rejected as busy
+    # instead of piling up. Time budgets of requests are capped to
+    # max_time_ms.
+    def __init__(self, board_class, workers, max_queue, max_time_ms, latency_samples=10000):
+        self.board_class = board_class
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_time_ms = max_time_ms
+        self.pool = futures.ProcessPoolExecutor(max_workers=workers)
+        self.games = {}
+        self.game_ids = itertools.count(1)
+        # Searches submitted to the pool and not finished yet.
+        self.pending = 0
+        self.searches = 0
+        self.rejected = 0
+        # Milliseconds from request to result of the latest searches.
+        self.latencies = collections.deque(maxlen=latency_samples)
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+    # Returns the response to a request. Errors are responses too, with an
+    # "error" message and a "code" of "invalid" or "busy".
+    async def handle_request(self, request):
+        try:
+            if (not isinstance(request, dict)):
+                raise ValueError("Request must be a JSON object")
+            command = request.get("command")
+            if (command == "new"):
+                return self.new_game(request)
+            if (command == "move"):
+                return await self.play_move(request)
+            if (command == "think"):
+                return await self.think(request)
+            if (command == "get"):
+                return self.get_game_state(self.get_game(request))
+            if (command == "close"):
+                self.games.pop(self.get_game_id(request), None)
+                return {"closed": True}
+            if (command == "stats"):
+                return self.get_stats()
+            raise ValueError("Unknown command: " + str(command))
+        except ValueError as error:
+            return {"error": str(error), "code": "invalid"}
+        except ServerBusyError as error:
+            return {"error": str(error), "code": "busy"}
+
+    def new_game(self, request):
+        fen = request.get("fen")
+        if (fen is None):
+            chessboard = self.board_class.new()
+        elif (isinstance(fen, str)):
+            chessboard = self.board_class.from_fen(fen)
+        else:
+            raise ValueError("Invalid fen: " + json.dumps(fen))
+
+        game_id = next(self.game_ids)
+        self.games[game_id] = Game(chessboard)
+        response = self.get_game_state(self.games[game_id])
+        response["game"] = game_id
+        return response
+
+    # Plays the given move and, unless "reply" is false, the AI's reply. If
+    # the server is too busy to reply, the move stays played and the AI's
+    # reply can be asked for with think.
+    async def play_move(self, request):
+        game = self.get_game(request)
+        limits = self.get_search_limits(request)
+        async with game.lock:
+            chessboard = game.chessboard
+            move = chessboard.parse_uci_move(str(request.get("move")))
+            chessboard.make_move(move)
+            game.moves.append(move.to_uci())
+
+            response = {}
+            if (request.get("reply", True) and get_status(chessboard) == "playing"):
+                response = await self.play_ai_move(game, limits)
+        response.update(self.get_game_state(game))
+        return response
+
+    async def think(self, request):
+        game = self.get_game(request)
+        limits = self.get_search_limits(request)
+        async with game.lock:
+            response = await self.play_ai_move(game, limits)
+        response.update(self.get_game_state(game))
+        return response
+
+    # Returns the (time_ms, max_depth) of an AI move asked for in the request.
+    # Checked before anything is played, so an invalid request changes nothing.
+    def get_search_limits(self, request):
+        time_ms = min(get_int_field(request, "time_ms", DEFAULT_TIME_MS, 1), self.max_time_ms)
+        return (time_ms, get_int_field(request, "depth", None, 1))
+
+    # Searches the game's position in the pool and plays the best move.
+    async def play_ai_move(self, game, limits):
+        (time_ms, max_depth) = limits
+        (move, score, depth, nodes, search_ms) = await self.search(game.chessboard, time_ms, max_depth)
+        if (move is None):
+            return {"ai_move": None}
+
+        game.chessboard.make_move(game.chessboard.parse_uci_move(move))
+        game.moves.append(move)
+        return {"ai_move": move, "score": score, "depth": depth, "nodes": nodes, "search_ms": search_ms}
+
+    async def search(self, chessboard, time_ms, max_depth):
+        if (self.pending >= self.workers + self.max_queue):
+            self.rejected += 1
+            raise ServerBusyError("Too many searches queued, try again later")
+
+        start = time.perf_counter()
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self.pool, search_position, self.board_class, chessboard.to_fen(), time_ms, max_depth)
+        finally:
+            self.pending -= 1
+        self.searches += 1
+        self.latencies.append((time.perf_counter() - start) * 1000)
+        return result
+
+    def get_game_id(self, request):
+        try:
+            return int(request.get("game"))
+        except (OverflowError, TypeError, ValueError):
+            raise ValueError("Invalid game: " + str(request.get("game")))
+
+    def get_game(self, request):
+        game_id = self.get_game_id(request)
+        if (game_id not in self.games):
+            raise ValueError("No such game: " + str(game_id))
+        return self.games[game_id]
+
+    def get_game_state(self, game):
+        return {
+            "fen": game.chessboard.to_fen(),
+            "moves": list(game.moves),
+            "status": get_status(game.chessboard)
+        }
+
+    def get_stats(self):
+        latencies = sorted(self.latencies)
+        return {
+            "games": len(self.games),
+            "workers": self.workers,
+            "queue_depth": max(0, self.pending - self.workers),
+            "searching": min(self.pending, self.workers),
+            "searches": self.searches,
+            "rejected": self.rejected,
+            "latency_ms": {
+                "p50": get_percentile(latencies, 0.5),
+                "p90": get_percentile(latencies, 0.9),
+                "p99": get_percentile(latencies, 0.99),
+                "max": get_percentile(latencies, 1.0)
+            }
+        }
+
+    # Serves JSON requests, one per line, answering each with one line.
+    # Requests of a connection are handled in order, so a client sending
+    # faster than the server answers is slowed down by its socket buffers.
+    async def handle_connection(self, reader, writer):
+        try:
+            while (True):
+                line = await reader.readline()
+                if (not line):
+                    break
+                if (not line.strip()):
+                    continue
+
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    response = {"error": "Invalid JSON", "code": "invalid"}
+                else:
+                    response = await self.handle_request(request)
+                writer.write((json.dumps(response) + "\n").encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    # Serves one HTTP/1.1 request per connection.
+    async def handle_http(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            headers = {}
+            while (True):
+                line = (await reader.readline()).decode("latin-1").strip()
+                if (not line):
+                    break
+                (name, _, value) = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+            content_length = headers.get("content-length", "0")
+
+            if (len(request_line) < 2):
+                response = {"error": "Invalid HTTP request", "code": "invalid"}
+            elif (not content_length.isdigit()):
+                # The body cannot be told apart from what follows it, so it
+                # is not read and the connection is closed after the reply.
+                response = {"error": "Invalid Content-Length: " + content_length, "code": "invalid"}
+            else:
+                body = await reader.readexactly(int(content_length))
+                try:
+                    request = get_http_request(request_line[0], request_line[1], body)
+                except ValueError as error:
+                    response = {"error": str(error), "code": "invalid"}
+                else:
+                    response = await self.handle_request(request)
+
+            content = json.dumps(response).encode()
+            status = HTTP_STATUS[response.get("code") if "error" in response else None]
+            writer.write(("HTTP/1.1 " + status + "\r\nContent-Type: application/json\r\nContent-Length: "
+                + str(len(content)) + "\r\nConnection: close\r\n\r\n").encode() + content)
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+# Turns an HTTP method, path and body into a request, see the top of this file.
+def get_http_request(method, path, body):
+    request = {}
+    if (body.strip()):
+        request = json.loads(body)
+        if (not isinstance(request, dict)):
+            raise ValueError("Request must be a JSON object")
+
+    parts = [part for part in path.split("?")[0].split("/") if part]
+    if (not parts):
+        return request
+    if (parts == ["stats"]):
+        request["command"] = "stats"
+    elif (parts == ["games"] and method == "POST"):
+        request["command"] = "new"
+    elif (parts[0] == "games" and len(parts) >= 2):
+        request["game"] = parts[1]
+        if (len(parts) == 2 and method == "GET"):
+            request["command"] = "get"
+        elif (len(parts) == 2 and method == "DELETE"):
+            request["command"] = "close"
+        elif (len(parts) == 3 and method == "POST" and parts[2] in ("move", "think")):
+            request["command"] = parts[2]
+        else:
+            raise ValueError("Invalid path: " + method + " " + path)
+    else:
+        raise ValueError("Invalid path: " + method + " " + path)
+    return request
+
+
+# Runs in the worker processes. Every worker keeps its own transposition
+# table between searches. Returns (move, score, depth, nodes, milliseconds)
+# with the move in UCI notation, or None if there is no legal move.
+def search_position(board_class, fen, time_ms, max_depth):
+    chessboard = board_class.from_fen(fen)
+    start = time.perf_counter()
+    (move, score, depth) = ai.AI.search(chessboard, time_ms, max_depth)
+    elapsed = (time.perf_counter() - start) * 1000
+    if (move == 0):
+        return (None, score, depth, ai.AI.nodes, round(elapsed, 3))
+    return (move.to_uci(), score, depth, ai.AI.nodes, round(elapsed, 3))
+
+
+def get_status(chessboard):
+    if (chessboard.get_legal_moves(chessboard.turn)):
+        return "playing"
+    if (chessboard.is_check(chessboard.turn)):
+        if (chessboard.turn == pieces.Piece.WHITE):
+            return "black wins"
+        return "white wins"
+    return "stalemate"
+
+
+# Returns the integer field name of the request, or default if it is
+# missing. Raises ValueError unless the value is an integer of at least
+# minimum, or a string of one.
+def get_int_field(request, name, default, minimum):
+    if (name not in request):
+        return default
+
+    value = request[name]
+    try:
+        if (isinstance(value, bool)):
+            raise TypeError(name + " must be an integer")
+        number = int(value)
+    except (OverflowError, TypeError, ValueError):
+        raise ValueError("Invalid " + name + ": " + json.dumps(value))
+    if (number < minimum):
+        raise ValueError("Invalid " + name + ": must be at least " + str(minimum))
+    return number
+
+
+# Nearest-rank percentile of sorted values, or None without values.
+def get_percentile(values, fraction):
+    if (not values):
+        return None
+    index = min(len(values) - 1, max(0, int(round(fraction * len(values))) - 1))
+    return round(values[index], 3)
+
+
+async def serve(args):
+    server = GameServer(bitboard.BACKENDS[args.backend], args.workers, args.max_queue, args.max_time_ms)
+    servers = [await asyncio.start_server(server.handle_connection, args.host, args.port)]
+    if (args.http_port is not None):
+        servers.append(await asyncio.start_server(server.handle_http, args.host, args.http_port))
+    print("Serving JSON lines on " + args.host + ":" + str(args.port), flush=True)
+    if (args.http_port is not None):
+        print("Serving HTTP on " + args.host + ":" + str(args.http_port), flush=True)
+
+    # Shut the worker pool down on SIGTERM too, not only on ^C, or the
+    # workers outlive the server.
+    serving = asyncio.gather(*[socket_server.serve_forever() for socket_server in servers])
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, serving.cancel)
+    except NotImplementedError:
+        pass
+    try:
+        await serving
+    except asyncio.CancelledError:
+        pass
+    finally:
+        server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serves many games over a local socket and HTTP, with the AI searching in a process pool.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="port for JSON lines (default: 8765)")
+    parser.add_argument("--http-port", type=int, help="port for HTTP (default: no HTTP)")
+    parser.add_argument("--workers", type=int, default=2, help="search worker processes (default: 2)")
+    parser.add_argument("--max-queue", type=int, default=64, help="searches that may wait for a worker (default: 64)")
+    parser.add_argument("--max-time-ms", type=int, default=5000, help="cap on the time budget of a search (default: 5000)")
+    bitboard.add_backend_argument(parser)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+import ai, board
+from pawnhash import PawnHashTable
+from transposition import TranspositionTable
+
+class SearchStats:
+
+    # Collects statistics about every search run while it is enabled:
+    #
+    #     with SearchStats(callback) as stats:
+    #         ai.AI.get_ai_move(chessboard)
+    #     print(stats.to_dict())
+    #
+    # Enabling swaps counting wrappers in for the instrumented functions and
+    # disabling puts the originals back, so searches run outside the with
+    # block execute exactly the same code as before and pay nothing. Only the
+    # calling process is instrumented: the workers of a parallel search show
+    # up in the per iteration node counts but not in the other counters.
+    #
+    # The callback, if given, is called with to_dict() after every completed
+    # iteration and, with node_interval, every node_interval nodes.
+    def __init__(self, callback=None, node_interval=None):
+        self.callback = callback
+        self.node_interval = node_interval
+        # (owner, name, original attribute) of every replaced function while enabled.
+        self.originals = None
+        self.reset()
+
+    def reset(self):
+        self.nodes = 0
+        self.nodes_per_ply = {}
+        self.quiescence_nodes = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.evaluations = 0
+        self.clones = 0
+        self.moves_made = 0
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.pawn_probes = 0
+        self.pawn_hits = 0
+        # One dictionary per completed iteration, see report_iteration.
+        self.iterations = []
+        self.iteration_nodes = 0
+        self.iteration_elapsed = 0
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        self.disable()
+
+    def enable(self):
+        if (self.originals is not None):
+            raise RuntimeError("Search stats are already enabled.")
+        self.originals = []
+
+        alphabeta = ai.AI.alphabeta
+        def counting_alphabeta(chessboard, depth, a, b, maximizing, ply=0, allow_null=True):
+            self.count_node(ply)
+            return alphabeta(chessboard, depth, a, b, maximizing, ply, allow_null)
+        self.replace(ai.AI, "alphabeta", staticmethod(counting_alphabeta))
+
+        quiescence = ai.AI.quiescence
+        def counting_quiescence(chessboard, a, b, maximizing, ply):
+            self.quiescence_nodes += 1
+            return quiescence(chessboard, a, b, maximizing, ply)
+        self.replace(ai.AI, "quiescence", staticmethod(counting_quiescence))
+
+        store_cutoff = ai.AI.store_cutoff
+        def counting_store_cutoff(chessboard, move, index, depth, ply):
+            self.cutoffs += 1
+            if (index == 0):
+                self.first_move_cutoffs += 1
+            store_cutoff(chessboard, move, index, depth, ply)
+        self.replace(ai.AI, "store_cutoff", staticmethod(counting_store_cutoff))
+
+        def counting_report_iteration(depth, best_move, best_score, elapsed):
+            self.report_iteration(depth, best_move, best_score, elapsed)
+        self.replace(ai.AI, "report_iteration", staticmethod(counting_report_iteration))
+
+        evaluate = ai.Heuristics.evaluate
+        def counting_evaluate(chessboard):
+            self.evaluations += 1
+            return evaluate(chessboard)
+        self.replace(ai.Heuristics, "evaluate", staticmethod(counting_evaluate))
+
+        clone = board.Board.__dict__["clone"].__func__
+        def counting_clone(cls, chessboard):
+            self.clones += 1
+            return clone(cls, chessboard)
+        self.replace(board.Board, "clone", classmethod(counting_clone))
+
+        make_move = board.Board.make_move
+        def counting_make_move(chessboard, move):
+            self.moves_made += 1
+            return make_move(chessboard, move)
+        self.replace(board.Board, "make_move", counting_make_move)
+
+        probe = TranspositionTable.probe
+        def counting_probe(table, key):
+            entry = probe(table, key)
+            self.tt_probes += 1
+            if (entry is not None):
+                self.tt_hits += 1
+            return entry
+        self.replace(TranspositionTable, "probe", counting_probe)
+
+        pawn_probe = PawnHashTable.probe
+        def counting_pawn_probe(table, key):
+            score = pawn_probe(table, key)
+            self.pawn_probes += 1
+            if (score is not None):
+                self.pawn_hits += 1
+            return score
+        self.replace(PawnHashTable, "probe", counting_pawn_probe)
+
+    # Puts the original functions back.
+    def disable(self):
+        if (self.originals is None):
+            return
+
+        for (owner, name, original) in reversed(self.originals):
+            setattr(owner, name, original)
+        self.originals = None
+
+    def replace(self, owner, name, wrapper):
+        self.originals.append((owner, name, owner.__dict__[name]))
+        setattr(owner, name, wrapper)
+
+    def count_node(self, ply):
+        self.nodes += 1
+        self.nodes_per_ply[ply] = self.nodes_per_ply.get(ply, 0) + 1
+        if (self.callback is not None and self.node_interval and self.nodes % self.node_interval == 0):
+            self.callback(self.to_dict())
+
+    # Records an iteration of the search. AI.nodes and elapsed count from the
+    # start of the search, which is also where the first iteration begins.
+    def report_iteration(self, depth, best_move, best_score, elapsed):
+        if (depth == 1):
+            self.iteration_nodes = 0
+            self.iteration_elapsed = 0
+
+        self.iterations.append({
+            "depth": depth,
+            "nodes": ai.AI.nodes - self.iteration_nodes,
+            "milliseconds": elapsed - self.iteration_elapsed,
+            "best_move": best_move.to_uci() if best_move != 0 else None,
+            "score": best_score
+        })
+        self.iteration_nodes = ai.AI.nodes
+        self.iteration_elapsed = elapsed
+
+        if (self.callback is not None):
+            self.callback(self.to_dict())
+
+    # Returns the share of the beta cutoffs that came from the first move
+    # searched, or 0 if there were none.
+    def get_first_move_cutoff_rate(self):
+        if (self.cutoffs == 0):
+            return 0
+        return self.first_move_cutoffs / self.cutoffs
+
+    def get_tt_hit_rate(self):
+        if (self.tt_probes == 0):
+            return 0
+        return self.tt_hits / self.tt_probes
+
+    def get_pawn_hash_hit_rate(self):
+        if (self.pawn_probes == 0):
+            return 0
+        return self.pawn_hits / self.pawn_probes
+
+    # Returns the statistics as a dictionary of plain values, ready for JSON.
+    def to_dict(self):
+        return {
+            "nodes": self.nodes,
+            "nodes_per_ply": dict(sorted(self.nodes_per_ply.items())),
+            "quiescence_nodes": self.quiescence_nodes,
+            "cutoffs": self.cutoffs,
+            "first_move_cutoff_rate": self.get_first_move_cutoff_rate(),
+            "evaluations": self.evaluations,
+            "clones": self.clones,
+            "moves_made": self.moves_made,
+            "tt_probes": self.tt_probes,
+            "tt_hits": self.tt_hits,
+            "tt_hit_rate": self.get_tt_hit_rate(),
+            "pawn_probes": self.pawn_probes,
+            "pawn_hits": self.pawn_hits,
+            "pawn_hash_hit_rate": self.get_pawn_hash_hit_rate(),
+            "iterations": list(self.iterations)
+        }
@@ -0,0 +1,501 @@
+import argparse, itertools, mmap, struct
+from array import array
+import bitboard, pieces
+
+# Endgame tablebases built by retrograde analysis, for the rules of this
+# engine: no en passant, no castling and pawns always promote to queens.
+#
+# A material set is named by its pieces, white first, each side starting
+# with its king and then ordered like PIECE_ORDER, e.g. "KQK" or "KRKP". A
+# table holds one signed byte per position, at index
+#     turn * 64^n + square(piece 0) * 64^(n-1) + ... + square(piece n-1)
+# with turn 0 for white to move, squares numbered y * 8 + x like the
+# bitboards and pieces in the order of the name. The value is seen from the
+# side to move:
+#     v > 0   wins, mates in v plies
+#     v < 0   loses, gets mated in -v - 1 plies
+#     0       draw
+#     ILLEGAL the position cannot occur
+# Positions with the colors reversed are looked up by mirroring the board.
+
+PIECE_ORDER = "KQRBNP"
+ILLEGAL = -128
+DEFAULT_SETS = ["KQK", "KRK", "KPK"]
+
+# Tablebase file: a header, one index entry per table, then the tables.
+MAGIC = b"CTB1"
+HEADER = struct.Struct("<4sI")
+INDEX_ENTRY = struct.Struct("<8sQQ")
+
+WHITE = pieces.Piece.WHITE
+BLACK = pieces.Piece.BLACK
+
+# Rows a pawn of each color promotes on and moves two squares from.
+PROMOTION_ROWS = {WHITE: 0, BLACK: 7}
+START_ROWS = {WHITE: 6, BLACK: 1}
+# Square index step of a pawn push.
+PAWN_STEPS = {WHITE: -8, BLACK: 8}
+
+
+# Returns the (color, piece_type) of every piece of a material set name.
+def get_pieces(name):
+    split = name.index(pieces.King.PIECE_TYPE, 1)
+    return [(WHITE, piece_type) for piece_type in name[:split]] + [(BLACK, piece_type) for piece_type in name[split:]]
+
+
+# Returns the name of the material set with the colors reversed.
+def get_mirrored_name(name):
+    split = name.index(pieces.King.PIECE_TYPE, 1)
+    return name[split:] + name[:split]
+
+
+# Returns the usual name of a material set: the side with more pieces, or
+# the stronger pieces, as white.
+def get_canonical_name(name):
+    mirrored_name = get_mirrored_name(name)
+    strength = [PIECE_ORDER.index(piece_type) for piece_type in name]
+    mirrored_strength = [PIECE_ORDER.index(piece_type) for piece_type in mirrored_name]
+    if (mirrored_name.index("K", 1) > name.index("K", 1)):
+        return mirrored_name
+    if (mirrored_name.index("K", 1) == name.index("K", 1) and mirrored_strength < strength):
+        return mirrored_name
+    return name
+
+
+# Returns the material sets a set converts into by a capture or a
+# promotion, not counting the bare kings.
+def get_subsets(name):
+    subsets = set()
+    material = get_pieces(name)
+    for (index, (color, piece_type)) in enumerate(material):
+        if (piece_type == pieces.King.PIECE_TYPE):
+            continue
+        rest = material[:index] + material[index+1:]
+        subsets.add(get_canonical_name(get_key(rest, [0] * len(rest), WHITE)[0]))
+        if (piece_type == pieces.Pawn.PIECE_TYPE):
+            promoted = material[:index] + [(color, pieces.Queen.PIECE_TYPE)] + material[index+1:]
+            subsets.add(get_canonical_name(get_key(promoted, [0] * len(promoted), WHITE)[0]))
+    subsets.discard("KK")
+    return subsets
+
+
+def get_other_color(color):
+    if (color == WHITE):
+        return BLACK
+    return WHITE
+
+
+# Flips a square to the other side of the board.
+def mirror(sq):
+    return (7 - sq // 8) * 8 + sq % 8
+
+
+def get_index(squares, turn):
+    index = 0
+    if (turn == BLACK):
+        index = 1
+    for sq in squares:
+        index = index * 64 + sq
+    return index
+
+
+# Returns (name, index) of a position given as the (color, piece_type) and
+# square of every piece, sorted into the order of the name. With tables, a
+# name that is not among them is looked up with the colors reversed.
+def get_key(material, squares, turn, tables=None):
+    white = sorted((PIECE_ORDER.index(piece_type), sq) for ((color, piece_type), sq) in zip(material, squares) if color == WHITE)
+    black = sorted((PIECE_ORDER.index(piece_type), sq) for ((color, piece_type), sq) in zip(material, squares) if color == BLACK)
+    name = "".join(PIECE_ORDER[order] for (order, sq) in white + black)
+    if (tables is not None and name not in tables):
+        mirrored_name = get_mirrored_name(name)
+        if (mirrored_name in tables):
+            black_first = [mirror(sq) for (order, sq) in black + white]
+            return (mirrored_name, get_index(black_first, get_other_color(turn)))
+
+    return (name, get_index([sq for (order, sq) in white + black], turn))
+
+
+# Returns the squares attacked by a piece on sq with the given occupancy.
+def get_attacks(color, piece_type, sq, occupied):
+    if (piece_type == pieces.King.PIECE_TYPE):
+        return bitboard.KING_ATTACKS[sq]
+    if (piece_type == pieces.Knight.PIECE_TYPE):
+        return bitboard.KNIGHT_ATTACKS[sq]
+    if (piece_type == pieces.Pawn.PIECE_TYPE):
+        return bitboard.PAWN_ATTACKS[color][sq]
+    if (piece_type == pieces.Bishop.PIECE_TYPE):
+        return bitboard.get_bishop_attacks(sq, occupied)
+    if (piece_type == pieces.Rook.PIECE_TYPE):
+        return bitboard.get_rook_attacks(sq, occupied)
+    return bitboard.get_bishop_attacks(sq, occupied) | bitboard.get_rook_attacks(sq, occupied)
+
+
+# Returns true iff a piece of by_color attacks sq. Pieces whose square is
+# None have been captured.
+def is_attacked(sq, by_color, material, squares, occupied):
+    for ((color, piece_type), piece_sq) in zip(material, squares):
+        if (color == by_color and piece_sq is not None):
+            if (get_attacks(color, piece_type, piece_sq, occupied) & (1 << sq)):
+                return True
+    return False
+
+
+def get_king_square(material, squares, color):
+    for ((piece_color, piece_type), sq) in zip(material, squares):
+        if (piece_color == color and piece_type == pieces.King.PIECE_TYPE):
+            return sq
+
+
+def get_occupancy(squares):
+    occupied = 0
+    for sq in squares:
+        if (sq is not None):
+            occupied |= 1 << sq
+    return occupied
+
+
+# Returns true iff the squares are distinct, no pawn stands on a first or
+# last row and the side that just moved is not left in check.
+def is_legal_position(material, squares, turn):
+    if (len(set(squares)) != len(squares)):
+        return False
+    for ((color, piece_type), sq) in zip(material, squares):
+        if (piece_type == pieces.Pawn.PIECE_TYPE and sq // 8 in (0, 7)):
+            return False
+
+    other_color = get_other_color(turn)
+    king = get_king_square(material, squares, other_color)
+    return not is_attacked(king, turn, material, squares, get_occupancy(squares))
+
+
+# Yields (material, squares) after every legal move of turn. The material
+# only changes, and captured pieces are only removed, on a capture or a
+# promotion.
+def generate_moves(material, squares, turn):
+    occupied = get_occupancy(squares)
+    own = 0
+    for ((color, piece_type), sq) in zip(material, squares):
+        if (color == turn):
+            own |= 1 << sq
+    other_color = get_other_color(turn)
+
+    for (index, ((color, piece_type), sq)) in enumerate(zip(material, squares)):
+        if (color != turn):
+            continue
+
+        if (piece_type == pieces.Pawn.PIECE_TYPE):
+            targets = bitboard.PAWN_ATTACKS[color][sq] & occupied & ~own
+            step = PAWN_STEPS[color]
+            if (not occupied & (1 << (sq + step))):
+                targets |= 1 << (sq + step)
+                if (sq // 8 == START_ROWS[color] and not occupied & (1 << (sq + 2*step))):
+                    targets |= 1 << (sq + 2*step)
+        else:
+            targets = get_attacks(color, piece_type, sq, occupied) & ~own
+
+        for target in bitboard.get_squares(targets):
+            new_material = list(material)
+            new_squares = list(squares)
+            captured = None
+            if (occupied & (1 << target)):
+                captured = squares.index(target)
+            new_squares[index] = target
+            if (piece_type == pieces.Pawn.PIECE_TYPE and target // 8 == PROMOTION_ROWS[color]):
+                new_material[index] = (color, pieces.Queen.PIECE_TYPE)
+
+            if (captured is not None):
+                new_squares[captured] = None
+            king = get_king_square(new_material, new_squares, turn)
+            if (is_attacked(king, other_color, new_material, new_squares, get_occupancy(new_squares))):
+                continue
+
+            if (captured is not None):
+                del new_material[captured]
+                del new_squares[captured]
+            yield (new_material, new_squares)
+
+
+# Yields the squares lists of the positions of the same material set with
+# the other side to move that lead to the given one by a move that is not a
+# capture or a promotion. Legality of the results is left to the caller.
+def generate_unmoves(material, squares, turn):
+    other_color = get_other_color(turn)
+    occupied = get_occupancy(squares)
+    for (index, ((color, piece_type), sq)) in enumerate(zip(material, squares)):
+        if (color != other_color):
+            continue
+
+        if (piece_type == pieces.Pawn.PIECE_TYPE):
+            step = PAWN_STEPS[color]
+            origins = []
+            previous = sq - step
+            if (0 <= previous < 64 and previous // 8 not in (0, 7) and not occupied & (1 << previous)):
+                origins.append(previous)
+                start = previous - step
+                if (start // 8 == START_ROWS[color] and not occupied & (1 << start)):
+                    origins.append(start)
+        else:
+            # Pieces other than pawns move the same way in both directions.
+            origins = bitboard.get_squares(get_attacks(color, piece_type, sq, occupied) & ~occupied)
+
+        for origin in origins:
+            new_squares = list(squares)
+            new_squares[index] = origin
+            yield new_squares
+
+
+# Converts the value of a position after a move into the value of the
+# position before it, for the side that moved.
+def get_parent_value(value):
+    if (value < 0):
+        return -value
+    if (value > 0):
+        return -value - 2
+    return 0
+
+
+# Plies until the game ends with the given value.
+def get_distance(value):
+    if (value < 0):
+        return -value - 1
+    return value
+
+
+# Builds the table of a material set. tables must hold the tables of every
+# set it converts into, see get_subsets. Returns an array of signed bytes.
+def build_table(name, tables):
+    material = get_pieces(name)
+    count = len(material)
+    size = 2 * 64 ** count
+    values = array("b", [ILLEGAL]) * size
+    # Moves left that stay in the material set and have not been found to lose.
+    moves_left = array("B", bytes(size))
+    # The best value for a loss found through conversions: the most negative
+    # one, since that is the slowest loss.
+    loss_floors = array("b", bytes(size))
+    # 1 if a conversion draws, 2 if a conversion wins.
+    escapes = bytearray(size)
+    # pending[distance] lists the (index, value) resolved at that distance.
+    pending = {}
+
+    for turn in (WHITE, BLACK):
+        for squares in itertools.product(range(64), repeat=count):
+            if (not is_legal_position(material, squares, turn)):
+                continue
+
+            index = get_index(squares, turn)
+            values[index] = 0
+            moves = 0
+            best_win = None
+            loss_floor = 0
+            for (new_material, new_squares) in generate_moves(material, squares, turn):
+                moves += 1
+                if (len(new_material) == count and new_material == material):
+                    moves_left[index] += 1
+                    continue
+
+                value = get_parent_value(lookup(new_material, new_squares, get_other_color(turn), tables))
+                if (value > 0):
+                    if (best_win is None or value < best_win):
+                        best_win = value
+                elif (value == 0):
+                    escapes[index] = max(escapes[index], 1)
+                else:
+                    loss_floor = min(loss_floor, value)
+
+            if (moves == 0):
+                king = get_king_square(material, squares, turn)
+                if (is_attacked(king, get_other_color(turn), material, squares, get_occupancy(squares))):
+                    pending.setdefault(0, []).append((index, -1))
+                # Otherwise stalemate, which stays a draw.
+            elif (best_win is not None):
+                escapes[index] = 2
+                pending.setdefault(best_win, []).append((index, best_win))
+            elif (moves_left[index] == 0):
+                if (escapes[index] == 0):
+                    pending.setdefault(get_distance(loss_floor), []).append((index, loss_floor))
+            else:
+                loss_floors[index] = loss_floor
+
+    # Resolve the positions in order of their distance to mate, so the first
+    # value found for a position is the fastest win or the slowest loss.
+    distance = 0
+    while (pending):
+        for (index, value) in pending.pop(distance, []):
+            if (values[index] != 0):
+                continue
+            values[index] = value
+
+            turn = WHITE
+            if (index >= size // 2):
+                turn = BLACK
+            squares = get_squares(index, count)
+            parent_turn = get_other_color(turn)
+            for parent_squares in generate_unmoves(material, squares, turn):
+                parent = get_index(parent_squares, parent_turn)
+                if (values[parent] != 0):
+                    # Already resolved, or illegal.
+                    continue
+
+                if (value < 0):
+                    pending.setdefault(distance + 1, []).append((parent, distance + 1))
+                    continue
+
+                moves_left[parent] -= 1
+                if (moves_left[parent] == 0 and escapes[parent] == 0):
+                    loss = min(get_parent_value(value), loss_floors[parent])
+                    pending.setdefault(get_distance(loss), []).append((parent, loss))
+        distance += 1
+        if (distance > 127):
+            raise ValueError("Distance to mate does not fit the table: " + name)
+
+    return values
+
+
+def get_squares(index, count):
+    squares = []
+    for i in range(count):
+        squares.append(index % 64)
+        index //= 64
+    squares.reverse()
+    return squares
+
+
+# Returns the value of a position from the given tables. The bare kings are
+# always a draw. Raises KeyError if the material set is not in the tables.
+def lookup(material, squares, turn, tables):
+    if (len(material) == 2):
+        return 0
+    (name, index) = get_key(material, squares, turn, tables)
+    value = tables[name][index]
+    if (value > 127):
+        # Signed byte read from a memory map.
+        value -= 256
+    return value
+
+
+# Builds the given material sets and every set they convert into, and
+# writes them to one tablebase file.
+def build(names, path, log=None):
+    tables = {}
+
+    def build_with_subsets(name):
+        if (name in tables):
+            return
+        for subset in sorted(get_subsets(name)):
+            build_with_subsets(subset)
+        if (log is not None):
+            log("Building " + name)
+        tables[name] = build_table(name, tables)
+
+    for name in names:
+        build_with_subsets(name)
+
+    with open(path, "wb") as output:
+        output.write(HEADER.pack(MAGIC, len(tables)))
+        offset = HEADER.size + INDEX_ENTRY.size * len(tables)
+        for (name, values) in tables.items():
+            output.write(INDEX_ENTRY.pack(name.encode(), offset, len(values)))
+            offset += len(values)
+        for values in tables.values():
+            values.tofile(output)
+
+
+class Tablebases:
+
+    # Maps a tablebase file written by build into memory. Processes probing
+    # the same file share its pages.
+    def __init__(self, path):
+        with open(path, "rb") as tablebase_file:
+            self.data = mmap.mmap(tablebase_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, count) = HEADER.unpack_from(self.data, 0)
+        if (magic != MAGIC):
+            raise ValueError("Invalid tablebase file: " + path)
+
+        # tables[name] is a memoryview of the table in the file.
+        self.tables = {}
+        for i in range(count):
+            (name, offset, size) = INDEX_ENTRY.unpack_from(self.data, HEADER.size + i * INDEX_ENTRY.size)
+            self.tables[name.rstrip(b"\0").decode()] = memoryview(self.data)[offset:offset + size]
+        # Boards with more pieces than this are never probed.
+        self.max_pieces = max([len(name) for name in self.tables], default=2)
+
+    def close(self):
+        self.tables = {}
+        self.data.close()
+
+    # Returns the value of the position for the color to move, see the top of
+    # this file, or None if the position is not covered. Positions where a
+    # side may still castle are not covered.
+    def probe(self, chessboard):
+        if (chessboard.piece_count > self.max_pieces):
+            return None
+        if (not chessboard.white_king_moved and chessboard.get_castling_rights(WHITE, 7) != ""):
+            return None
+        if (not chessboard.black_king_moved and chessboard.get_castling_rights(BLACK, 0) != ""):
+            return None
+
+        material = []
+        squares = []
+        for (sq, piece) in enumerate(chessboard.squares):
+            if (piece != 0):
+                material.append((piece.color, piece.piece_type))
+                squares.append(sq)
+
+        try:
+            value = lookup(material, squares, chessboard.turn, self.tables)
+        except KeyError:
+            return None
+        if (value == ILLEGAL):
+            return None
+        return value
+
+    # Returns the move that keeps the best value for the color to move: the
+    # fastest win, a draw, or the slowest loss. Returns 0 if the position or
+    # any position after a legal move is not covered.
+    def get_best_move(self, chessboard):
+        if (self.probe(chessboard) is None):
+            return 0
+
+        best_move = 0
+        best_rank = None
+        for move in chessboard.get_legal_moves(chessboard.turn):
+            undo = chessboard.make_move(move)
+            value = self.probe(chessboard)
+            chessboard.unmake_move(undo)
+            if (value is None):
+                return 0
+
+            rank = get_rank(get_parent_value(value))
+            if (best_rank is None or rank > best_rank):
+                best_rank = rank
+                best_move = move
+        return best_move
+
+
+# Orders values from the best to the worst for the side to move: faster wins
+# first, then draws, then slower losses.
+def get_rank(value):
+    if (value > 0):
+        return 256 - value
+    if (value < 0):
+        return -256 - value
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Builds endgame tablebases by retrograde analysis.")
+    parser.add_argument("sets", nargs="*", default=DEFAULT_SETS, help="material sets like KQK or KRKP, up to 4 pieces (default: " + " ".join(DEFAULT_SETS) + ")")
+    parser.add_argument("--output", default="tablebases.bin", help="file to write (default: tablebases.bin)")
+    args = parser.parse_args()
+
+    for name in args.sets:
+        if (not 3 <= len(name) <= 4 or name[0] != "K" or name.count("K") != 2 or any(char not in PIECE_ORDER for char in name)):
+            raise SystemExit("Invalid material set: " + name)
+
+    build([get_canonical_name(get_key(get_pieces(name), [0] * len(name), WHITE)[0]) for name in args.sets], args.output, print)
+
+
+if __name__ == "__main__":
+    main()
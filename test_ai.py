@@ -0,0 +1,68 @@
+import pytest
+import ai, bitboard
+from test_board import get_random_positions
+
+# Checks the evaluation and the search. Run with: python -m pytest
+
+
+def test_evaluate_batch_matches_evaluate():
+    positions = get_random_positions(bitboard.BitBoard)
+    scores = ai.Heuristics.evaluate_batch(ai.Heuristics.get_planes_batch(positions))
+    assert list(scores) == [ai.Heuristics.evaluate(chessboard) for chessboard in positions]
+
+
+# A finished game is scored at depth 0 without searching, whatever the limits.
+@pytest.mark.parametrize("fen, score", [
+    ("7k/6Q1/6K1/8/8/8/8/8 b - - 0 1", ai.AI.CHECKMATE),
+    ("8/8/8/8/8/5k2/8/5K1q w - - 0 1", -ai.AI.CHECKMATE),
+    ("7k/5Q2/6K1/8/8/8/8/8 b - - 0 1", 0)
+])
+def test_search_of_a_finished_game(fen, score):
+    for (time_ms, max_depth) in [(None, 3), (1000, None)]:
+        assert ai.AI.search(bitboard.BitBoard.from_fen(fen), time_ms, max_depth) == (0, score, 0)
+        assert ai.AI.nodes == 0
+
+
+@pytest.fixture
+def fresh_search():
+    ai.AI.transposition_table.clear()
+    ai.AI.history = {}
+    yield
+    if (ai.AI.process_pool is not None):
+        ai.AI.process_pool.shutdown()
+        ai.AI.process_pool = None
+
+
+# The serial and the parallel search break ties between equal scores by
+# root order, so the root order must not depend on killers and history,
+# which build up in the workers in a parallel search.
+def test_root_order_ignores_killers_and_history(fresh_search):
+    chessboard = bitboard.BitBoard.from_fen("r1bqk1nr/pppp1ppp/2n5/2b1p3/2BPP3/5N2/PPP2PPP/RNBQK2R b KQkq - 0 4")
+    moves = chessboard.get_legal_moves(chessboard.turn)
+    order = ai.AI.order_root_moves(chessboard, moves, moves[-1])
+    assert order[0] == moves[-1]
+    quiet_moves = [move for move in moves[:-1] if chessboard.squares[move.sqto] == 0]
+    assert order[-len(quiet_moves):] == quiet_moves
+
+    for (index, move) in enumerate(moves):
+        ai.AI.history[(chessboard.turn, move.code)] = index * 1000
+    ai.AI.killer_moves = [list(reversed(moves))]
+    assert ai.AI.order_root_moves(chessboard, moves, moves[-1]) == order
+
+    ai.AI.search(chessboard, None, 4)
+    assert ai.AI.order_root_moves(chessboard, moves, moves[-1]) == order
+
+
+# Mates have exact scores whatever the search state, so both searches must
+# agree on them.
+@pytest.mark.parametrize("fen", [
+    "kbK5/pp6/1P6/8/8/8/8/R7 w - - 0 1",
+    "6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1",
+    "r1bqkbnr/pppp1ppp/2n5/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 0 1"
+])
+def test_parallel_search_finds_the_serial_mate(fresh_search, fen):
+    for depth in (3, 4):
+        serial = ai.AI.search(bitboard.BitBoard.from_fen(fen), None, depth)
+        parallel = ai.AI.search(bitboard.BitBoard.from_fen(fen), None, depth, 4)
+        assert parallel == serial
+        assert abs(serial[1]) >= ai.AI.CHECKMATE
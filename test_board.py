@@ -0,0 +1,123 @@
+import random
+import pytest
+import ai, bitboard, perft
+from zobrist import Zobrist
+
+# Checks the move generators and the state the boards keep up to date on
+# every move against computations from scratch. Run with: python -m pytest
+
+BACKENDS = sorted(bitboard.BACKENDS)
+
+# Perft counts up to this many leaf nodes are checked, to keep the run short.
+MAX_PERFT_NODES = 10000
+
+
+# Plays random legal moves from the given position and yields the board after
+# every move.
+def play_random_game(board_class, fen, plies, seed):
+    rng = random.Random(seed)
+    chessboard = board_class.from_fen(fen)
+    for ply in range(plies):
+        moves = chessboard.get_legal_moves(chessboard.turn)
+        if (not moves):
+            return
+        chessboard.make_move(rng.choice(moves))
+        yield chessboard
+
+
+# Builds the position of the given board from scratch as a board_class.
+def rebuild(chessboard, board_class):
+    return board_class(list(chessboard.squares), chessboard.white_king_moved, chessboard.black_king_moved,
+        chessboard.turn, chessboard.halfmove_clock, chessboard.fullmove_number)
+
+
+def get_state(chessboard):
+    return dict(vars(chessboard), squares=list(chessboard.squares), king_positions=dict(chessboard.king_positions))
+
+
+def get_random_positions(board_class, games=6, plies=60):
+    positions = []
+    for (index, (name, fen, expected)) in enumerate(perft.POSITIONS):
+        for game in range(games):
+            for chessboard in play_random_game(board_class, fen, plies, index * 100 + game):
+                positions.append(board_class.clone(chessboard))
+    return positions
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("name, fen, expected", perft.POSITIONS)
+def test_perft(backend, name, fen, expected):
+    for (depth, nodes) in enumerate(expected, 1):
+        if (nodes <= MAX_PERFT_NODES):
+            assert perft.perft(bitboard.BACKENDS[backend].from_fen(fen), depth) == nodes
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_make_unmake_keeps_state(backend):
+    for chessboard in get_random_positions(bitboard.BACKENDS[backend], games=2, plies=40):
+        before = get_state(chessboard)
+        for move in chessboard.get_legal_moves(chessboard.turn):
+            undo = chessboard.make_move(move)
+            assert chessboard.hash == Zobrist.get_hash(chessboard)
+            assert chessboard.pawn_hash == Zobrist.get_pawn_hash(chessboard)
+            assert chessboard.material_score == ai.Heuristics.get_material_score(chessboard)
+            assert chessboard.position_score == ai.Heuristics.get_position_score(chessboard)
+            chessboard.unmake_move(undo)
+            assert get_state(chessboard) == before
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_legal_moves_do_not_leave_the_king_in_check(backend):
+    for chessboard in get_random_positions(bitboard.BACKENDS[backend]):
+        color = chessboard.turn
+        other_color = bitboard.get_other_color(color)
+        expected = set()
+        for move in chessboard.get_possible_moves(color):
+            if (move.is_castle()):
+                # No castling out of or through check.
+                if (chessboard.is_check(color) or chessboard.is_square_attacked((move.xfrom + move.xto) // 2, move.yfrom, other_color)):
+                    continue
+            undo = chessboard.make_move(move)
+            if (not chessboard.is_check(color)):
+                expected.add(move)
+            chessboard.unmake_move(undo)
+
+        legal_moves = chessboard.get_legal_moves(color)
+        assert len(legal_moves) == len(set(legal_moves))
+        assert set(legal_moves) == expected
+
+
+def test_backends_agree():
+    positions = get_random_positions(bitboard.BACKENDS["board"], games=3)
+    for chessboard in positions:
+        other = rebuild(chessboard, bitboard.BitBoard)
+        assert set(other.get_legal_moves(other.turn)) == set(chessboard.get_legal_moves(chessboard.turn))
+        for move in chessboard.generate_captures(chessboard.turn):
+            assert other.get_exchange_score(move) == chessboard.get_exchange_score(move)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_clone_matches_a_new_board(backend):
+    board_class = bitboard.BACKENDS[backend]
+    for chessboard in get_random_positions(board_class, games=1):
+        clone = board_class.clone(chessboard)
+        assert type(clone) is board_class
+        assert get_state(clone) == get_state(rebuild(chessboard, board_class))
+
+
+def test_bitboards_follow_the_squares():
+    for chessboard in get_random_positions(bitboard.BitBoard, games=2):
+        expected = rebuild(chessboard, bitboard.BitBoard)
+        assert chessboard.bitboards == expected.bitboards
+        assert chessboard.occupancy == expected.occupancy
+
+
+@pytest.mark.parametrize("fen", [
+    "8/8/8/8/8/8/8/8 w - - 0 1",
+    "7k/8/8/8/8/8/8/8 w - - 0 1",
+    "7k/8/8/8/8/8/8/K6K w - - 0 1",
+    "kk6/8/8/8/8/8/8/K7 b - - 0 1"
+])
+def test_from_fen_needs_one_king_per_side(fen):
+    with pytest.raises(ValueError):
+        bitboard.BitBoard.from_fen(fen)
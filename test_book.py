@@ -0,0 +1,75 @@
+import ai, bitboard, book
+
+# Checks building an opening book from game logs and PGN, and reading it.
+
+LOG = [
+    "e2e4 e7e5 g1f3 1-0",
+    "e2e4 c7c5 0-1",
+    "d2d4 d7d5 1/2-1/2",
+    "# a comment",
+    "e2e4 e7e5 g1f3 b8c6"
+]
+
+PGN = [
+    "[Event \"Test\"]",
+    "[Result \"1-0\"]",
+    "",
+    "1. e4 e5 2. Nf3 Nc6 1-0",
+    ""
+]
+
+
+def test_build_and_read_a_book(tmp_path):
+    path = str(tmp_path / "book.bin")
+    # e2e4, e7e5 and c7c5 at the first two plies, g1f3 and b8c6 after them.
+    assert book.build_book(book.read_log_games(LOG), path, max_ply=4) == 7
+
+    opening_book = book.OpeningBook(path, book.OpeningBook.BEST)
+    try:
+        chessboard = bitboard.BitBoard.new()
+        # e2e4 scored 2 + 0 + 1 against 1 for d2d4.
+        assert opening_book.get_move(chessboard).to_uci() == "e2e4"
+        assert sorted(weight for (code, weight) in opening_book.get_entries(chessboard.hash)) == [1, 3]
+
+        chessboard.make_move(chessboard.parse_uci_move("e2e4"))
+        # Black won with c7c5 and lost with e7e5 once.
+        assert opening_book.get_move(chessboard).to_uci() == "c7c5"
+
+        chessboard.make_move(chessboard.parse_uci_move("h7h6"))
+        assert opening_book.get_move(chessboard) == 0
+    finally:
+        opening_book.close()
+
+
+def test_pgn_games_and_weighted_moves(tmp_path):
+    path = str(tmp_path / "book.bin")
+    assert book.build_book(book.read_pgn_games(PGN), path) == 4
+
+    opening_book = book.OpeningBook(path, seed=1)
+    try:
+        chessboard = bitboard.BitBoard.new()
+        for text in ["e2e4", "e7e5", "g1f3", "b8c6"]:
+            assert opening_book.get_move(chessboard).to_uci() == text
+            chessboard.make_move(chessboard.parse_uci_move(text))
+    finally:
+        opening_book.close()
+
+
+def test_get_ai_move_plays_book_moves(tmp_path):
+    path = str(tmp_path / "book.bin")
+    book.build_book(book.read_log_games(["a2a3 1-0"]), path)
+
+    ai.AI.opening_book = book.OpeningBook(path)
+    try:
+        assert ai.AI.get_ai_move(bitboard.BitBoard.new()).to_uci() == "a2a3"
+    finally:
+        ai.AI.opening_book.close()
+        ai.AI.opening_book = None
+
+
+def test_empty_book(tmp_path):
+    path = tmp_path / "book.bin"
+    path.write_bytes(b"")
+    opening_book = book.OpeningBook(str(path))
+    assert opening_book.get_move(bitboard.BitBoard.new()) == 0
+    opening_book.close()
@@ -0,0 +1,26 @@
+import ai, bitboard
+from pawnhash import PawnHashTable
+from test_board import get_random_positions
+
+# Checks the pawn hash table and the pawn scores read through it.
+
+
+def test_probe_and_store():
+    table = PawnHashTable(1)
+    assert table.probe(5) is None
+    table.store(5, -40)
+    assert table.probe(5) == -40
+    # A key for the same slot replaces the entry.
+    table.store(5 + table.size, 12)
+    assert table.probe(5) is None
+    assert table.probe(5 + table.size) == 12
+    table.clear()
+    assert table.probe(5 + table.size) is None
+
+
+# Positions sharing a pawn structure share the cached score, so it must be
+# the score of every one of them.
+def test_cached_pawn_scores_match_the_structure():
+    ai.Heuristics.pawn_table.clear()
+    for chessboard in get_random_positions(bitboard.BitBoard):
+        assert ai.Heuristics.get_pawn_score(chessboard) == ai.Heuristics.get_pawn_structure_score(chessboard)
@@ -0,0 +1,64 @@
+import bitboard, pgn, pieces, selfplay
+from test_board import get_random_positions
+
+# Checks SAN conversion, reading and writing PGN, and the self-play games.
+
+
+def test_san_round_trip():
+    for chessboard in get_random_positions(bitboard.BitBoard, games=2):
+        for move in chessboard.get_legal_moves(chessboard.turn):
+            assert pgn.parse_san(chessboard, pgn.to_san(chessboard, move)) == move
+
+
+def test_to_san():
+    chessboard = bitboard.BitBoard.from_fen("r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1")
+    assert pgn.to_san(chessboard, chessboard.parse_uci_move("e1g1")) == "O-O"
+    assert pgn.to_san(chessboard, chessboard.parse_uci_move("e1c1")) == "O-O-O"
+    assert pgn.to_san(chessboard, chessboard.parse_uci_move("a1a8")) == "Rxa8+"
+
+    # Two rooks reach the square: the file tells them apart, or else the rank.
+    chessboard = bitboard.BitBoard.from_fen("4k3/R7/8/8/8/8/4K3/R6R w - - 0 1")
+    assert pgn.to_san(chessboard, chessboard.parse_uci_move("a1d1")) == "Rad1"
+    assert pgn.to_san(chessboard, chessboard.parse_uci_move("a1a4")) == "R1a4"
+
+    chessboard = bitboard.BitBoard.from_fen("7k/5Q2/6K1/8/8/8/8/8 w - - 0 1")
+    assert pgn.to_san(chessboard, chessboard.parse_uci_move("f7g7")) == "Qg7#"
+
+    chessboard = bitboard.BitBoard.from_fen("8/1P5k/8/8/8/8/8/K7 w - - 0 1")
+    assert pgn.to_san(chessboard, chessboard.parse_uci_move("b7b8q")) == "b8=Q"
+
+
+def test_read_games():
+    lines = [
+        '[Event "First"]',
+        '[Result "1-0"]',
+        "",
+        "1. e4 {best by test} e5 (1... c5 2. Nf3) 2. Nf3 $1 Nc6",
+        "3. Bb5 1-0",
+        '[Event "Second"]',
+        "1. d4 d5 *"
+    ]
+    games = list(pgn.read_games(lines))
+    assert games == [
+        ({"Event": "First", "Result": "1-0"}, ["e4", "e5", "Nf3", "Nc6", "Bb5"]),
+        ({"Event": "Second"}, ["d4", "d5"])
+    ]
+
+
+def test_format_game_reads_back():
+    moves = ["e4", "e5", "Nf3", "Nc6"] * 20
+    text = pgn.format_game({"Event": 'A "quoted" event', "Result": "*"}, moves, "*")
+    assert all(len(line) <= pgn.LINE_LENGTH for line in text.splitlines())
+    assert list(pgn.read_games(text.splitlines())) == [({"Event": "A 'quoted' event", "Result": "*"}, moves)]
+
+
+def test_self_play_game_is_valid_pgn():
+    settings = {pieces.Piece.WHITE: (None, 1), pieces.Piece.BLACK: (None, 2)}
+    (text, stats) = selfplay.play_game(1, settings, 4, 30, 0, "bitboard")
+    [(headers, moves)] = list(pgn.read_games(text.splitlines()))
+    assert headers["Result"] == stats["result"]
+    assert int(headers["PlyCount"]) == stats["plies"] == len(moves)
+
+    chessboard = bitboard.BitBoard.new()
+    for san in moves:
+        chessboard.make_move(pgn.parse_san(chessboard, san))
@@ -0,0 +1,107 @@
+import asyncio, json
+import pytest
+import ai, bitboard, server
+
+# Sends requests to a game server with one search worker and checks the
+# responses, over handle_request and over a real HTTP connection.
+
+MATED_FEN = "8/8/8/8/8/5k2/8/5K1q w - - 0 1"
+
+
+@pytest.fixture
+def game_server():
+    game_server = server.GameServer(bitboard.BitBoard, 1, 4, 1000)
+    yield game_server
+    game_server.close()
+
+
+def handle(game_server, *requests):
+    async def handle_all():
+        return [await game_server.handle_request(request) for request in requests]
+    return asyncio.run(handle_all())
+
+
+def test_play_a_move_and_the_reply(game_server):
+    [new, played] = handle(game_server, {"command": "new"}, {"command": "move", "game": 1, "move": "e2e4", "depth": 1})
+    assert new["game"] == 1 and new["status"] == "playing"
+    assert played["moves"] == ["e2e4", played["ai_move"]]
+    assert played["depth"] == 1
+    assert game_server.get_stats()["searches"] == 1
+
+
+@pytest.mark.parametrize("request_fields", [
+    {"command": "new", "fen": 5},
+    {"command": "new", "fen": ["8/8/8/8/8/8/8/8 w - - 0 1"]},
+    {"command": "new", "fen": "8/8/8/8/8/8/8/8 w - - 0 1"},
+    {"command": "new", "fen": "not a fen"},
+    {"command": "think", "game": 1, "depth": None},
+    {"command": "think", "game": 1, "depth": 0},
+    {"command": "think", "game": 1, "depth": [3]},
+    {"command": "think", "game": 1, "time_ms": {"ms": 5}},
+    {"command": "think", "game": 1, "time_ms": True},
+    {"command": "move", "game": 1, "move": "e2e4", "depth": "deep"},
+    {"command": "move", "game": 1, "move": "e2e5"},
+    {"command": "get", "game": 1e400},
+    {"command": "get", "game": 2},
+    {"command": "resign"},
+    ["not", "an", "object"]
+])
+def test_invalid_requests_change_nothing(game_server, request_fields):
+    [new, response, state] = handle(game_server, {"command": "new"}, request_fields, {"command": "get", "game": 1})
+    assert response["code"] == "invalid"
+    assert state == {"fen": new["fen"], "moves": [], "status": "playing"}
+    assert game_server.get_stats()["games"] == 1
+
+
+# The game is over: no AI move, and no move of the user either.
+def test_finished_game(game_server):
+    [new, thought, moved] = handle(game_server,
+        {"command": "new", "fen": MATED_FEN},
+        {"command": "think", "game": 1, "time_ms": 200},
+        {"command": "move", "game": 1, "move": "f1e2"}
+    )
+    assert new["status"] == "black wins"
+    assert thought == {"ai_move": None, "fen": MATED_FEN, "moves": [], "status": "black wins"}
+    assert moved["code"] == "invalid"
+
+
+def test_search_position_of_a_finished_game():
+    assert server.search_position(bitboard.BitBoard, MATED_FEN, 1000, None)[:4] == (None, -ai.AI.CHECKMATE, 0, 0)
+
+
+# Sends raw bytes to the HTTP server and returns (status line, JSON body).
+def send_http(game_server, data):
+    async def exchange():
+        http_server = await asyncio.start_server(game_server.handle_http, "127.0.0.1", 0)
+        port = http_server.sockets[0].getsockname()[1]
+        try:
+            (reader, writer) = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(data)
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+        finally:
+            http_server.close()
+        return response
+    (head, _, body) = asyncio.run(exchange()).partition(b"\r\n\r\n")
+    return (head.split(b"\r\n")[0].decode(), json.loads(body))
+
+
+def test_http(game_server):
+    (status, body) = send_http(game_server, b"POST /games HTTP/1.1\r\nContent-Length: 0\r\n\r\n")
+    assert status == "HTTP/1.1 200 OK" and body["game"] == 1
+
+    request = json.dumps({"move": "d2d4", "reply": False}).encode()
+    (status, body) = send_http(game_server, b"POST /games/1/move HTTP/1.1\r\nContent-Length: "
+        + str(len(request)).encode() + b"\r\n\r\n" + request)
+    assert status == "HTTP/1.1 200 OK" and body["moves"] == ["d2d4"]
+
+    (status, body) = send_http(game_server, b"GET /nowhere HTTP/1.1\r\n\r\n")
+    assert status == "HTTP/1.1 400 Bad Request"
+
+
+@pytest.mark.parametrize("content_length", [b"ten", b"-1", b""])
+def test_http_invalid_content_length(game_server, content_length):
+    (status, body) = send_http(game_server, b"POST /games HTTP/1.1\r\nContent-Length: " + content_length + b"\r\n\r\n{}")
+    assert status == "HTTP/1.1 400 Bad Request"
+    assert body["code"] == "invalid"
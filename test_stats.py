@@ -0,0 +1,34 @@
+import ai, bitboard
+from stats import SearchStats
+
+# Checks the search statistics and that disabling them restores the search.
+
+
+def test_search_stats():
+    chessboard = bitboard.BitBoard.new()
+    alphabeta = ai.AI.__dict__["alphabeta"]
+    reports = []
+    with SearchStats(reports.append) as stats:
+        (best_move, best_score, depth) = ai.AI.search(chessboard, max_depth=3)
+
+    assert ai.AI.__dict__["alphabeta"] is alphabeta
+    result = stats.to_dict()
+    assert depth == 3
+    assert [iteration["depth"] for iteration in result["iterations"]] == [1, 2, 3]
+    assert result["iterations"][-1]["best_move"] == best_move.to_uci()
+    assert result["iterations"][-1]["score"] == best_score
+    assert sum(iteration["nodes"] for iteration in result["iterations"]) == ai.AI.nodes
+    assert result["nodes"] == sum(result["nodes_per_ply"].values()) > 0
+    assert result["moves_made"] > 0 and result["evaluations"] > 0
+    assert 0 < result["tt_hits"] <= result["tt_probes"]
+    assert 0 <= result["first_move_cutoff_rate"] <= 1
+    # One report per completed iteration, the last one with the final stats.
+    assert len(reports) == 3
+    assert reports[-1] == result
+
+
+def test_stats_are_not_collected_once_disabled():
+    with SearchStats() as stats:
+        pass
+    ai.AI.search(bitboard.BitBoard.new(), max_depth=2)
+    assert stats.nodes == 0 and stats.iterations == []
@@ -0,0 +1,102 @@
+import random
+import pytest
+import ai, bitboard, pieces, tablebase
+
+# Builds the KQK table once (it takes a while) and checks probes against
+# known positions and against the values of the positions after every move.
+
+
+@pytest.fixture(scope="module")
+def tablebases(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("tablebases") / "kqk.bin")
+    tablebase.build(["KQK"], path)
+    tablebases = tablebase.Tablebases(path)
+    yield tablebases
+    tablebases.close()
+
+
+PIECES = [
+    pieces.get_piece(pieces.King.PIECE_TYPE, pieces.Piece.WHITE),
+    pieces.get_piece(pieces.Queen.PIECE_TYPE, pieces.Piece.WHITE),
+    pieces.get_piece(pieces.King.PIECE_TYPE, pieces.Piece.BLACK)
+]
+
+
+def probe(tablebases, fen):
+    return tablebases.probe(bitboard.BitBoard.from_fen(fen))
+
+
+def test_probe_known_positions(tablebases):
+    # Mate in one, checkmated and stalemated.
+    assert probe(tablebases, "7k/5Q2/6K1/8/8/8/8/8 w - - 0 1") == 1
+    assert probe(tablebases, "7k/6Q1/6K1/8/8/8/8/8 b - - 0 1") == -1
+    assert probe(tablebases, "7k/5Q2/6K1/8/8/8/8/8 b - - 0 1") == 0
+    # Black can take the undefended queen.
+    assert probe(tablebases, "7k/6Q1/8/8/8/8/8/K7 b - - 0 1") == 0
+    # The same positions with the colors reversed.
+    assert probe(tablebases, "8/8/8/8/8/6k1/5q2/7K b - - 0 1") == 1
+    assert probe(tablebases, "8/8/8/8/8/6k1/5q2/7K w - - 0 1") == 0
+
+
+def test_positions_not_covered(tablebases):
+    # More pieces than any table, a side that may castle, and an illegal
+    # position with the side not to move in check.
+    assert probe(tablebases, "7k/5Q2/6K1/8/8/8/P7/8 w - - 0 1") is None
+    assert probe(tablebases, "4k3/8/8/8/8/8/8/R3K3 w Q - 0 1") is None
+    assert probe(tablebases, "7k/6Q1/6K1/8/8/8/8/8 w - - 0 1") is None
+
+
+# Every value must be the best value reachable in one move.
+def test_values_agree_with_the_positions_after_every_move(tablebases):
+    rng = random.Random(1)
+    checked = 0
+    while (checked < 300):
+        squares = [0] * 64
+        for (sq, piece) in zip(rng.sample(range(64), 3), PIECES):
+            squares[sq] = piece
+        chessboard = bitboard.BitBoard(squares, True, True, rng.choice([pieces.Piece.WHITE, pieces.Piece.BLACK]))
+        value = tablebases.probe(chessboard)
+        if (value is None):
+            continue
+
+        best_rank = None
+        for move in chessboard.get_legal_moves(chessboard.turn):
+            undo = chessboard.make_move(move)
+            child = tablebases.probe(chessboard)
+            chessboard.unmake_move(undo)
+            rank = tablebase.get_rank(tablebase.get_parent_value(child))
+            best_rank = rank if best_rank is None else max(best_rank, rank)
+
+        if (best_rank is None):
+            assert value == (-1 if chessboard.is_check(chessboard.turn) else 0)
+        else:
+            assert tablebase.get_rank(value) == best_rank
+        checked += 1
+
+
+def test_best_move_mates(tablebases):
+    chessboard = bitboard.BitBoard.from_fen("7k/8/5K2/8/8/8/8/6Q1 w - - 0 1")
+    value = tablebases.probe(chessboard)
+    assert value > 0
+    # Both sides keep the value: the winner mates as fast as it can and the
+    # loser holds out as long as it can.
+    while (chessboard.get_legal_moves(chessboard.turn)):
+        chessboard.make_move(tablebases.get_best_move(chessboard))
+        next_value = tablebases.probe(chessboard)
+        assert tablebase.get_parent_value(next_value) == value
+        value = next_value
+    assert value == -1
+    assert chessboard.is_check(chessboard.turn)
+
+
+def test_search_prefers_tablebase_wins(tablebases):
+    ai.AI.tablebases = tablebases
+    try:
+        chessboard = bitboard.BitBoard.from_fen("7k/8/5K2/8/8/8/8/6Q1 w - - 0 1")
+        (best_move, best_score, depth) = ai.AI.search(chessboard, max_depth=2)
+        assert best_score > 0
+        undo = chessboard.make_move(best_move)
+        assert tablebases.probe(chessboard) < 0
+        chessboard.unmake_move(undo)
+    finally:
+        ai.AI.tablebases = None
@@ -0,0 +1,62 @@
+import pytest
+from move import Move
+from transposition import TranspositionTable
+
+# Checks storing, probing and replacing entries of the transposition table.
+
+MOVE = Move(4, 6, 4, 4)
+
+
+def test_probe_returns_the_stored_entry():
+    table = TranspositionTable(1)
+    table.store(12345, 3, TranspositionTable.LOWER, -250, MOVE)
+    assert table.probe(12345) == (3, TranspositionTable.LOWER, -250, MOVE)
+    assert table.probe(12346) is None
+
+
+def test_entry_without_a_move():
+    table = TranspositionTable(1)
+    table.store(7, 0, TranspositionTable.EXACT, 0, 0)
+    assert table.probe(7) == (0, TranspositionTable.EXACT, 0, 0)
+
+
+# Keys that map to the same slot replace each other.
+def test_colliding_key_is_not_mistaken_for_the_stored_one():
+    table = TranspositionTable(1)
+    table.store(1, 2, TranspositionTable.EXACT, 10, MOVE)
+    table.store(1 + table.size, 2, TranspositionTable.EXACT, 20, MOVE)
+    assert table.probe(1) is None
+    assert table.probe(1 + table.size) == (2, TranspositionTable.EXACT, 20, MOVE)
+
+
+def test_depth_preferred_keeps_deeper_entries_of_the_current_search():
+    table = TranspositionTable(1)
+    other_key = 1 + table.size
+    table.store(1, 5, TranspositionTable.EXACT, 10, MOVE)
+    table.store(other_key, 2, TranspositionTable.EXACT, 20, MOVE)
+    assert table.probe(1) == (5, TranspositionTable.EXACT, 10, MOVE)
+
+    # Entries of older searches are replaced.
+    table.new_search()
+    table.store(other_key, 2, TranspositionTable.EXACT, 20, MOVE)
+    assert table.probe(1) is None
+    assert table.probe(other_key) == (2, TranspositionTable.EXACT, 20, MOVE)
+
+
+def test_always_replace():
+    table = TranspositionTable(1, TranspositionTable.ALWAYS_REPLACE)
+    table.store(1, 5, TranspositionTable.EXACT, 10, MOVE)
+    table.store(1 + table.size, 2, TranspositionTable.UPPER, 20, MOVE)
+    assert table.probe(1 + table.size) == (2, TranspositionTable.UPPER, 20, MOVE)
+
+
+def test_clear():
+    table = TranspositionTable(1)
+    table.store(1, 5, TranspositionTable.EXACT, 10, MOVE)
+    table.clear()
+    assert table.probe(1) is None
+
+
+def test_invalid_replacement_policy():
+    with pytest.raises(ValueError):
+        TranspositionTable(1, "random")
@@ -0,0 +1,76 @@
+import io
+import pytest
+import bitboard, pieces, uci
+
+# Drives the UCI engine through its command handler and checks what it sends.
+
+
+def run(*lines):
+    output = io.StringIO()
+    engine = uci.UCIEngine(bitboard.BitBoard, output)
+    for line in lines:
+        engine.handle(line)
+    # Lets a search that is not waiting for stop finish, then stops the
+    # engine like a GUI at the end of input.
+    if (engine.thread is not None and engine.release.is_set()):
+        engine.thread.join()
+    engine.stop()
+    return output.getvalue().splitlines()
+
+
+def test_handshake():
+    output = run("uci", "isready")
+    assert output[0] == "id name " + uci.NAME
+    assert output[-2:] == ["uciok", "readyok"]
+
+
+def test_go_sends_info_and_a_legal_best_move():
+    output = run("position startpos moves e2e4 e7e5", "go depth 2")
+    assert [line.split()[2] for line in output if line.startswith("info depth")] == ["1", "2"]
+    (command, move, ponder, ponder_move) = output[-1].split()
+    assert (command, ponder) == ("bestmove", "ponder")
+
+    chessboard = bitboard.BitBoard.from_fen("rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2")
+    chessboard.make_move(chessboard.parse_uci_move(move))
+    chessboard.parse_uci_move(ponder_move)
+
+
+# Mate scores are in moves, from the point of view of the side to move.
+def test_mate_score():
+    output = run("position fen 7k/8/5K2/8/8/8/8/6Q1 w - - 0 1", "go depth 3")
+    assert [line.split()[4:6] for line in output[:-1]] == [["mate", "1"]] * 3
+    assert output[-1] == "bestmove g1g7"
+
+    output = run("position fen 6k1/8/5K2/8/8/8/8/7Q b - - 0 1", "go depth 3")
+    assert output[-2].split()[4:6] == ["mate", "-1"]
+
+
+# A finished game still gets a bestmove, or GUIs wait for it forever.
+@pytest.mark.parametrize("fen, score", [
+    ("8/8/8/8/8/5k2/8/5K1q w - - 0 1", "mate 0"),
+    ("7k/5Q2/6K1/8/8/8/8/8 b - - 0 1", "cp 0")
+])
+def test_go_without_legal_moves(fen, score):
+    assert run("position fen " + fen, "go depth 3") == ["info depth 0 score " + score, "bestmove 0000"]
+    assert run("position fen " + fen, "go infinite", "stop") == ["info depth 0 score " + score, "bestmove 0000"]
+
+
+def test_go_infinite_waits_for_stop():
+    output = run("position startpos", "go infinite", "isready", "stop")
+    assert "readyok" in output
+    assert output[-1].startswith("bestmove ")
+
+
+def test_invalid_position_keeps_the_old_one():
+    output = run("position fen 8/8/8/8/8/8/8/8 w - - 0 1", "position startpos moves e2e5", "go depth 1")
+    assert output[0].startswith("info string ")
+    assert output[1].startswith("info string ")
+    assert output[-1].startswith("bestmove ")
+
+
+def test_time_budget():
+    assert uci.get_time_budget({"movetime": 1000}, pieces.Piece.WHITE) == 1000 - uci.MOVE_OVERHEAD_MS
+    assert uci.get_time_budget({"wtime": 60000}, pieces.Piece.BLACK) is None
+    assert uci.get_time_budget({"btime": 30050, "movestogo": 10}, pieces.Piece.BLACK) == 3000
+    # Never more than half of the time left.
+    assert uci.get_time_budget({"wtime": 1050, "winc": 10000}, pieces.Piece.WHITE) == 500
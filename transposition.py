@@ -0,0 +1,77 @@
+from array import array
+from move import Move
+
+class TranspositionTable:
+
+    # Bound types of a stored score.
+    EXACT = 0
+    LOWER = 1 # The real score is at least the stored score.
+    UPPER = 2 # The real score is at most the stored score.
+
+    # Replacement policies.
+    DEPTH_PREFERRED = "depth"
+    ALWAYS_REPLACE = "always"
+
+    # Bytes per entry: key (8), score (4), best move (2), depth, bound and generation (1 each).
+    ENTRY_SIZE = 17
+
+    # Stores one entry per slot in flat, preallocated arrays so the table never
+    # grows past the requested memory cap. A key maps to slot key % size.
+    def __init__(self, size_mb=16, replacement=DEPTH_PREFERRED):
+        if (replacement not in (TranspositionTable.DEPTH_PREFERRED, TranspositionTable.ALWAYS_REPLACE)):
+            raise ValueError("Invalid replacement policy: " + str(replacement))
+
+        self.size_mb = size_mb
+        self.replacement = replacement
+        self.size = max(1, int(size_mb * 1024 * 1024) // TranspositionTable.ENTRY_SIZE)
+        self.keys = array("Q", bytes(8 * self.size))
+        self.scores = array("i", bytes(4 * self.size))
+        self.moves = array("H", bytes(2 * self.size))
+        self.depths = array("b", [-1]) * self.size # -1 marks an empty slot.
+        self.bounds = array("B", bytes(self.size))
+        self.generations = array("B", bytes(self.size))
+        self.generation = 0
+
+    def clear(self):
+        self.__init__(self.size_mb, self.replacement)
+
+    # Should be called once per search. Entries of older searches are replaced
+    # first by the depth-preferred policy.
+    def new_search(self):
+        self.generation = (self.generation + 1) % 256
+
+    # Returns (depth, bound, score, best_move) for the given key, or None if the
+    # position is not in the table. best_move is 0 if no move was stored.
+    def probe(self, key):
+        index = key % self.size
+        if (self.depths[index] < 0 or self.keys[index] != key):
+            return None
+
+        return (self.depths[index], self.bounds[index], self.scores[index], decode_move(self.moves[index]))
+
+    def store(self, key, depth, bound, score, best_move):
+        index = key % self.size
+        if (self.replacement == TranspositionTable.DEPTH_PREFERRED):
+            # Keep a deeper entry of the current search.
+            if (self.depths[index] > depth and self.generations[index] == self.generation):
+                return
+
+        self.keys[index] = key
+        self.depths[index] = depth
+        self.bounds[index] = bound
+        self.scores[index] = score
+        self.moves[index] = encode_move(best_move)
+        self.generations[index] = self.generation
+
+
+# A move code fits in 16 bits and is never 0, so 0 stands for no move.
+def encode_move(move):
+    if (move == 0):
+        return 0
+    return move.code
+
+
+def decode_move(code):
+    if (code == 0):
+        return 0
+    return Move.from_code(code)
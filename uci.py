@@ -0,0 +1,291 @@
+import argparse, sys, threading, time
+import ai, bitboard, book, pieces, tablebase
+from transposition import TranspositionTable
+
+# Speaks the Universal Chess Interface on stdin and stdout, so the engine
+# can be driven by chess GUIs and tournament tools. Commands are read on the
+# main thread while the search runs on its own thread, so stop, isready and
+# quit are answered during a search. The transposition table and the other
+# search state are kept between positions until ucinewgame.
+
+NAME = "Python Chess AI"
+AUTHOR = "Python Chess AI authors"
+
+# Moves the rest of the game is assumed to last when the GUI doesn't say.
+DEFAULT_MOVES_TO_GO = 30
+# Kept back from the clock for the time it takes to send a move.
+MOVE_OVERHEAD_MS = 50
+
+
+class UCIEngine:
+
+    def __init__(self, board_class, output=sys.stdout):
+        self.board_class = board_class
+        self.output = output
+        self.output_lock = threading.Lock()
+        self.chessboard = board_class.new()
+        self.workers = 1
+        self.thread = None
+        # Set once the search may send its best move: right away, or only
+        # after stop or ponderhit with go infinite and go ponder.
+        self.release = threading.Event()
+        # Time budget of a go ponder, started on ponderhit.
+        self.ponder_time_ms = None
+
+    def send(self, line):
+        with self.output_lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    # Handles one line of input. Returns false after quit.
+    def handle(self, line):
+        tokens = line.split()
+        if (not tokens):
+            return True
+
+        command = tokens[0]
+        if (command == "uci"):
+            self.send("id name " + NAME)
+            self.send("id author " + AUTHOR)
+            self.send("option name Hash type spin default " + str(ai.AI.transposition_table.size_mb) + " min 1 max 4096")
+            self.send("option name Threads type spin default 1 min 1 max 64")
+            self.send("option name BookFile type string default <empty>")
+            self.send("option name TablebaseFile type string default <empty>")
+            self.send("uciok")
+        elif (command == "isready"):
+            self.send("readyok")
+        elif (command == "setoption"):
+            self.stop()
+            self.set_option(tokens[1:])
+        elif (command == "ucinewgame"):
+            self.stop()
+            ai.AI.transposition_table.clear()
+            ai.AI.history = {}
+        elif (command == "position"):
+            self.stop()
+            self.set_position(tokens[1:])
+        elif (command == "go"):
+            self.stop()
+            self.go(tokens[1:])
+        elif (command == "stop"):
+            self.stop()
+        elif (command == "ponderhit"):
+            self.ponderhit()
+        elif (command == "quit"):
+            self.stop()
+            return False
+        return True
+
+    # Handles: setoption name <id> [value <x>]
+    def set_option(self, tokens):
+        if ("name" not in tokens):
+            return
+        value = None
+        if ("value" in tokens):
+            value = " ".join(tokens[tokens.index("value")+1:])
+            tokens = tokens[:tokens.index("value")]
+        name = " ".join(tokens[tokens.index("name")+1:]).lower()
+
+        try:
+            if (name == "hash"):
+                ai.AI.transposition_table = TranspositionTable(int(value))
+            elif (name == "threads"):
+                self.workers = max(1, int(value))
+            elif (name == "bookfile"):
+                if (ai.AI.opening_book is not None):
+                    ai.AI.opening_book.close()
+                ai.AI.opening_book = None
+                if (value not in (None, "", "<empty>")):
+                    ai.AI.opening_book = book.OpeningBook(value)
+            elif (name == "tablebasefile"):
+                if (ai.AI.tablebases is not None):
+                    ai.AI.tablebases.close()
+                ai.AI.tablebases = None
+                if (value not in (None, "", "<empty>")):
+                    ai.AI.tablebases = tablebase.Tablebases(value)
+        except (OSError, TypeError, ValueError) as error:
+            self.send("info string Invalid value for " + name + ": " + str(error))
+
+    # Handles: position (startpos | fen <fen>) [moves <move> ...]
+    def set_position(self, tokens):
+        moves = []
+        if ("moves" in tokens):
+            moves = tokens[tokens.index("moves")+1:]
+            tokens = tokens[:tokens.index("moves")]
+
+        try:
+            if (tokens[:1] == ["fen"]):
+                chessboard = self.board_class.from_fen(" ".join(tokens[1:]))
+            else:
+                chessboard = self.board_class.new()
+            for text in moves:
+                chessboard.make_move(chessboard.parse_uci_move(text))
+        except ValueError as error:
+            self.send("info string " + str(error))
+            return
+        self.chessboard = chessboard
+
+    # Handles: go [wtime <x>] [btime <x>] [winc <x>] [binc <x>]
+    # [movestogo <x>] [movetime <x>] [depth <x>] [nodes <x>] [infinite] [ponder]
+    def go(self, tokens):
+        limits = {}
+        for (index, token) in enumerate(tokens):
+            if (token in ("infinite", "ponder")):
+                limits[token] = True
+            elif (index + 1 < len(tokens) and tokens[index+1].lstrip("-").isdigit()):
+                limits[token] = int(tokens[index+1])
+
+        time_ms = get_time_budget(limits, self.chessboard.turn)
+        max_depth = limits.get("depth")
+        if (max_depth is None and time_ms is None and "nodes" not in limits):
+            max_depth = ai.AI.MAX_DEPTH
+
+        self.ponder_time_ms = None
+        if ("ponder" in limits):
+            self.ponder_time_ms = time_ms
+            time_ms = None
+            max_depth = limits.get("depth", ai.AI.MAX_DEPTH)
+
+        self.release.clear()
+        if ("infinite" not in limits and "ponder" not in limits):
+            self.release.set()
+
+        ai.AI.stop_requested = False
+        chessboard = self.board_class.clone(self.chessboard)
+        self.thread = threading.Thread(target=self.search, args=(chessboard, time_ms, max_depth, limits.get("nodes")), daemon=True)
+        self.thread.start()
+
+    # Runs on the search thread: searches, reports every iteration and sends
+    # the best move. Without legal moves it reports the mate or stalemate and
+    # sends the null move 0000, so the GUI always gets a bestmove.
+    def search(self, chessboard, time_ms, max_depth, max_nodes):
+        report_iteration = ai.AI.__dict__["report_iteration"]
+        def send_iteration(depth, best_move, best_score, elapsed):
+            report_iteration.__func__(depth, best_move, best_score, elapsed)
+            if (best_move != 0):
+                self.send_info(chessboard, depth, best_move, best_score, elapsed)
+        ai.AI.report_iteration = staticmethod(send_iteration)
+        try:
+            best_move = ai.AI.get_ai_move(chessboard, time_ms, max_depth, self.workers, max_nodes)
+        finally:
+            ai.AI.report_iteration = report_iteration
+
+        if (best_move == 0):
+            if (chessboard.is_check(chessboard.turn)):
+                self.send("info depth 0 score mate 0")
+            else:
+                self.send("info depth 0 score cp 0")
+
+        # go infinite and go ponder wait for stop or ponderhit.
+        self.release.wait()
+        if (best_move == 0):
+            self.send("bestmove 0000")
+            return
+
+        line = "bestmove " + best_move.to_uci()
+        variation = get_principal_variation(chessboard, best_move, 2)
+        if (len(variation) == 2):
+            line += " ponder " + variation[1].to_uci()
+        self.send(line)
+
+    def send_info(self, chessboard, depth, best_move, best_score, elapsed):
+        # UCI scores are from the point of view of the side to move.
+        score = best_score
+        if (chessboard.turn == pieces.Piece.BLACK):
+            score = -score
+        if (abs(score) >= ai.AI.CHECKMATE):
+            plies = depth - (abs(score) - ai.AI.CHECKMATE)
+            moves = (plies + 1) // 2
+            if (score < 0):
+                moves = -moves
+            score_text = "mate " + str(moves)
+        else:
+            score_text = "cp " + str(score)
+
+        milliseconds = int(elapsed)
+        nps = int(ai.AI.nodes * 1000 / max(1, milliseconds))
+        variation = " ".join(move.to_uci() for move in get_principal_variation(chessboard, best_move, depth))
+        self.send("info depth " + str(depth) + " score " + score_text + " nodes " + str(ai.AI.nodes)
+            + " nps " + str(nps) + " time " + str(milliseconds) + " pv " + variation)
+
+    # Stops the running search, if any, and waits for its best move to be sent.
+    def stop(self):
+        if (self.thread is None):
+            return
+
+        ai.AI.stop()
+        self.release.set()
+        self.thread.join()
+        self.thread = None
+        ai.AI.stop_requested = False
+
+    # The opponent played the move pondered on: the search goes on as a
+    # normal search with the time budget of the go ponder command.
+    def ponderhit(self):
+        if (self.thread is None):
+            return
+
+        if (self.ponder_time_ms is not None):
+            ai.AI.deadline = time.perf_counter() + self.ponder_time_ms / 1000.0
+        self.release.set()
+
+
+# Returns the time in milliseconds to spend on a move for the limits of a go
+# command, or None if the search is not timed.
+def get_time_budget(limits, color):
+    if ("movetime" in limits):
+        return max(1, limits["movetime"] - MOVE_OVERHEAD_MS)
+
+    if (color == pieces.Piece.WHITE):
+        (time_key, increment_key) = ("wtime", "winc")
+    else:
+        (time_key, increment_key) = ("btime", "binc")
+    if (time_key not in limits):
+        return None
+
+    time_left = max(0, limits[time_key] - MOVE_OVERHEAD_MS)
+    moves_to_go = max(1, limits.get("movestogo", DEFAULT_MOVES_TO_GO))
+    budget = time_left / moves_to_go + limits.get(increment_key, 0) * 3 / 4
+    return max(1, int(min(budget, time_left / 2)))
+
+
+# Returns up to length moves of the best line starting with best_move,
+# following the best moves stored in the transposition table after it. The
+# root position itself is not stored in the table.
+def get_principal_variation(chessboard, best_move, length):
+    variation = [best_move]
+    undos = [chessboard.make_move(best_move)]
+    seen = set()
+    while (len(variation) < length and chessboard.hash not in seen):
+        seen.add(chessboard.hash)
+        entry = ai.AI.transposition_table.probe(chessboard.hash)
+        if (entry is None or entry[3] == 0):
+            break
+        move = entry[3]
+        if (move not in chessboard.get_legal_moves(chessboard.turn)):
+            break
+        variation.append(move)
+        undos.append(chessboard.make_move(move))
+
+    for undo in reversed(undos):
+        chessboard.unmake_move(undo)
+    return variation
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs the engine with the Universal Chess Interface on stdin and stdout.")
+    bitboard.add_backend_argument(parser)
+    args = parser.parse_args()
+
+    engine = UCIEngine(bitboard.BACKENDS[args.backend])
+    while (True):
+        line = sys.stdin.readline()
+        if (line == ""):
+            engine.stop()
+            break
+        if (not engine.handle(line)):
+            break
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import random
+import pieces
+
+# Fixed seed so that hashes are the same in every process and every run.
+SEED = 20180429
+
+PIECE_TYPES = [
+    pieces.Pawn.PIECE_TYPE,
+    pieces.Knight.PIECE_TYPE,
+    pieces.Bishop.PIECE_TYPE,
+    pieces.Rook.PIECE_TYPE,
+    pieces.Queen.PIECE_TYPE,
+    pieces.King.PIECE_TYPE
+]
+
+random_keys = random.Random(SEED)
+
+
+def get_random_key():
+    return random_keys.getrandbits(64)
+
+
+# Returns a table with one random key for every square: table[x][y].
+def get_square_keys():
+    return [[get_random_key() for y in range(8)] for x in range(8)]
+
+
+class Zobrist:
+
+    # PIECE_KEYS[color][piece_type][x][y] is the key of that piece standing on (x, y).
+    PIECE_KEYS = {
+        pieces.Piece.WHITE: {piece_type: get_square_keys() for piece_type in PIECE_TYPES},
+        pieces.Piece.BLACK: {piece_type: get_square_keys() for piece_type in PIECE_TYPES}
+    }
+
+    WHITE_KING_MOVED = get_random_key()
+    BLACK_KING_MOVED = get_random_key()
+    BLACK_TO_MOVE = get_random_key()
+
+    # Returns the key of the given piece standing on (x, y).
+    @staticmethod
+    def get_piece_key(piece, x, y):
+        return Zobrist.PIECE_KEYS[piece.color][piece.piece_type][x][y]
+
+    # Computes the hash of the given board from scratch. The board keeps its
+    # hash up to date incrementally, this is only needed to initialize it.
+    @staticmethod
+    def get_hash(board):
+        key = 0
+        for (sq, piece) in enumerate(board.squares):
+            if (piece != 0):
+                key ^= Zobrist.get_piece_key(piece, sq % 8, sq // 8)
+
+        if (board.white_king_moved):
+            key ^= Zobrist.WHITE_KING_MOVED
+        if (board.black_king_moved):
+            key ^= Zobrist.BLACK_KING_MOVED
+        if (board.turn == pieces.Piece.BLACK):
+            key ^= Zobrist.BLACK_TO_MOVE
+
+        return key
+
+    # Computes the pawn-only hash of the given board from scratch: the hash
+    # of the pawns alone, which the pawn hash table is keyed on.
+    @staticmethod
+    def get_pawn_hash(board):
+        key = 0
+        for (sq, piece) in enumerate(board.squares):
+            if (piece != 0 and piece.piece_type == pieces.Pawn.PIECE_TYPE):
+                key ^= Zobrist.get_piece_key(piece, sq % 8, sq // 8)
+
+        return key